@@ -4,32 +4,128 @@
 
 """The main module of the Discord bot"""
 
+import asyncio
 import logging
-
-from knuckles import Subsonic
+from typing import TYPE_CHECKING
 
 from . import APP_NAME
+from .cache_index import lock_cache
 from .config import generate_new_config, get_config
-from .discord import get_bot
 from .env import get_env
 from .logging import setup_logging
 from .options import get_options
+from .timing import IMPORT_TIME_BUDGET, PhaseTimer
+
+if TYPE_CHECKING:
+    from knuckles import Subsonic
+
+    from .discord import DisopyBot
 
 logger = logging.getLogger(__name__)
 
 
+def check_subsonic_health(subsonic: "Subsonic") -> bool:
+    """Check if the OpenSubsonic REST API is available.
+
+    Args:
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+
+    Returns:
+        If the server reported an healthy status.
+    """
+
+    logger.info("Checking OpenSubsonic REST API status...")
+    return subsonic.system.ping().status == "ok"
+
+
+async def start(bot: "DisopyBot", subsonic: "Subsonic", discord_token: str, timer: PhaseTimer) -> None:
+    """Check the Subsonic server and log in to Discord at the same time, then connect to the gateway.
+
+    Args:
+        bot: The bot to start.
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+        discord_token: The token to be used to connect to Discord.
+        timer: The timer of the startup phases.
+    """
+
+    from .runtime import get_connector, log_runtime_backends
+
+    log_runtime_backends(asyncio.get_running_loop(), bot.config.runtime_speedups)
+
+    # The connector is created here as it needs the running event loop
+    bot.http.connector = get_connector(bot.config.runtime_speedups)
+
+    async with bot:
+        logger.info("Logging to Discord...")
+
+        healthy, _ = await asyncio.gather(
+            timer.measure("Subsonic health check", asyncio.to_thread(check_subsonic_health, subsonic)),
+            timer.measure("Discord login", bot.login(discord_token)),
+        )
+
+        if not healthy:
+            logger.critical("The OpenSubsonic server is not available!")
+            return
+
+        logger.info("Healthy Subsonic server status reported!")
+
+        await bot.connect()
+
+
 def main() -> None:
     """The entry point of the program."""
 
+    timer = PhaseTimer()
+
     options = get_options()
 
-    setup_logging(options.debug >= 1, options.color)
+    setup_logging(options.debug >= 1, options.color, options.log_json)
 
     if options.generate_config:
         generate_new_config(options.config_path)
         return
 
-    env = get_env()
+    # The load test uses a stand-in Subsonic server and the benchmark no server at all, neither connects to Discord
+    # so they need no environment
+    if options.replay is not None:
+        config = get_config(options.config_path)
+        if config is None:
+            return
+
+        from .replay import replay_trace
+
+        try:
+            replay_trace(options, config)
+        except KeyboardInterrupt:
+            logger.warning("Replay interrupted")
+
+        return
+
+    if options.bench is not None:
+        config = get_config(options.config_path)
+        if config is None:
+            return
+
+        from .benchmark import run_benchmark
+
+        try:
+            run_benchmark(options, config)
+        except KeyboardInterrupt:
+            logger.warning("Benchmark interrupted")
+
+        return
+
+    # The cache maintenance that doesn't need the server is done before reading the environment
+    if options.cache_command is not None and options.cache_command.action != "verify":
+        from .cache_tools import run_cache_command
+
+        run_cache_command(options, None)
+        return
+
+    # Warming and verifying the cache don't connect to Discord
+    start_bot = options.warm_cache is None and options.cache_command is None
+
+    env = get_env(require_discord_token=start_bot)
     if env is None:
         return
 
@@ -37,6 +133,18 @@ def main() -> None:
     if config is None:
         return
 
+    # The heavy dependencies are only imported when the bot is really going to be started
+    with timer.phase("Imports"):
+        from knuckles import Subsonic
+
+        if start_bot:
+            from .discord import get_bot
+            from .runtime import get_loop_factory, set_speedups
+
+    import_time = timer.get("Imports")
+    if import_time is not None and import_time > IMPORT_TIME_BUDGET:
+        logger.warning(f"Importing the dependencies took {import_time:.2f}s, over the {IMPORT_TIME_BUDGET}s budget")
+
     subsonic = Subsonic(
         url=config.subsonic_url,
         user=config.subsonic_user,
@@ -45,6 +153,31 @@ def main() -> None:
         use_https=config.use_https,
     )
 
+    if options.warm_cache is not None:
+        from .warmup import warm_cache
+
+        try:
+            warm_cache(subsonic, options, config)
+        except KeyboardInterrupt:
+            logger.warning("Cache warm-up interrupted")
+
+        return
+
+    if options.cache_command is not None:
+        from .cache_tools import run_cache_command
+
+        try:
+            run_cache_command(options, subsonic)
+        except KeyboardInterrupt:
+            logger.warning("Cache maintenance interrupted")
+
+        return
+
+    # Keep the lock open while the bot is running so the cache is not pruned under it
+    cache_lock = lock_cache(options.cache_path)
+    if cache_lock is None:
+        logger.warning("The cache is being used by another process, both will write to it at the same time")
+
     logger.info(f"Starting {APP_NAME}!")
 
     if not config.use_https:
@@ -52,16 +185,16 @@ def main() -> None:
             "Secure conection (HTTPS) to the Subsonic server is disable in the config file, using plain HTTP!"
         )
 
-    logger.info("Checking OpenSubsonic REST API status...")
-    if subsonic.system.ping().status != "ok":
-        logger.critical("The OpenSubsonic server is not available!")
-        return
+    # Enable discord.py debug logging only on verbosity level 2 as it prints a lot,
+    # its records are written by the handler of the root logger
+    logging.getLogger("discord").setLevel(logging.DEBUG if options.debug >= 2 else logging.INFO)
 
-    logger.info("Healthy Subsonic server status reported!")
+    set_speedups(config.runtime_speedups)
 
-    logger.info("Logging to Discord...")
-    get_bot(subsonic, config, options).run(
-        env.discord_token,
-        # Enable discord.py debug logging only on verbosity level 2 as it prints a lot
-        log_level=logging.DEBUG if options.debug >= 2 else logging.INFO,
-    )
+    try:
+        asyncio.run(
+            start(get_bot(subsonic, config, options, timer), subsonic, env.discord_token, timer),
+            loop_factory=get_loop_factory(config.runtime_uvloop),
+        )
+    except KeyboardInterrupt:
+        return
@@ -0,0 +1,419 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Audio sources used for the music playback."""
+
+import logging
+import threading
+from collections import deque
+from typing import Callable, Final, Generic, TypeVar
+
+import audioop
+from discord import AudioSource
+from discord.opus import Encoder
+
+logger = logging.getLogger(__name__)
+
+# The size in bytes of 20ms of 16-bit 48KHz stereo PCM
+FRAME_SIZE: Final[int] = Encoder.FRAME_SIZE
+
+# How many 20ms frames are in a second
+FRAMES_PER_SECOND: Final[int] = 1000 // Encoder.FRAME_LENGTH
+
+# The amount of frames read ahead when a track is prepared
+PREPARED_FRAMES: Final[int] = 5
+
+T = TypeVar("T")
+
+
+def pad_frame(frame: bytes) -> bytes:
+    """Fill with silence a frame shorter than 20ms.
+
+    Args:
+        frame: The PCM frame to pad.
+
+    Returns:
+        A frame with the full 20ms length.
+    """
+
+    if len(frame) >= FRAME_SIZE:
+        return frame
+
+    return frame + bytes(FRAME_SIZE - len(frame))
+
+
+class Track(AudioSource, Generic[T]):
+    """An audio source of a single song that can be opened and pre-buffered before being played."""
+
+    def __init__(self, item: T, source: AudioSource, duration: int | None) -> None:
+        """Create a new track.
+
+        Args:
+            item: The element being played by the track, usually the song.
+            source: The PCM audio source of the song.
+            duration: The duration of the song in seconds if known.
+        """
+
+        self.item = item
+        self.source = source
+        self.total_frames = duration * FRAMES_PER_SECOND if duration is not None else None
+
+        self.frames_read = 0
+        self.buffer: deque[bytes] = deque()
+
+    def prepare(self) -> None:
+        """Read ahead the first frames of the song so the first read is instantaneous.
+
+        This call is blocking and should not be done in the audio thread nor the event loop.
+        """
+
+        for _ in range(PREPARED_FRAMES):
+            frame = self.source.read()
+            if not frame:
+                break
+
+            self.buffer.append(frame)
+
+    def remaining_frames(self) -> int | None:
+        """Get how many frames are left to be played.
+
+        Returns:
+            The remaining frames or None if the duration of the song is unknown.
+        """
+
+        if self.total_frames is None:
+            return None
+
+        return self.total_frames - self.frames_read
+
+    def read(self) -> bytes:
+        """Read 20ms of audio.
+
+        Returns:
+            The PCM frame, empty if the song has ended.
+        """
+
+        frame = self.buffer.popleft() if self.buffer else self.source.read()
+        if frame:
+            self.frames_read += 1
+
+        return frame
+
+    def cleanup(self) -> None:
+        """Free the underlying audio source."""
+
+        self.buffer.clear()
+        self.source.cleanup()
+
+
+class PlaybackEngine(AudioSource, Generic[T]):
+    """Audio source that plays tracks one after the other with no gap between them.
+
+    The next track is set beforehand already opened and buffered, so the transition only swaps which source is
+    read. Optionally the end of a track can be mixed with the start of the next one.
+    """
+
+    def __init__(self, track: Track[T], crossfade: float, on_advance: Callable[[Track[T]], None]) -> None:
+        """Create a new engine.
+
+        Args:
+            track: The first track to be played.
+            crossfade: The seconds the end and start of two tracks should overlap, zero for a gapless transition.
+            on_advance: Called from the audio thread when the next track starts, it should not block.
+        """
+
+        self.current = track
+        self.next: Track[T] | None = None
+
+        self.crossfade_frames = int(crossfade * FRAMES_PER_SECOND)
+        self.on_advance = on_advance
+
+        self.lock = threading.Lock()
+
+    def set_next(self, track: Track[T]) -> None:
+        """Set the track to be played after the current one, replacing any previous one.
+
+        Args:
+            track: An already prepared track.
+        """
+
+        with self.lock:
+            previous = self.next
+            self.next = track
+
+        if previous is not None:
+            previous.cleanup()
+
+    def take_next(self) -> Track[T] | None:
+        """Remove the track set to be played after the current one.
+
+        Returns:
+            The removed track, it's the responsibility of the caller to clean it up.
+        """
+
+        with self.lock:
+            track = self.next
+            self.next = None
+
+        return track
+
+    def skip(self) -> bool:
+        """Jump to the next track without waiting for the current one to end.
+
+        Returns:
+            If there was a next track to jump to.
+        """
+
+        with self.lock:
+            if self.next is None:
+                return False
+
+            self._advance()
+
+        return True
+
+    def _advance(self) -> None:
+        """Swap the current track with the next one, the lock should be held."""
+
+        if self.next is None:
+            return
+
+        self.current.cleanup()
+        self.current = self.next
+        self.next = None
+
+        self.on_advance(self.current)
+
+    def _crossfade(self, frame: bytes, remaining_frames: int) -> bytes:
+        """Mix the end of the current track with the start of the next one, the lock should be held.
+
+        Args:
+            frame: The frame of the current track.
+            remaining_frames: How many frames the current track has left.
+
+        Returns:
+            The mixed frame.
+        """
+
+        if self.next is None:
+            return frame
+
+        next_frame = self.next.read()
+        if not next_frame:
+            return frame
+
+        fade_out = max(remaining_frames, 0) / self.crossfade_frames
+        return audioop.add(
+            audioop.mul(pad_frame(frame), 2, fade_out),
+            audioop.mul(pad_frame(next_frame), 2, 1 - fade_out),
+            2,
+        )
+
+    def read(self) -> bytes:
+        """Read 20ms of audio from the current track, switching to the next one when it ends.
+
+        Returns:
+            The PCM frame, empty when there are no more tracks.
+        """
+
+        with self.lock:
+            frame = self.current.read()
+
+            if not frame:
+                if self.next is None:
+                    return b""
+
+                self._advance()
+                return self.current.read()
+
+            remaining_frames = self.current.remaining_frames()
+            if self.crossfade_frames > 0 and remaining_frames is not None and remaining_frames < self.crossfade_frames:
+                return self._crossfade(frame, remaining_frames)
+
+            return frame
+
+    def cleanup(self) -> None:
+        """Free all the tracks of the engine."""
+
+        with self.lock:
+            self.current.cleanup()
+
+            if self.next is not None:
+                self.next.cleanup()
+                self.next = None
+
+
+class BufferedSource(AudioSource):
+    """Audio source that reads ahead another one from a background thread to absorb slow reads.
+
+    The frames are stored in a ring buffer allocated once, if the source is not able to keep up a silent frame is
+    played instead and the underrun is counted.
+    """
+
+    def __init__(self, source: AudioSource, capacity: int, keep_alive: bool = False) -> None:
+        """Create a new buffered source and start reading ahead.
+
+        Args:
+            source: The PCM audio source to read ahead.
+            capacity: How many 20ms frames can be stored in the buffer.
+            keep_alive: If the source should be read again after returning nothing instead of ending, for sources
+                with gaps between songs.
+        """
+
+        self.source = source
+        self.capacity = capacity
+        self.keep_alive = keep_alive
+
+        self.buffer = bytearray(capacity * FRAME_SIZE)
+        self.lengths = [0] * capacity
+        self.head = 0
+        self.count = 0
+
+        self.ended = False
+        self.stopping = False
+        self.condition = threading.Condition()
+
+        # If the source returned nothing the last time, only used to keep it alive
+        self.in_gap = False
+
+        # Increased on every flush, the frames being read ahead during one are discarded
+        self.generation = 0
+
+        # The sequence numbers of the next frame to be stored and to be played, and the callbacks waiting for a frame
+        self.produced = 0
+        self.consumed = 0
+        self.pending_callbacks: deque[tuple[int, Callable[[], None]]] = deque()
+
+        self.frames_read = 0
+        self.underruns = 0
+
+        self.thread = threading.Thread(target=self._fill, daemon=True, name=f"audio-buffer:{id(self):#x}")
+        self.thread.start()
+
+    def _fill(self) -> None:
+        """Keep the buffer full until the source ends or the buffer is cleaned up."""
+
+        try:
+            while True:
+                with self.condition:
+                    while self.count == self.capacity and not self.stopping:
+                        self.condition.wait()
+
+                    if self.stopping:
+                        return
+
+                    generation = self.generation
+
+                frame = self.source.read()[:FRAME_SIZE]
+
+                with self.condition:
+                    if not frame and self.keep_alive:
+                        self.in_gap = True
+                        self.condition.notify_all()
+                        self.condition.wait(Encoder.FRAME_LENGTH / 1000)
+                        continue
+
+                    if not frame:
+                        self.ended = True
+                        self.condition.notify_all()
+                        return
+
+                    self.in_gap = False
+
+                    # The frame was read before a flush, it's stale
+                    if generation != self.generation:
+                        continue
+
+                    slot = (self.head + self.count) % self.capacity
+                    self.buffer[slot * FRAME_SIZE : slot * FRAME_SIZE + len(frame)] = frame
+                    self.lengths[slot] = len(frame)
+                    self.count += 1
+                    self.produced += 1
+
+                    self.condition.notify_all()
+
+        except Exception:
+            logger.exception("Failed to read ahead the audio source")
+
+            with self.condition:
+                self.ended = True
+                self.condition.notify_all()
+
+    def flush(self) -> None:
+        """Discard the frames already read ahead, used to make changes in the source audible right away."""
+
+        with self.condition:
+            self.head = 0
+            self.count = 0
+            self.generation += 1
+            self.consumed = self.produced
+            self.condition.notify_all()
+
+    def call_when_played(self, callback: Callable[[], None]) -> None:
+        """Delay a callback until the next frame read ahead from the source is played.
+
+        Called while the source is read, it runs when the audio being read is really heard instead of up to the
+        capacity of the buffer earlier. It's called from the thread that plays the audio and should not block.
+
+        Args:
+            callback: The function to be called.
+        """
+
+        with self.condition:
+            self.pending_callbacks.append((self.produced, callback))
+
+    def read(self) -> bytes:
+        """Read 20ms of audio from the buffer.
+
+        Returns:
+            The PCM frame, silence if the buffer has run dry or empty if the source has ended or is in a gap.
+        """
+
+        with self.condition:
+            if self.count == 0 and not self.ended:
+                self.condition.wait(Encoder.FRAME_LENGTH / 1000)
+
+            if self.count == 0:
+                if self.ended or self.in_gap:
+                    return b""
+
+                self.underruns += 1
+                return bytes(FRAME_SIZE)
+
+            start = self.head * FRAME_SIZE
+            frame = bytes(self.buffer[start : start + self.lengths[self.head]])
+
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.frames_read += 1
+            self.consumed += 1
+
+            callbacks = []
+            while self.pending_callbacks and self.pending_callbacks[0][0] < self.consumed:
+                callbacks.append(self.pending_callbacks.popleft()[1])
+
+            self.condition.notify_all()
+
+        for callback in callbacks:
+            callback()
+
+        return frame
+
+    def cleanup(self) -> None:
+        """Stop reading ahead and free the underlying audio source."""
+
+        with self.condition:
+            if self.stopping:
+                return
+
+            self.stopping = True
+            self.condition.notify_all()
+
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+
+        if self.underruns > 0:
+            logger.warning(f"The playback buffer ran dry {self.underruns} times in {self.frames_read} frames")
+
+        self.source.cleanup()
@@ -0,0 +1,391 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Measure the CPU used by the audio playback without connecting to Discord, to know how many streams a host can
+play.
+
+Every stream reads its frames paced as the audio thread of discord.py does, with the same audio sources the players
+of the bot use, while synthetic songs generated locally are decoded by FFmpeg.
+"""
+
+import logging
+import math
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Final, NamedTuple
+
+import discord
+from discord import AudioSource, PCMVolumeTransformer
+from discord.opus import Encoder, OpusNotLoaded
+
+from . import APP_NAME_LOWER
+from .audio import BufferedSource, PlaybackEngine, Track
+from .config import Config
+from .options import Options
+from .timing import format_latencies
+
+logger = logging.getLogger(__name__)
+
+# Seconds between the frames read by the audio thread of discord.py
+FRAME_LENGTH: Final[float] = Encoder.FRAME_LENGTH / 1000
+
+# The synthetic songs are as long as the streams plus this margin, so FFmpeg never reaches their end
+FIXTURE_MARGIN: Final[int] = 2
+
+# The extension and the FFmpeg arguments used to encode the synthetic songs in every format but WAV
+FIXTURE_ENCODINGS: Final[dict[str, tuple[str, list[str]]]] = {
+    "flac": (".flac", ["-c:a", "flac"]),
+    "mp3": (".mp3", ["-c:a", "libmp3lame", "-b:a", "320k"]),
+    "opus": (".opus", ["-c:a", "libopus", "-b:a", "128k"]),
+}
+
+
+@dataclass
+class StreamStats:
+    """What happened while a stream was being played.
+
+    Attributes:
+        delays: The seconds every frame was ready after its time in the schedule.
+        late_frames: The frames ready after the next one should have been sent, they are heard as stutter.
+        ended_early: If the source ran out of audio before the end of the benchmark.
+    """
+
+    delays: list[float] = field(default_factory=list)
+    late_frames: int = 0
+    ended_early: bool = False
+
+
+class StepResult(NamedTuple):
+    """The result of playing several streams at the same time.
+
+    Attributes:
+        streams: The number of streams.
+        cpu_per_stream: The fraction of a core used by every stream, counting FFmpeg.
+        delays: The delays of the frames of all the streams.
+        late_frames: The late frames of all the streams.
+        frames: The frames read by all the streams.
+    """
+
+    streams: int
+    cpu_per_stream: float
+    delays: list[float]
+    late_frames: int
+    frames: int
+
+
+def write_fixture(path: Path, seconds: int) -> None:
+    """Write a synthetic song as 16-bit 48KHz stereo WAV, the format decoded by FFmpeg for Discord.
+
+    A second of chords, a sweep and noise is repeated, so the encoders and decoders have real work to do.
+
+    Args:
+        path: Where the song should be written.
+        seconds: The duration of the song.
+    """
+
+    noise = random.Random(0)
+
+    samples = array("h")
+    for i in range(Encoder.SAMPLING_RATE):
+        t = i / Encoder.SAMPLING_RATE
+        tone = (
+            0.3 * math.sin(2 * math.pi * 220 * t)
+            + 0.2 * math.sin(2 * math.pi * 277 * t)
+            + 0.1 * math.sin(2 * math.pi * 1000 * (1 + t) * t)
+        )
+
+        samples.append(int((tone + 0.05 * noise.uniform(-1, 1)) * 26000))
+        samples.append(int((0.8 * tone + 0.05 * noise.uniform(-1, 1)) * 26000))
+
+    second = samples.tobytes()
+
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(Encoder.CHANNELS)
+        f.setsampwidth(2)
+        f.setframerate(Encoder.SAMPLING_RATE)
+
+        for _ in range(seconds):
+            f.writeframes(second)
+
+
+def create_fixtures(directory: Path, formats: tuple[str, ...], seconds: int) -> dict[str, Path]:
+    """Create a synthetic song in every format, encoded with FFmpeg.
+
+    Args:
+        directory: Where the songs should be written.
+        formats: The formats of the songs.
+        seconds: The duration of the songs.
+
+    Returns:
+        The path of the song in every format, the ones FFmpeg can't encode are missing.
+    """
+
+    wav_path = directory / "fixture.wav"
+    write_fixture(wav_path, seconds)
+
+    fixtures = {}
+    for format in formats:
+        if format == "wav":
+            fixtures[format] = wav_path
+            continue
+
+        extension, arguments = FIXTURE_ENCODINGS[format]
+        path = (directory / "fixture").with_suffix(extension)
+
+        try:
+            subprocess.run(
+                ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", str(wav_path), *arguments, str(path)],
+                check=True,
+                capture_output=True,
+            )
+        except subprocess.CalledProcessError as e:
+            logger.error(f"FFmpeg is unable to encode the {format} song, skipping it: {e.stderr.decode().strip()}")
+            continue
+
+        fixtures[format] = path
+
+    return fixtures
+
+
+def open_source(engine: str, path: Path, format: str, config: Config) -> AudioSource:
+    """Open a song with the audio sources of an engine.
+
+    Args:
+        engine: The audio source stack, one of `BENCH_ENGINES`.
+        path: The path of the song.
+        format: The format of the song.
+        config: The config of the program, with the playback settings of the bot.
+
+    Returns:
+        The audio source ready to be read.
+    """
+
+    match engine:
+        # The same stack the players of the guilds build
+        case "player":
+            track = Track(path, discord.FFmpegPCMAudio(str(path)), None)
+            track.prepare()
+
+            source: AudioSource = PCMVolumeTransformer(
+                PlaybackEngine(track, config.playback_crossfade, on_advance=lambda track: None),
+                volume=config.volume / 100,
+            )
+
+            if config.playback_buffer_frames > 0:
+                source = BufferedSource(source, config.playback_buffer_frames)
+
+            return source
+
+        # The bare discord.py stack, the audio thread encodes the PCM to Opus
+        case "pcm":
+            return PCMVolumeTransformer(discord.FFmpegPCMAudio(str(path)), volume=config.volume / 100)
+
+        # FFmpeg encodes to Opus, or only copies the packets of the Opus songs, and the audio thread just sends them
+        case _:
+            return discord.FFmpegOpusAudio(str(path), codec="copy" if format == "opus" else None)
+
+
+def play_stream(source: AudioSource, encoder: Encoder | None, frames: int, start: float, stats: StreamStats) -> None:
+    """Read the frames of a source at the pace of the audio thread of discord.py, encoding them as it does.
+
+    Args:
+        source: The audio source to read.
+        encoder: The Opus encoder of the stream, None if libopus is not available.
+        frames: The number of frames to read.
+        start: The performance counter time when the first frame should be sent.
+        stats: Where the timing of the frames is recorded.
+    """
+
+    for loop in range(frames):
+        scheduled = start + FRAME_LENGTH * loop
+
+        data = source.read()
+        if not data:
+            stats.ended_early = True
+            return
+
+        if encoder is not None and not source.is_opus():
+            encoder.encode(data, Encoder.SAMPLES_PER_FRAME)
+
+        delay = max(time.perf_counter() - scheduled, 0.0)
+        stats.delays.append(delay)
+        if delay > FRAME_LENGTH:
+            stats.late_frames += 1
+
+        wait = scheduled + FRAME_LENGTH - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+
+def get_cpu_time() -> float:
+    """Get the CPU time used by the program and its finished subprocesses.
+
+    Returns:
+        The user and system seconds.
+    """
+
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def run_step(
+    engine: str, path: Path, format: str, streams: int, seconds: int, opus: bool, config: Config
+) -> StepResult:
+    """Play several streams of a song at the same time.
+
+    Args:
+        engine: The audio source stack.
+        path: The path of the song.
+        format: The format of the song.
+        streams: The number of streams.
+        seconds: The seconds of audio played by every stream.
+        opus: If the PCM frames should be encoded to Opus as the audio thread does.
+        config: The config of the program, with the playback settings of the bot.
+
+    Returns:
+        The CPU used and the timing of the frames.
+    """
+
+    cpu_start = get_cpu_time()
+
+    sources = [open_source(engine, path, format, config) for _ in range(streams)]
+    encoders = [Encoder() if opus else None for _ in range(streams)]
+    stats = [StreamStats() for _ in range(streams)]
+
+    frames = seconds * round(1 / FRAME_LENGTH)
+    start = time.perf_counter()
+
+    threads = [
+        threading.Thread(target=play_stream, args=(source, encoder, frames, start, stream_stats), name=f"bench-{i}")
+        for i, (source, encoder, stream_stats) in enumerate(zip(sources, encoders, stats))
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    wall_time = time.perf_counter() - start
+
+    # FFmpeg is waited when cleaned up, only then its CPU time is known
+    for source in sources:
+        source.cleanup()
+
+    cpu_time = get_cpu_time() - cpu_start
+
+    if any(stream_stats.ended_early for stream_stats in stats):
+        logger.warning("Some streams ran out of audio before the end of the step")
+
+    delays = [delay for stream_stats in stats for delay in stream_stats.delays]
+
+    return StepResult(
+        streams,
+        cpu_time / wall_time / streams,
+        delays,
+        sum(stream_stats.late_frames for stream_stats in stats),
+        len(delays),
+    )
+
+
+def get_stream_steps(max_streams: int) -> list[int]:
+    """Get the numbers of streams to be measured, doubling from one up to the max.
+
+    Args:
+        max_streams: The max number of streams.
+
+    Returns:
+        The numbers of streams.
+    """
+
+    steps = [1]
+    while steps[-1] * 2 < max_streams:
+        steps.append(steps[-1] * 2)
+
+    if steps[-1] != max_streams:
+        steps.append(max_streams)
+
+    return steps
+
+
+def is_opus_available() -> bool:
+    """Check if libopus can be loaded to encode the PCM frames as the audio thread does.
+
+    Returns:
+        If the Opus encoder is available.
+    """
+
+    try:
+        Encoder()
+    except OpusNotLoaded:
+        return False
+
+    return True
+
+
+def run_benchmark(options: Options, config: Config) -> None:
+    """Run the benchmark of the `bench` subcommand and log the results of every engine and format.
+
+    Args:
+        options: The options of the program.
+        config: The config of the program, with the playback settings of the bot.
+    """
+
+    assert options.bench is not None
+    bench = options.bench
+
+    if shutil.which("ffmpeg") is None:
+        logger.critical("FFmpeg is not installed, it's needed to decode the songs")
+        return
+
+    opus = is_opus_available()
+    if not opus:
+        logger.warning("libopus is not available, the Opus encoding done by the audio thread is not measured")
+
+    cores = os.cpu_count() or 1
+    logger.info(
+        f"Benchmarking the engines {", ".join(bench.engines)} with up to {bench.streams} streams of "
+        + f"{bench.seconds}s in {cores} cores"
+    )
+
+    with tempfile.TemporaryDirectory(prefix=f"{APP_NAME_LOWER}-bench-") as directory:
+        fixtures = create_fixtures(Path(directory), bench.formats, bench.seconds + FIXTURE_MARGIN)
+
+        for format, path in fixtures.items():
+            for engine in bench.engines:
+                logger.info(f"Engine '{engine}' playing {format} songs:")
+
+                # The max streams per core is estimated from the most loaded step without stutter
+                best: StepResult | None = None
+
+                for streams in get_stream_steps(bench.streams):
+                    result = run_step(engine, path, format, streams, bench.seconds, opus, config)
+
+                    logger.info(
+                        f"  {streams} streams: {result.cpu_per_stream * 100:.1f}% of a core per stream, "
+                        + f"{result.late_frames} of {result.frames} frames late"
+                    )
+                    logger.info(f"    Frame delay: {format_latencies(result.delays, 1)}")
+
+                    if result.late_frames == 0:
+                        best = result
+
+                if best is None:
+                    logger.warning("  Every step had late frames, the host is not able to play a single stream")
+                    continue
+
+                per_core = 1 / best.cpu_per_stream
+                logger.info(
+                    f"  About {per_core:.0f} streams per core, {per_core * cores:.0f} streams in this host "
+                    + f"(measured with {best.streams} streams)"
+                )
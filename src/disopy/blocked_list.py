@@ -0,0 +1,272 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""A list with fast positional operations even with thousands of elements."""
+
+from itertools import chain
+from typing import Final, Generic, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+# The target size of every block, they are split when doubling it
+BLOCK_LOAD: Final[int] = 256
+
+
+class BlockedList(Generic[T]):
+    """A list split in small blocks with a Fenwick tree over their sizes.
+
+    Finding the block of a position is O(log n) and inserting or removing inside a block only moves up to a
+    constant amount of elements, so inserting, removing and moving at any position stays fast for long lists.
+    """
+
+    def __init__(self, items: Iterable[T] = ()) -> None:
+        """Create a new list.
+
+        Args:
+            items: The initial elements of the list.
+        """
+
+        elements = list(items)
+
+        self.blocks: list[list[T]] = [elements[i : i + BLOCK_LOAD] for i in range(0, len(elements), BLOCK_LOAD)]
+        self.length = len(elements)
+        self.tree: list[int] = []
+
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        """Rebuild the Fenwick tree after the blocks have been split or merged."""
+
+        tree = [0] * (len(self.blocks) + 1)
+
+        for i, block in enumerate(self.blocks, 1):
+            tree[i] += len(block)
+
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+
+        self.tree = tree
+
+    def _update(self, block_index: int, delta: int) -> None:
+        """Update the size of a block in the Fenwick tree.
+
+        Args:
+            block_index: The index of the block.
+            delta: The change in the size of the block.
+        """
+
+        i = block_index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """Find the block and the offset inside of it of a position.
+
+        Args:
+            index: A valid non negative position in the list.
+
+        Returns:
+            The index of the block and the offset inside the block.
+        """
+
+        block_index = 0
+        remaining = index
+
+        step = 1 << (len(self.blocks).bit_length() - 1) if self.blocks else 0
+        while step > 0:
+            candidate = block_index + step
+            if candidate <= len(self.blocks) and self.tree[candidate] <= remaining:
+                block_index = candidate
+                remaining -= self.tree[candidate]
+
+            step >>= 1
+
+        return block_index, remaining
+
+    def _normalize(self, index: int) -> int:
+        """Convert a possibly negative position to a valid non negative one.
+
+        Args:
+            index: The position to normalize.
+
+        Raises:
+            IndexError: The position is out of the list.
+
+        Returns:
+            The non negative position.
+        """
+
+        if index < 0:
+            index += self.length
+
+        if index < 0 or index >= self.length:
+            raise IndexError("BlockedList index out of range")
+
+        return index
+
+    def __len__(self) -> int:
+        """Get the length of the list.
+
+        Returns:
+            The number of elements.
+        """
+
+        return self.length
+
+    def __iter__(self) -> Iterator[T]:
+        """Iterate the elements of the list in order.
+
+        Returns:
+            An iterator over the elements.
+        """
+
+        return chain.from_iterable(self.blocks)
+
+    def __getitem__(self, index: int) -> T:
+        """Get the element at a position.
+
+        Args:
+            index: The position of the element.
+
+        Returns:
+            The element.
+        """
+
+        block_index, offset = self._locate(self._normalize(index))
+        return self.blocks[block_index][offset]
+
+    def append(self, item: T) -> None:
+        """Add an element at the end of the list.
+
+        Args:
+            item: The element to add.
+        """
+
+        self.insert(self.length, item)
+
+    def insert(self, index: int, item: T) -> None:
+        """Insert an element before a position, following the same rules as `list.insert`.
+
+        Args:
+            index: The position where the element should be.
+            item: The element to insert.
+        """
+
+        if index < 0:
+            index = max(index + self.length, 0)
+
+        index = min(index, self.length)
+
+        if not self.blocks:
+            self.blocks.append([item])
+            self.length = 1
+            self._rebuild()
+            return
+
+        if index == self.length:
+            block_index = len(self.blocks) - 1
+            offset = len(self.blocks[block_index])
+        else:
+            block_index, offset = self._locate(index)
+
+        block = self.blocks[block_index]
+        block.insert(offset, item)
+        self.length += 1
+
+        if len(block) > 2 * BLOCK_LOAD:
+            self.blocks[block_index : block_index + 1] = [block[:BLOCK_LOAD], block[BLOCK_LOAD:]]
+            self._rebuild()
+        else:
+            self._update(block_index, 1)
+
+    def pop(self, index: int = -1) -> T:
+        """Remove and get the element at a position.
+
+        Args:
+            index: The position of the element, the last one by default.
+
+        Raises:
+            IndexError: The list is empty or the position is out of it.
+
+        Returns:
+            The removed element.
+        """
+
+        block_index, offset = self._locate(self._normalize(index))
+
+        block = self.blocks[block_index]
+        item = block.pop(offset)
+        self.length -= 1
+
+        if not block:
+            del self.blocks[block_index]
+            self._rebuild()
+
+        # Merge small blocks to keep the number of blocks proportional to the length
+        elif len(block) < BLOCK_LOAD // 4 and block_index + 1 < len(self.blocks):
+            block.extend(self.blocks.pop(block_index + 1))
+            self._rebuild()
+
+        else:
+            self._update(block_index, -1)
+
+        return item
+
+    def replace(self, index: int, items: Iterable[T]) -> None:
+        """Replace the element at a position with several elements, or remove it if there are none.
+
+        Args:
+            index: The position of the element.
+            items: The elements that take its place, in order.
+
+        Raises:
+            IndexError: The list is empty or the position is out of it.
+        """
+
+        block_index, offset = self._locate(self._normalize(index))
+
+        block = self.blocks[block_index]
+        old_size = len(block)
+        block[offset : offset + 1] = items
+        self.length += len(block) - old_size
+
+        if not block:
+            del self.blocks[block_index]
+            self._rebuild()
+
+        elif len(block) > 2 * BLOCK_LOAD:
+            self.blocks[block_index : block_index + 1] = [
+                block[i : i + BLOCK_LOAD] for i in range(0, len(block), BLOCK_LOAD)
+            ]
+            self._rebuild()
+
+        else:
+            self._update(block_index, len(block) - old_size)
+
+    def move(self, source: int, destination: int) -> T:
+        """Move an element to another position.
+
+        Args:
+            source: The current position of the element.
+            destination: The position the element should have after being moved.
+
+        Returns:
+            The moved element.
+        """
+
+        destination = self._normalize(destination)
+
+        item = self.pop(source)
+        self.insert(destination, item)
+
+        return item
+
+    def clear(self) -> None:
+        """Remove all the elements of the list."""
+
+        self.blocks.clear()
+        self.length = 0
+        self._rebuild()
@@ -0,0 +1,448 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Keep an index of the songs in the cache so it can be inspected without walking the disk."""
+
+import json
+import logging
+import sys
+import threading
+import time
+from functools import cache
+from pathlib import Path
+from typing import Any, Final, Iterator, NamedTuple, TextIO
+
+if sys.platform != "win32":
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+# The version of the index file, it's rebuilt from the disk if it doesn't match
+INDEX_VERSION: Final[int] = 2
+
+# Min seconds between two writes of the index to the disk while it's being modified
+SAVE_INTERVAL: Final[float] = 60.0
+
+# The extension of the complete songs in the cache, different from the one of the songs cached only by their ID by
+# older versions so the names are never ambiguous
+SONG_SUFFIX: Final[str] = ".song"
+
+# The extension of the songs cached only by their ID by older versions, always their original file
+LEGACY_SONG_SUFFIX: Final[str] = ".audio"
+
+
+class IndexEntry(NamedTuple):
+    """A song stored in the cache.
+
+    Attributes:
+        song_id: The ID of the song in the Subsonic server.
+        format: The format of the file, `raw` if it's the original one.
+        max_bitrate: The max bitrate of the file, zero if it's the original one.
+        size: The size of the file in bytes.
+        added: The UNIX time when the song was downloaded.
+        last_used: The UNIX time when the song was played for the last time.
+    """
+
+    song_id: str
+    format: str
+    max_bitrate: int
+    size: int
+    added: float
+    last_used: float
+
+
+class CacheSummary(NamedTuple):
+    """The totals of the cache, stored next to the index so they can be read without loading it.
+
+    Attributes:
+        songs: The number of songs.
+        total_bytes: The total size of the songs in bytes.
+        updated: The UNIX time of the last change of the index.
+        oldest_used: The UNIX time when the least recently played song was played, None if the cache is empty.
+    """
+
+    songs: int
+    total_bytes: int
+    updated: float
+    oldest_used: float | None
+
+
+def get_summary_path(songs_path: Path) -> Path:
+    """Get the path of the totals of the index of a songs cache folder.
+
+    Args:
+        songs_path: The folder where the songs are cached.
+
+    Returns:
+        The path of the file with the totals.
+    """
+
+    return songs_path.parent / "songs-index-summary.json"
+
+
+def read_summary(songs_path: Path) -> CacheSummary | None:
+    """Read the totals of the cache written with the last save of its index, without loading the index.
+
+    Args:
+        songs_path: The folder where the songs are cached.
+
+    Returns:
+        The totals or None if they are missing or not valid, the index should be loaded then.
+    """
+
+    try:
+        data = json.loads(get_summary_path(songs_path).read_text())
+        if data["version"] != INDEX_VERSION:
+            return None
+
+        oldest_used = data["oldest_used"]
+        return CacheSummary(
+            int(data["songs"]),
+            int(data["total_bytes"]),
+            float(data["updated"]),
+            float(oldest_used) if oldest_used is not None else None,
+        )
+
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_json(path: Path, data: dict[str, Any]) -> None:
+    """Write a JSON file replacing it at once, so it's never read half written.
+
+    Args:
+        path: The path of the file.
+        data: The content of the file.
+
+    Raises:
+        OSError: The file could not be written.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    temporal_path = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+    temporal_path.write_text(json.dumps(data))
+    temporal_path.replace(path)
+
+
+def parse_song_file_name(name: str) -> tuple[str, str, int] | None:
+    """Get the song ID, format and bitrate of a cached song from its file name.
+
+    Args:
+        name: The file name.
+
+    Returns:
+        The ID, format and bitrate or None if it's not a cached song.
+    """
+
+    if not name.endswith(SONG_SUFFIX):
+        return None
+
+    # The format and bitrate never have hyphens, the ones of the ID are kept
+    parts = name.removesuffix(SONG_SUFFIX).rsplit("-", 2)
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+
+    return parts[0], parts[1], int(parts[2])
+
+
+class CacheIndex:
+    """The songs of the cache with their size and usage, and the totals kept up to date.
+
+    The index is kept in memory and written to the cache folder at most once every `SAVE_INTERVAL` seconds while
+    it's being modified, and when `save` is called. Its totals are written to a small file next to it, so they can be
+    read with `read_summary` without loading the index. All the methods are thread safe.
+    """
+
+    def __init__(self, songs_path: Path) -> None:
+        """Create a new index, it's loaded on its first use.
+
+        Args:
+            songs_path: The folder where the songs are cached.
+        """
+
+        self.songs_path = songs_path
+        self.path = songs_path.parent / "songs-index.json"
+
+        self.entries: dict[str, IndexEntry] = {}
+        self.total_bytes = 0
+        self.updated = 0.0
+
+        self.loaded = False
+        self.dirty = False
+        self.last_save = time.monotonic()
+
+        self.lock = threading.RLock()
+
+    def _load(self) -> None:
+        """Load the index from the disk if it hasn't been loaded yet, rebuilding it if it's missing."""
+
+        if self.loaded:
+            return
+
+        self.loaded = True
+
+        try:
+            data = json.loads(self.path.read_text())
+            if data["version"] != INDEX_VERSION:
+                raise ValueError(f"Unsupported index version {data["version"]}")
+
+            self.entries = {name: IndexEntry(*entry) for name, entry in data["entries"].items()}
+            self.total_bytes = int(data["total_bytes"])
+            self.updated = float(data["updated"])
+
+            # Written again with the next save if it was lost
+            if read_summary(self.songs_path) is None:
+                self.dirty = True
+
+        except FileNotFoundError:
+            self.rebuild()
+
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"The cache index is not valid, rebuilding it: {e}")
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        """Build the index again from the songs in the disk, the last use is lost."""
+
+        with self.lock:
+            self.loaded = True
+            self.entries.clear()
+            self.total_bytes = 0
+
+            for path in self.song_files():
+                self._add(path, path.stat().st_mtime)
+
+            self.dirty = True
+
+        logger.info(f"Cache index rebuilt with {len(self.entries)} songs")
+
+    def song_files(self) -> Iterator[Path]:
+        """Walk the complete songs stored in the disk.
+
+        Returns:
+            An iterator of the paths of the songs.
+        """
+
+        if not self.songs_path.is_dir():
+            return
+
+        for path in self.songs_path.iterdir():
+            if path.is_file() and parse_song_file_name(path.name) is not None:
+                yield path
+
+    def _add(self, path: Path, added: float) -> None:
+        """Add a song to the index, the lock should be held.
+
+        Args:
+            path: The path of the song.
+            added: When the song was downloaded.
+        """
+
+        parsed = parse_song_file_name(path.name)
+        if parsed is None:
+            return
+
+        self._remove(path.name)
+
+        size = path.stat().st_size
+        self.entries[path.name] = IndexEntry(*parsed, size, added, added)
+        self.total_bytes += size
+
+        self.updated = time.time()
+        self.dirty = True
+
+    def _remove(self, name: str) -> IndexEntry | None:
+        """Remove a song from the index, the lock should be held.
+
+        Args:
+            name: The file name of the song.
+
+        Returns:
+            The removed entry or None if it was not in the index.
+        """
+
+        entry = self.entries.pop(name, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+            self.updated = time.time()
+            self.dirty = True
+
+        return entry
+
+    def add(self, path: Path) -> None:
+        """Register a song that has just been downloaded.
+
+        Args:
+            path: The path of the song.
+        """
+
+        with self.lock:
+            self._load()
+            self._add(path, time.time())
+
+        self.save_if_due()
+
+    def touch(self, path: Path) -> None:
+        """Register that a song has been used.
+
+        Args:
+            path: The path of the song.
+        """
+
+        with self.lock:
+            self._load()
+
+            entry = self.entries.get(path.name)
+            if entry is None:
+                # Downloaded by an older version or while the index was not being saved
+                self._add(path, path.stat().st_mtime)
+                entry = self.entries[path.name]
+
+            self.entries[path.name] = entry._replace(last_used=time.time())
+            self.dirty = True
+
+        self.save_if_due()
+
+    def remove(self, name: str) -> IndexEntry | None:
+        """Remove a song from the index, the file is not deleted.
+
+        Args:
+            name: The file name of the song.
+
+        Returns:
+            The removed entry or None if it was not in the index.
+        """
+
+        with self.lock:
+            self._load()
+            return self._remove(name)
+
+    def reconcile(self) -> tuple[int, int]:
+        """Make the index match the songs in the disk, keeping the last use of the songs already indexed.
+
+        Returns:
+            The number of indexed songs missing in the disk and the number of songs in the disk missing in the index.
+        """
+
+        with self.lock:
+            self._load()
+
+            files = {path.name: path for path in self.song_files()}
+
+            missing = [name for name in self.entries if name not in files]
+            for name in missing:
+                self._remove(name)
+
+            untracked = [path for name, path in files.items() if name not in self.entries]
+            for path in untracked:
+                self._add(path, path.stat().st_mtime)
+
+        return len(missing), len(untracked)
+
+    def _summary(self) -> CacheSummary:
+        """Get the totals of the index, the lock should be held.
+
+        Returns:
+            The totals.
+        """
+
+        oldest_used = min((entry.last_used for entry in self.entries.values()), default=None)
+        return CacheSummary(len(self.entries), self.total_bytes, self.updated, oldest_used)
+
+    def summary(self) -> CacheSummary:
+        """Get the totals of the index.
+
+        Returns:
+            The totals.
+        """
+
+        with self.lock:
+            self._load()
+            return self._summary()
+
+    def snapshot(self) -> tuple[dict[str, IndexEntry], int, float]:
+        """Get a copy of the index.
+
+        Returns:
+            The entries by file name, the total size in bytes and the UNIX time of the last change.
+        """
+
+        with self.lock:
+            self._load()
+            return dict(self.entries), self.total_bytes, self.updated
+
+    def save_if_due(self) -> None:
+        """Write the index to the disk if it has changes and it hasn't been written recently."""
+
+        if time.monotonic() - self.last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self) -> None:
+        """Write the index to the disk if it has changes."""
+
+        with self.lock:
+            if not self.dirty:
+                return
+
+            data = {
+                "version": INDEX_VERSION,
+                "total_bytes": self.total_bytes,
+                "updated": self.updated,
+                "entries": {name: list(entry) for name, entry in self.entries.items()},
+            }
+
+            summary = {"version": INDEX_VERSION, **self._summary()._asdict()}
+
+            self.dirty = False
+            self.last_save = time.monotonic()
+
+        try:
+            write_json(self.path, data)
+
+            # The totals are written after the index, so they are never newer than it
+            write_json(get_summary_path(self.songs_path), summary)
+
+        except OSError as e:
+            logger.error(f"Unable to save the cache index: {e}")
+
+
+@cache
+def get_cache_index(songs_path: Path) -> CacheIndex:
+    """Get the index of a songs cache folder, shared by the whole program.
+
+    Args:
+        songs_path: The folder where the songs are cached.
+
+    Returns:
+        The index of the folder.
+    """
+
+    return CacheIndex(songs_path)
+
+
+def lock_cache(cache_path: Path) -> TextIO | None:
+    """Take the lock that marks the cache as in use by this process, it's released when the process exits.
+
+    Args:
+        cache_path: The root cache path of the program.
+
+    Returns:
+        The file holding the lock, it should be kept open, or None if another process is using the cache.
+    """
+
+    cache_path.mkdir(parents=True, exist_ok=True)
+    lock_file = open(cache_path / "cache.lock", "w")
+
+    # The cache can't be locked in Windows, trust the user
+    if sys.platform == "win32":
+        return lock_file
+
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+
+    return lock_file
@@ -0,0 +1,325 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Inspect and maintain the song cache from the command line."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .cache_index import (
+    LEGACY_SONG_SUFFIX,
+    CacheIndex,
+    IndexEntry,
+    get_cache_index,
+    lock_cache,
+    parse_song_file_name,
+    read_summary,
+)
+from .media import ORIGINAL_FORMAT, get_songs_cache_path, migrate_legacy_song
+from .options import CacheCommand, Options
+
+if TYPE_CHECKING:
+    from knuckles import Subsonic
+
+logger = logging.getLogger(__name__)
+
+
+def format_size(size: int) -> str:
+    """Format an amount of bytes in the most readable unit.
+
+    Args:
+        size: The amount of bytes.
+
+    Returns:
+        The formatted size.
+    """
+
+    amount = float(size)
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if amount < 1024:
+            return f"{amount:.1f} {unit}"
+
+        amount /= 1024
+
+    return f"{amount:.1f} TiB"
+
+
+def get_index(options: Options) -> CacheIndex:
+    """Get the index of the songs cache.
+
+    Args:
+        options: The options of the program.
+
+    Returns:
+        The index.
+    """
+
+    return get_cache_index(get_songs_cache_path(options.cache_path))
+
+
+def cache_stats(options: Options) -> None:
+    """Log the totals of the cache, read from the index without walking the disk.
+
+    Args:
+        options: The options of the program.
+    """
+
+    # Only the totals are read, the whole index is loaded only if they are missing
+    summary = read_summary(get_songs_cache_path(options.cache_path))
+    if summary is None:
+        index = get_index(options)
+        summary = index.summary()
+
+        # Keep the index and its totals if they had to be rebuilt, unless the bot is writing them
+        cache_lock = lock_cache(options.cache_path)
+        if cache_lock is not None:
+            with cache_lock:
+                index.save()
+
+    logger.info(f"Cache path: {options.cache_path}")
+    logger.info(f"Songs: {summary.songs} ({format_size(summary.total_bytes)})")
+
+    if summary.updated > 0:
+        logger.info(f"Last change: {datetime.fromtimestamp(summary.updated).isoformat(" ", "seconds")}")
+
+    if summary.oldest_used is not None:
+        logger.info(
+            f"Least recently played: {datetime.fromtimestamp(summary.oldest_used).isoformat(" ", "seconds")}"
+        )
+
+
+def check_song(subsonic: "Subsonic", entry: IndexEntry | None, path: Path) -> str | None:
+    """Check that a cached song is complete and still exists in the server.
+
+    This call is blocking and should only be done in a worker thread.
+
+    Args:
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+        entry: The entry of the song in the index of the songs cache, None if it's missing.
+        path: The path of the song.
+
+    Returns:
+        The problem of the song or None if it's correct.
+
+    Raises:
+        Exception: If the server couldn't be asked about the song.
+    """
+
+    from knuckles.exceptions import ErrorCode70
+
+    if entry is None:
+        return "not in the index"
+
+    size = path.stat().st_size
+    if size == 0:
+        return "empty"
+
+    if size != entry.size:
+        return f"size changed from {entry.size} to {size} bytes since it was downloaded"
+
+    try:
+        song = subsonic.browsing.get_song(entry.song_id)
+    except ErrorCode70:
+        return "deleted from the server"
+
+    # Only the original files can be compared with the size reported by the server
+    if entry.format == ORIGINAL_FORMAT and song.size is not None and song.size != size:
+        return f"truncated, {size} of {song.size} bytes"
+
+    return None
+
+
+def cache_verify(subsonic: "Subsonic", options: Options, command: CacheCommand) -> None:
+    """Check all the cached songs against the server in parallel, deleting the broken ones if requested.
+
+    Args:
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+        options: The options of the program.
+        command: The requested maintenance.
+    """
+
+    # Only deleting songs needs the cache for itself, it's only read while the bot is running
+    cache_lock = lock_cache(options.cache_path)
+    if cache_lock is None and command.delete:
+        logger.error("The bot is running, stop it before deleting songs from the cache")
+        return
+
+    # The lock is held until the command ends
+    with cache_lock or nullcontext():
+        index = get_index(options)
+
+        # The index is only fixed when it's not being written by the bot
+        if cache_lock is not None:
+            index.reconcile()
+            index.save()
+        else:
+            logger.warning("The bot is running, the songs not in its last saved index are reported but not added")
+
+        paths = list(index.song_files())
+        entries, _, _ = index.snapshot()
+        logger.info(f"Verifying {len(paths)} songs with {command.workers} workers...")
+
+        start = time.monotonic()
+        broken = []
+        errors = 0
+
+        with ThreadPoolExecutor(command.workers, thread_name_prefix="cache-verify") as executor:
+            futures = {path: executor.submit(check_song, subsonic, entries.get(path.name), path) for path in paths}
+
+            for path, future in futures.items():
+                # The errors of knuckles don't share a common base class
+                try:
+                    problem = future.result()
+                except Exception as e:
+                    logger.warning(f"{path.name}: unable to check it in the server: {e}")
+                    errors += 1
+                    continue
+
+                if problem is None:
+                    continue
+
+                logger.warning(f"{path.name}: {problem}")
+                broken.append(path)
+
+        leftovers = sum(1 for path in index.songs_path.glob("*.part")) if index.songs_path.is_dir() else 0
+
+        logger.info(
+            f"Verified {len(paths)} songs in {time.monotonic() - start:.1f}s: {len(broken)} broken, "
+            + f"{errors} unchecked, {leftovers} interrupted downloads (remove them with `cache gc`)"
+        )
+
+        if not command.delete or not broken:
+            return
+
+        freed = 0
+        for path in broken:
+            entry = index.remove(path.name)
+            freed += entry.size if entry is not None else 0
+            path.unlink(missing_ok=True)
+
+        index.save()
+        logger.info(f"Deleted {len(broken)} broken songs, freeing {format_size(freed)}")
+
+
+def cache_prune(options: Options, command: CacheCommand) -> None:
+    """Delete the songs not played recently or the least recently played ones to fit a max size.
+
+    Args:
+        options: The options of the program.
+        command: The requested maintenance.
+    """
+
+    cache_lock = lock_cache(options.cache_path)
+    if cache_lock is None:
+        logger.error("The bot is running, stop it before pruning the cache")
+        return
+
+    # The lock is held until the command ends
+    with cache_lock:
+        index = get_index(options)
+        entries, total_bytes, _ = index.snapshot()
+
+        # Least recently played first
+        candidates = sorted(entries.items(), key=lambda item: item[1].last_used)
+
+        oldest_allowed = time.time() - command.max_age * 24 * 60 * 60 if command.max_age is not None else None
+        max_bytes = command.max_size * 1024**2 if command.max_size is not None else None
+
+        pruned = 0
+        freed = 0
+        for name, entry in candidates:
+            too_old = oldest_allowed is not None and entry.last_used < oldest_allowed
+            too_big = max_bytes is not None and total_bytes - freed > max_bytes
+
+            if not too_old and not too_big:
+                break
+
+            index.remove(name)
+            (index.songs_path / name).unlink(missing_ok=True)
+
+            pruned += 1
+            freed += entry.size
+
+        index.save()
+        logger.info(f"Pruned {pruned} songs, freeing {format_size(freed)}")
+
+
+def cache_gc(options: Options) -> None:
+    """Delete the interrupted downloads and unknown files of the cache and fix the index.
+
+    Args:
+        options: The options of the program.
+    """
+
+    cache_lock = lock_cache(options.cache_path)
+    if cache_lock is None:
+        logger.error("The bot is running, stop it before collecting the garbage of the cache")
+        return
+
+    # The lock is held until the command ends
+    with cache_lock:
+        index = get_index(options)
+
+        deleted = 0
+        migrated = 0
+        freed = 0
+        for folder in [index.songs_path, options.cache_path / "subsonic/cover-art"]:
+            if not folder.is_dir():
+                continue
+
+            for path in folder.iterdir():
+                if not path.is_file() or (folder == index.songs_path and parse_song_file_name(path.name) is not None):
+                    continue
+
+                # The songs cached only by their ID by older versions are moved to their new name as when played
+                if folder == index.songs_path and path.name.endswith(LEGACY_SONG_SUFFIX):
+                    if migrate_legacy_song(options.cache_path, path.name.removesuffix(LEGACY_SONG_SUFFIX)) is not None:
+                        migrated += 1
+
+                    continue
+
+                # Interrupted downloads of songs and cover arts, and unknown files
+                if path.suffix == ".part" or folder == index.songs_path:
+                    freed += path.stat().st_size
+                    path.unlink()
+                    deleted += 1
+
+        missing, untracked = index.reconcile()
+        index.save()
+
+        logger.info(f"Deleted {deleted} leftover files, freeing {format_size(freed)}")
+        logger.info(f"Moved {migrated} songs cached by older versions to their new names")
+        logger.info(f"Removed {missing} missing songs from the index and added {untracked} untracked ones")
+
+
+def run_cache_command(options: Options, subsonic: "Subsonic | None") -> None:
+    """Do the cache maintenance requested in the options.
+
+    Args:
+        options: The options of the program.
+        subsonic: The object to be used to access the OpenSubsonic REST API, only needed to verify the cache.
+    """
+
+    command = options.cache_command
+    if command is None:
+        return
+
+    match command.action:
+        case "stats":
+            cache_stats(options)
+
+        case "verify":
+            if subsonic is not None:
+                cache_verify(subsonic, options, command)
+
+        case "prune":
+            cache_prune(options, command)
+
+        case "gc":
+            cache_gc(options)
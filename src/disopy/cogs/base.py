@@ -4,16 +4,71 @@
 
 """Holds a generic cog for the rest of them to be based of."""
 
+import asyncio
 import logging
+import time
+from pathlib import Path
+from typing import Any, Coroutine, Final
 
 import discord
 from discord.ext.commands import Bot, Cog
 from discord.interactions import Interaction
 
+from ..config import Config
+from ..logging import log_command, log_guild
 from ..options import Options
+from ..timing import get_ack_latencies
+from ..traces import STARTED_EXTRA
 
 logger = logging.getLogger(__name__)
 
+# The title of the embeds sent by `Base.send_error`
+ERROR_TITLE: Final[str] = "Error ⚠️"
+
+# Seconds a command may run without answering before it's deferred, Discord drops the interactions that are not
+# acknowledged in 3 seconds
+AUTO_DEFER_DELAY: Final[float] = 1.5
+
+# Seconds after which Discord has already dropped an interaction that was not acknowledged
+ACK_WINDOW: Final[float] = 3.0
+
+# Seconds a command may run before being cancelled, unless it sets its own deadline
+DEFAULT_DEADLINE: Final[float] = 60.0
+
+# Key of the extras of a command to make its automatic defer ephemeral, for the commands with ephemeral answers
+EPHEMERAL_EXTRA: Final[str] = "ephemeral"
+
+# Key of the extras of a command with the seconds it may run, None for the commands that should never be cancelled
+DEADLINE_EXTRA: Final[str] = "deadline"
+
+# Key of the extras of an interaction with its pending automatic defer, a timer or the task sending it
+AUTO_DEFER_EXTRA: Final[str] = "auto_defer"
+
+
+def create_embed(user: discord.ClientUser | None, title: str, content: list[str] | None = None) -> discord.Embed:
+    """Create an embed with the style of the bot.
+
+    Args:
+        user: The user of the bot, used for the icon of the embed.
+        title: The title of the embed.
+        content: The content of the embed split in its lines.
+
+    Returns:
+        The new embed.
+    """
+
+    embed = discord.Embed(
+        description="\n".join(content) if content is not None else None, color=discord.Color.from_rgb(124, 0, 40)
+    )
+
+    icon_url = None
+    if user is not None and user.avatar is not None:
+        icon_url = user.avatar.url
+
+    embed.set_author(name=f"{title}", icon_url=icon_url)
+
+    return embed
+
 
 class Base(Cog):
     """Base cog for all the other ones, with some utility function."""
@@ -28,8 +83,209 @@ class Base(Cog):
         self.bot = bot
         self.options = options
 
+        self.ack_latencies = get_ack_latencies()
+
+        # The automatic defers and the answers of the cancelled commands, referenced until they are sent
+        self.background_tasks: set[asyncio.Task[None]] = set()
+
+    def reload_config(self, config: Config) -> None:
+        """Apply a new config while the bot is running, the cogs that use the config should override it.
+
+        Args:
+            config: The new config.
+        """
+
+    def guild_memory(self) -> dict[int, int]:
+        """Estimate the memory used by the state the cog keeps for each guild, the cogs with such state should
+        override it.
+
+        Returns:
+            The estimated bytes by guild ID.
+        """
+
+        return {}
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        """Attach the guild and command of the interaction to the logs of its handling, note when it started and
+        guard its acknowledgement and deadline.
+
+        Args:
+            interaction: The interaction being handled.
+
+        Returns:
+            Always true as all the interactions are allowed.
+        """
+
+        log_guild.set(interaction.guild_id)
+        log_command.set(interaction.command.name if interaction.command is not None else None)
+
+        interaction.extras[STARTED_EXTRA] = time.monotonic()
+        self.guard(interaction)
+
+        return True
+
+    def run_in_background(self, coroutine: Coroutine[Any, Any, None]) -> asyncio.Task[None]:
+        """Run a coroutine in a task that is kept referenced until it ends.
+
+        Args:
+            coroutine: The coroutine to run.
+
+        Returns:
+            The task running the coroutine.
+        """
+
+        task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+        return task
+
+    def guard(self, interaction: Interaction) -> None:
+        """Defer the interaction if the command doesn't answer in time and cancel the command once past its
+        deadline.
+
+        The command runs in the task that calls the checks, the timers are stopped when it ends.
+
+        Args:
+            interaction: The interaction being handled.
+        """
+
+        task = asyncio.current_task()
+        if task is None:
+            return
+
+        extras = interaction.command.extras if interaction.command is not None else {}
+        loop = asyncio.get_running_loop()
+
+        auto_defer = loop.call_later(
+            AUTO_DEFER_DELAY, self.auto_defer, interaction, task, extras.get(EPHEMERAL_EXTRA, False)
+        )
+        interaction.extras[AUTO_DEFER_EXTRA] = auto_defer
+        timers = [auto_defer]
+
+        deadline: float | None = extras.get(DEADLINE_EXTRA, DEFAULT_DEADLINE)
+        if deadline is not None:
+            timers.append(loop.call_later(deadline, self.expire, interaction, task, deadline))
+
+        def stop_timers(_: asyncio.Task[Any]) -> None:
+            for timer in timers:
+                timer.cancel()
+
+        task.add_done_callback(stop_timers)
+
+    def auto_defer(self, interaction: Interaction, task: asyncio.Task[Any], ephemeral: bool) -> None:
+        """Start deferring an interaction whose command has not answered in time.
+
+        Args:
+            interaction: The interaction being handled.
+            task: The task running the command.
+            ephemeral: If the answer should only be seen by the user that triggered the interaction.
+        """
+
+        if task.done() or interaction.response.is_done():
+            return
+
+        logger.debug(f"No answer after {AUTO_DEFER_DELAY}s, deferring the interaction")
+
+        interaction.extras[AUTO_DEFER_EXTRA] = self.run_in_background(self.send_defer(interaction, task, ephemeral))
+
+    def expire(self, interaction: Interaction, task: asyncio.Task[Any], deadline: float) -> None:
+        """Cancel a command that has been running for longer than its deadline and tell the user.
+
+        Args:
+            interaction: The interaction being handled.
+            task: The task running the command.
+            deadline: The seconds the command was allowed to run.
+        """
+
+        if task.done():
+            return
+
+        logger.warning(f"The command has not finished in {deadline:.0f}s, cancelling it")
+        task.cancel()
+
+        self.run_in_background(self.send_error(interaction, ["The command took too long and has been cancelled"]))
+
+    async def send_defer(
+        self, interaction: Interaction, task: asyncio.Task[Any] | None = None, ephemeral: bool = False
+    ) -> None:
+        """Defer an interaction, recording its acknowledgement latency.
+
+        Args:
+            interaction: The interaction to defer.
+            task: The task running the command, it's cancelled if the interaction can't be deferred as the user
+                will never see its answer.
+            ephemeral: If the answer should only be seen by the user that triggered the interaction.
+        """
+
+        try:
+            await interaction.response.defer(thinking=True, ephemeral=ephemeral)
+        except discord.HTTPException as e:
+            logger.error(f"Failed to defer the interaction: {e}")
+
+            if task is not None:
+                task.cancel()
+
+            return
+
+        self.record_ack(interaction)
+
+    async def settle_auto_defer(self, interaction: Interaction) -> None:
+        """Stop the automatic defer of an interaction that is about to be answered, waiting for it if it's already
+        being sent.
+
+        Args:
+            interaction: The interaction being handled.
+        """
+
+        pending = interaction.extras.pop(AUTO_DEFER_EXTRA, None)
+
+        if isinstance(pending, asyncio.TimerHandle):
+            pending.cancel()
+
+        # Waiting doesn't cancel the defer if the command is cancelled meanwhile
+        elif isinstance(pending, asyncio.Task) and not pending.done():
+            await asyncio.wait([pending])
+
+    def record_ack(self, interaction: Interaction) -> None:
+        """Record how long an interaction took to be acknowledged.
+
+        Args:
+            interaction: The acknowledged interaction.
+        """
+
+        started = interaction.extras.get(STARTED_EXTRA)
+        if started is None or interaction.command is None:
+            return
+
+        latency = time.monotonic() - started
+        self.ack_latencies.record(interaction.command.qualified_name, latency)
+
+        if latency > ACK_WINDOW:
+            logger.warning(f"The interaction was acknowledged after {latency:.2f}s, Discord may have dropped it")
+
+    async def defer(self, interaction: Interaction, ephemeral: bool = False) -> None:
+        """Acknowledge an interaction to answer it later, the user sees that the bot is thinking.
+
+        It does nothing if the interaction has already been acknowledged, also if it was deferred automatically.
+
+        Args:
+            interaction: The interaction to defer.
+            ephemeral: If the answer should only be seen by the user that triggered the interaction.
+        """
+
+        await self.settle_auto_defer(interaction)
+
+        if not interaction.response.is_done():
+            await self.send_defer(interaction, ephemeral=ephemeral)
+
     async def send_answer(
-        self, interaction: Interaction, title: str, content: list[str] | None = None, ephemeral: bool = False
+        self,
+        interaction: Interaction,
+        title: str,
+        content: list[str] | None = None,
+        ephemeral: bool = False,
+        thumbnail: Path | None = None,
     ) -> None:
         """Send an embed as the response of an interaction.
 
@@ -38,36 +294,37 @@ class Base(Cog):
             title: The title of the embed.
             content: The content of the embed split in its lines.
             ephemeral: If the message should only be seen by the user that triggered the interaction.
+            thumbnail: An image in the disk to be attached as the thumbnail of the embed.
         """
 
         if self.options.debug >= 3:
-            logger.debug(f"Sending embed (Title: {title} Content: {content} Ephemeral: {ephemeral})")
-
-        embed: discord.Embed = discord.Embed(
-            description="\n".join(content) if content is not None else None, color=discord.Color.from_rgb(124, 0, 40)
-        )
+            logger.debug(
+                f"Sending embed (Title: {title} Content: {content} Ephemeral: {ephemeral} Thumbnail: {thumbnail})"
+            )
 
         if self.bot.user is None:
             logger.error("The bot doesn't have a user attach to it!")
             return
 
-        icon_url = None
-        if self.bot.user.avatar is not None:
-            icon_url = self.bot.user.avatar.url
+        embed = create_embed(self.bot.user, title, content)
+
+        if thumbnail is not None:
+            embed.set_thumbnail(url=f"attachment://{thumbnail.name}")
+
+        files = [discord.File(thumbnail)] if thumbnail is not None else []
+
+        # Once the automatic defer is settled it's known if the answer is the response or a followup
+        await self.settle_auto_defer(interaction)
 
-        embed.set_author(name=f"{title}", icon_url=icon_url)
         try:
-            await interaction.response.send_message(embed=embed, ephemeral=ephemeral)
-        except discord.InteractionResponded:
-            # Already responded, send as followup
-            await interaction.followup.send(embed=embed, ephemeral=ephemeral)
-        except Exception as e:
-            logger.error(f"Failed to send interaction response: {e}")
-            # Optionally, try followup as fallback
-            try:
-                await interaction.followup.send(embed=embed, ephemeral=ephemeral)
-            except Exception as e2:
-                logger.error(f"Failed to send followup message: {e2}")
+            if interaction.response.is_done():
+                await interaction.followup.send(embed=embed, ephemeral=ephemeral, files=files)
+            else:
+                await interaction.response.send_message(embed=embed, ephemeral=ephemeral, files=files)
+                self.record_ack(interaction)
+
+        except discord.HTTPException as e:
+            logger.error(f"Failed to answer the interaction: {e}")
 
     async def send_error(self, interaction: Interaction, error_content: list[str], ephemeral: bool = False) -> None:
-        await self.send_answer(interaction, "Error ⚠️", error_content, ephemeral)
+        await self.send_answer(interaction, ERROR_TITLE, error_content, ephemeral)
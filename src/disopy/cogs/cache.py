@@ -0,0 +1,147 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Holds the cog for song cache management commands."""
+
+import asyncio
+import logging
+
+import discord
+from discord import app_commands
+from discord.ext.commands import Bot
+from discord.interactions import Interaction
+from knuckles import Subsonic
+
+from ..config import Config
+from ..media import MediaPolicy, SongFetcher
+from ..options import Options
+from ..warmup import PROGRESS_INTERVAL, CacheWarmer, WarmupProgress, resolve_songs
+from .base import DEADLINE_EXTRA, Base, create_embed
+
+logger = logging.getLogger(__name__)
+
+
+class CacheCog(Base):
+    """Cog that holds song cache management commands."""
+
+    def __init__(self, bot: Bot, options: Options, subsonic: Subsonic, config: Config) -> None:
+        """The constructor of the cog.
+
+        Args:
+            bot: The bot attached to the cog.
+            options: The options of the program.
+            subsonic: The object to be used to access the OpenSubsonic REST API.
+            config: The config of the program.
+        """
+
+        super().__init__(bot, options)
+
+        self.subsonic = subsonic
+        self.config = config
+
+        self.fetcher = SongFetcher(subsonic, options, MediaPolicy.from_config(config))
+        self.warmer: CacheWarmer | None = None
+
+    def reload_config(self, config: Config) -> None:
+        """Apply a new config while the bot is running.
+
+        Args:
+            config: The new config.
+        """
+
+        self.config = config
+        self.fetcher.set_policy(MediaPolicy.from_config(config))
+
+    async def cog_unload(self) -> None:
+        """Stop the running warm-up."""
+
+        if self.warmer is not None:
+            self.warmer.cancel()
+
+    # The warm-up keeps downloading after the answer can't be edited anymore, it's never cancelled
+    @app_commands.command(
+        description="Download all the songs of an album, artist or playlist to the cache", extras={DEADLINE_EXTRA: None}
+    )
+    @app_commands.choices(
+        what=[
+            app_commands.Choice(name="Song", value="song"),
+            app_commands.Choice(name="Album", value="album"),
+            app_commands.Choice(name="Artist", value="artist"),
+            app_commands.Choice(name="Playlist", value="playlist"),
+        ]
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def warmup(
+        self,
+        interaction: Interaction,
+        query: str,
+        # Ignore the MyPy error because discord.py uses the type to add autocompletion
+        what: app_commands.Choice[str] = "playlist",  # type: ignore
+        workers: app_commands.Range[int, 1, 16] = 4,
+        bandwidth: app_commands.Range[int, 0] = 0,
+    ) -> None:
+        """Download the songs of an element to the cache, editing the answer with the progress.
+
+        Args:
+            interaction: The interaction that started the command.
+            query: The name of the element.
+            what: The kind of the element.
+            workers: How many songs should be downloaded at the same time.
+            bandwidth: The max download speed in KiB/s, zero for no limit.
+        """
+
+        if self.warmer is not None:
+            await self.send_error(
+                interaction, ["A warm-up is already running", self.warmer.progress.describe()], ephemeral=True
+            )
+            return
+
+        await self.defer(interaction)
+
+        # Extract the type of element to be search, taking care of the default value
+        choice = what if isinstance(what, str) else what.value
+
+        resolved = await asyncio.to_thread(resolve_songs, self.subsonic, choice, query)
+        if resolved is None:
+            await self.send_error(interaction, [f"No {choice} found with the name: **{query}**"])
+            return
+
+        name, song_ids = resolved
+        logger.info(f"Warming the cache with the {len(song_ids)} songs of '{name}'")
+
+        warmer = CacheWarmer(self.fetcher, workers, bandwidth)
+        self.warmer = warmer
+
+        task = asyncio.create_task(asyncio.to_thread(warmer.run, song_ids))
+
+        try:
+            while not task.done():
+                await self.show_progress(interaction, f"📥 Warming the cache with {name}", warmer.progress)
+                await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+
+            progress = await task
+
+        finally:
+            self.warmer = None
+            await asyncio.to_thread(self.fetcher.index.save)
+
+        logger.info(f"Cache warmed: {progress.describe()}")
+        await self.show_progress(interaction, f"✅ Cache warmed with {name}", progress)
+
+    async def show_progress(self, interaction: Interaction, title: str, progress: WarmupProgress) -> None:
+        """Edit the answer of the warm-up with its progress.
+
+        Args:
+            interaction: The interaction that started the warm-up.
+            title: The title of the answer.
+            progress: The progress of the warm-up.
+        """
+
+        try:
+            await interaction.edit_original_response(embed=create_embed(self.bot.user, title, [progress.describe()]))
+
+        # The interaction token expires after 15 minutes, the warm-up keeps going
+        except discord.HTTPException as e:
+            logger.debug(f"Unable to show the progress of the warm-up: {e}")
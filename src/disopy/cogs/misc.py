@@ -4,33 +4,67 @@
 
 """Holds the cog for misc commands."""
 
+import asyncio
+from typing import Final
+
 import discord
 from discord import app_commands
 from discord.ext.commands import Bot
 from discord.interactions import Interaction
 from knuckles import Subsonic
 
+from ..command_tree import GLOBAL_SCOPE, get_command_tree_hash, save_command_tree_hash
 from ..config import Config
+from ..hot_cache import get_hot_cache
+from ..media import get_songs_cache_path
+from ..memory import MemoryProfiler, get_rss
 from ..options import Options
-from .base import Base
+from .base import EPHEMERAL_EXTRA, Base
+
+# Max number of lines of code listed by the memory command
+TOP_ALLOCATORS_LIMIT: Final[int] = 10
+
+# Max number of guilds listed by the memory command
+TOP_GUILDS_LIMIT: Final[int] = 5
+
+# Max number of commands listed by the ping command with their acknowledgement latencies, the slowest first
+SLOWEST_ACKS_LIMIT: Final[int] = 5
 
 
 class Misc(Base):
     """Cog that holds miscellaneous commands."""
 
-    def __init__(self, bot: Bot, options: Options, subsonic: Subsonic, config: Config) -> None:
+    def __init__(
+        self,
+        bot: Bot,
+        options: Options,
+        subsonic: Subsonic,
+        config: Config,
+        memory_profiler: MemoryProfiler | None = None,
+    ) -> None:
         """The constructor of the cog.
 
         Args:
             bot: The bot attached to the cog.
             subsonic: The object to be used to access the OpenSubsonic REST API.
             config: The config of the program.
+            memory_profiler: The profiler of the memory allocations, None if the memory is not being traced.
         """
 
         super().__init__(bot, options)
 
         self.subsonic = subsonic
         self.config = config
+        self.memory_profiler = memory_profiler
+
+    def reload_config(self, config: Config) -> None:
+        """Apply a new config while the bot is running.
+
+        Args:
+            config: The new config.
+        """
+
+        self.config = config
 
     @app_commands.command(description="Get the latency of the bot")
     async def ping(self, interaction: Interaction) -> None:
@@ -40,18 +74,26 @@ class Misc(Base):
             interaction: The interaction that started the command.
         """
 
-        # Defer immediately to avoid timeout
-        await interaction.response.defer(thinking=True)
+        await self.defer(interaction)
 
-        subsonic_status = "✅ Ok" if self.subsonic.system.ping().status == "ok" else "❌ Failed"
+        ping = await asyncio.to_thread(self.subsonic.system.ping)
+        subsonic_status = "✅ Ok" if ping.status == "ok" else "❌ Failed"
 
-        await self.send_answer(
-            interaction,
-            "🏓 Pong!",
-            [f"Bot latency: **{int(self.bot.latency * 1000)}ms**", f"Subsonic status: **{subsonic_status}**"],
-        )
+        content = [f"Bot latency: **{int(self.bot.latency * 1000)}ms**", f"Subsonic status: **{subsonic_status}**"]
+
+        ack_latencies = sorted(self.ack_latencies.summary().items(), key=lambda item: item[1].p95, reverse=True)
+        if ack_latencies:
+            content.extend(["", "Acknowledged in (p50 / p95):"])
+            for name, summary in ack_latencies[:SLOWEST_ACKS_LIMIT]:
+                content.append(
+                    f"- /{name}: **{summary.p50 * 1000:.0f} / {summary.p95 * 1000:.0f}ms** ({summary.samples} times)"
+                )
 
-    @app_commands.command(description="Sync the slash commands to the Discord cache globaly")
+        await self.send_answer(interaction, "🏓 Pong!", content)
+
+    @app_commands.command(
+        description="Sync the slash commands to the Discord cache globaly", extras={EPHEMERAL_EXTRA: True}
+    )
     async def sync(self, interaction: discord.Interaction) -> None:
         """Reloads the command tree globally, only if the user is authorized by the config.
 
@@ -64,4 +106,65 @@ class Misc(Base):
             return
 
         await self.bot.tree.sync()
+        save_command_tree_hash(self.options, GLOBAL_SCOPE, get_command_tree_hash(self.bot.tree))
+
         await self.send_answer(interaction, "🔁 Command tree reloaded", ephemeral=True)
+
+    @app_commands.command(description="Show the memory usage of the bot")
+    @app_commands.default_permissions(administrator=True)
+    async def memory(self, interaction: Interaction) -> None:
+        """Report the memory of the process, the state kept for each guild and the top allocators, only if the user
+        is authorized by the config.
+
+        Args:
+            interaction: The interaction that started the command.
+        """
+
+        # The report shows the state of every guild, so it's only for the operators of the bot
+        if str(interaction.user.id) not in self.config.developer_discord_sync_users:
+            await self.send_error(interaction, ["❌ Action not authorized"], ephemeral=True)
+            return
+
+        await self.defer(interaction, ephemeral=True)
+
+        content = []
+
+        rss = get_rss()
+        if rss is not None:
+            content.append(f"Resident memory: **{rss / 1024**2:.1f} MiB**")
+
+        guild_sizes: dict[int, int] = {}
+        for cog in self.bot.cogs.values():
+            if isinstance(cog, Base):
+                for guild_id, size in cog.guild_memory().items():
+                    guild_sizes[guild_id] = guild_sizes.get(guild_id, 0) + size
+
+        content.append(
+            f"Guild state: **{sum(guild_sizes.values()) / 1024:.1f} KiB** in **{len(guild_sizes)}** guilds"
+        )
+        for guild_id, size in sorted(guild_sizes.items(), key=lambda item: item[1], reverse=True)[:TOP_GUILDS_LIMIT]:
+            content.append(f"- `{guild_id}`: {size / 1024:.1f} KiB")
+
+        content.append(
+            f"Discord cache: {len(self.bot.guilds)} guilds, {len(self.bot.users)} users, "
+            + f"{len(self.bot.cached_messages)} messages"
+        )
+
+        # The songs in memory are anonymous files that don't count in the resident memory
+        hot_cache = get_hot_cache(get_songs_cache_path(self.options.cache_path))
+        if hot_cache.max_bytes > 0:
+            songs, size = hot_cache.summary()
+            content.append(
+                f"Songs in memory: **{size / 1024**2:.1f} MiB** of {hot_cache.max_bytes / 1024**2:.0f} MiB "
+                + f"in {songs} songs"
+            )
+
+        content.append("")
+        if self.memory_profiler is None:
+            content.append("_Start the bot with `--trace-memory` to see the top allocators_")
+        else:
+            content.append("Top allocators since the tracing started:")
+            top_allocators = await asyncio.to_thread(self.memory_profiler.top_allocators, TOP_ALLOCATORS_LIMIT)
+            content.extend(f"`{allocator}`" for allocator in top_allocators)
+
+        await self.send_answer(interaction, "🧠 Memory usage", content, ephemeral=True)
@@ -4,20 +4,42 @@
 
 """Holds the cog for queue handling and music playback commands."""
 
+import asyncio
 import logging
-from collections import deque
-from typing import Iterable, NamedTuple, cast
+import time
+from asyncio import AbstractEventLoop
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from enum import Enum, auto
+from functools import partial
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Final, Iterable, Literal, NamedTuple, cast
 
 import discord
 from discord import PCMVolumeTransformer, VoiceClient, app_commands
-import requests
+from discord.abc import Messageable
+from discord.ext import tasks
 from discord.ext.commands import Bot
 from discord.interactions import Interaction
+from knuckles import Song as SubsonicSong
 from knuckles import Subsonic
+from knuckles.exceptions import ErrorCode70
 
+from ..audio import FRAMES_PER_SECOND, BufferedSource, PlaybackEngine, Track
+from ..blocked_list import BlockedList
 from ..config import Config
+from ..cover_art import CoverArtCache
+from ..fair_queue import FairQueue
+from ..logging import log_command, log_guild
+from ..media import MediaPolicy, SongFetcher
+from ..memory import get_deep_size
+from ..now_playing import NowPlayingMessage, NowPlayingView, format_progress
 from ..options import Options
-from .base import Base
+from ..radio import StationListener
+from ..ranking import get_album_fields, get_playlist_fields, get_song_fields, rank
+from ..scrobbler import Scrobbler, should_scrobble
+from .base import EPHEMERAL_EXTRA, Base, create_embed
 
 
 class Song(NamedTuple):
@@ -26,106 +48,937 @@ class Song(NamedTuple):
     Attributes:
         id: The ID in the Subsonic server.
         title: The title of the song.
+        duration: The duration in seconds of the song if known.
+        requester: The ID of the user that added the song to the queue.
+        cover_art: The ID of the cover art in the Subsonic server if it has one.
     """
 
     id: str
     title: str
+    duration: int | None = None
+    requester: int = 0
+    cover_art: str | None = None
 
+    @classmethod
+    def from_subsonic(cls, song: SubsonicSong, requester: int) -> "Song | None":
+        """Create a new song from the one returned by the Subsonic server.
+
+        Args:
+            song: The song returned by the server.
+            requester: The ID of the user that added the song to the queue.
+
+        Returns:
+            The song or None if it's missing its title.
+        """
+
+        if song.title is None:
+            return None
+
+        return cls(song.id, song.title, song.duration, requester, song.cover_art.id if song.cover_art else None)
+
+
+class SongsReference(NamedTuple):
+    """The songs of an album or playlist not fetched yet, expanded in pages when they are about to be played.
+
+    Attributes:
+        kind: If the songs are of an album or a playlist.
+        id: The ID of the album or playlist in the Subsonic server.
+        name: The name of the album or playlist.
+        offset: The position in the album or playlist of the first song not expanded yet.
+        remaining: The number of songs not expanded yet if known.
+        requester: The ID of the user that added the songs to the queue.
+        cover_art: The ID of the cover art in the Subsonic server if it has one.
+        song_ids: The IDs of the songs not expanded yet, None until the first page is fetched.
+    """
+
+    kind: Literal["album", "playlist"]
+    id: str
+    name: str
+    offset: int = 0
+    remaining: int | None = None
+    requester: int = 0
+    cover_art: str | None = None
+    song_ids: tuple[str, ...] | None = None
+
+    @property
+    def title(self) -> str:
+        """The name shown in the queue, with the songs left when known."""
+
+        if self.remaining is None:
+            return self.name
+
+        return f"{self.name} ({self.remaining} songs)"
+
+
+# An element of the queue, a single song or the songs of an album or playlist to be expanded
+QueueEntry = Song | SongsReference
 
 logger = logging.getLogger(__name__)
 
+# Seconds between each check for idle voice connections
+IDLE_CHECK_INTERVAL: Final[int] = 30
+
+# Max number of songs listed by the queue command
+QUEUE_DISPLAY_LIMIT: Final[int] = 20
+
+# Results asked to the server for every search, they are ranked locally and the closest one to the query is used
+SEARCH_CANDIDATES: Final[int] = 20
+
+# Songs of an album or playlist put in the queue every time it reaches the front, the rest stays as a reference
+EXPANSION_PAGE_SIZE: Final[int] = 50
+
+# Songs of a page asked to the server at the same time, after the first page only their IDs are known
+EXPANSION_WORKERS: Final[int] = 8
+
+
+def get_requester(entry: QueueEntry) -> int:
+    """Get the user that added an element to the queue.
+
+    Args:
+        entry: The element of the queue.
+
+    Returns:
+        The ID of the user.
+    """
+
+    return entry.requester
+
+
+def count_songs(entries: Iterable[QueueEntry]) -> int:
+    """Count the songs of the elements of a queue, including the ones of the albums and playlists not expanded yet.
+
+    Args:
+        entries: The elements of the queue.
+
+    Returns:
+        The number of songs, the references with an unknown size count as one.
+    """
+
+    return sum((entry.remaining or 1) if isinstance(entry, SongsReference) else 1 for entry in entries)
+
+
+class Queue:
+    """Manage the queue and split it per guild."""
+
+    def __init__(self, fair: bool = False, fair_weights: dict[int, int] | None = None) -> None:
+        """Create a new queue.
+
+        Args:
+            fair: If the songs of every user should be interleaved instead of played in the order they were added.
+            fair_weights: How many songs in a row each user ID gets in its turn.
+        """
+
+        self.fair = fair
+        self.fair_weights = fair_weights
+
+        self.queue: dict[str, BlockedList[QueueEntry] | FairQueue[QueueEntry]] = {}
+
+    def _check_guild(self, interaction: Interaction, create: bool = True) -> str | None:
+        """Check if a guild has an associated queue and if not creates a new one.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+            create: If the queue should be created when missing, the operations that only read it don't need it.
+
+        Returns:
+            Either the guild ID or None if the interaction did not have a guild attach to it or it has no queue and
+            it should not be created.
+        """
+
+        if interaction.guild is None:
+            logger.error("The guild of the interaction was None!")
+            return None
+
+        id = str(interaction.guild.id)
+
+        if id not in self.queue:
+            if not create:
+                return None
+
+            self.queue[id] = FairQueue(get_requester, self.fair_weights) if self.fair else BlockedList()
+
+        return id
+
+    def _drop_if_empty(self, id: str) -> None:
+        """Free the queue of a guild if it has no songs left, so the guilds that stop using the bot are not kept.
+
+        Args:
+            id: The guild ID.
+        """
+
+        if len(self.queue[id]) == 0:
+            del self.queue[id]
+
+    def set_fair_weights(self, fair_weights: dict[int, int]) -> None:
+        """Change how many songs in a row each user gets in its turn, also in the already existing queues.
+
+        Args:
+            fair_weights: How many songs in a row each user ID gets in its turn.
+        """
+
+        self.fair_weights = fair_weights
+
+        for queue in self.queue.values():
+            if isinstance(queue, FairQueue):
+                queue.weights = fair_weights
+
+    def get(self, interaction: Interaction) -> Iterable[QueueEntry]:
+        """Get the queue of a guild.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+
+        Returns:
+            An iterable with the elements of the queue.
+        """
+
+        id = self._check_guild(interaction, create=False)
+        if id is None:
+            return []
+
+        return self.queue[id]
+
+    def peek(self, interaction: Interaction) -> QueueEntry | None:
+        """Get the next element of the queue without removing it.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+
+        Returns:
+            The next element in the queue or None if it's empty.
+        """
+
+        return next(iter(self.get(interaction)), None)
+
+    def pop(self, interaction: Interaction) -> QueueEntry | None:
+        """Remove and get one element from the queue.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+
+        Returns:
+            The next element in the queue or None if the action failed.
+        """
+
+        id = self._check_guild(interaction, create=False)
+        if id is None:
+            return None
+
+        song = self.queue[id].pop(0)
+        self._drop_if_empty(id)
+
+        return song
+
+    def append(self, interaction: Interaction, song: QueueEntry) -> None:
+        """Append new songs to the queue.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+            song: The song or the reference to the songs to append.
+        """
+
+        id = self._check_guild(interaction)
+        if id is None:
+            return
+
+        return self.queue[id].append(song)
+
+    def restore(self, interaction: Interaction, song: QueueEntry) -> None:
+        """Put back a song taken from the queue so it's the next one to be played.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+            song: The song to put back.
+        """
+
+        id = self._check_guild(interaction)
+        if id is None:
+            return
+
+        self.queue[id].insert(0, song)
+
+    def insert(self, interaction: Interaction, index: int, song: QueueEntry) -> None:
+        """Insert a song at a position of the queue.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+            index: The position, starting from zero, where the song should be.
+            song: The song to insert.
+        """
+
+        id = self._check_guild(interaction)
+        if id is None:
+            return
+
+        self.queue[id].insert(index, song)
+
+    def remove(self, interaction: Interaction, index: int) -> QueueEntry | None:
+        """Remove an element from a position of the queue.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+            index: The position, starting from zero, of the element.
+
+        Returns:
+            The removed element or None if the action failed.
+        """
+
+        id = self._check_guild(interaction, create=False)
+        if id is None:
+            return None
+
+        song = self.queue[id].pop(index)
+        self._drop_if_empty(id)
+
+        return song
+
+    def replace(self, interaction: Interaction, index: int, entries: list[QueueEntry]) -> None:
+        """Replace an element of the queue with several ones, used to expand the albums and playlists.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+            index: The position, starting from zero, of the element.
+            entries: The elements that take its place, none to remove it.
+        """
+
+        id = self._check_guild(interaction, create=False)
+        if id is None:
+            return
+
+        self.queue[id].replace(index, entries)
+        self._drop_if_empty(id)
+
+    def move(self, interaction: Interaction, source: int, destination: int) -> tuple[QueueEntry, int] | None:
+        """Move an element to another position of the queue.
+
+        In the fair mode the element keeps the turns of its requester, so it may end after the destination.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+            source: The current position, starting from zero, of the element.
+            destination: The new position, starting from zero, of the element.
+
+        Returns:
+            The moved element and its new position, or None if the action failed.
+        """
+
+        id = self._check_guild(interaction, create=False)
+        if id is None:
+            return None
+
+        queue = self.queue[id]
+        element = queue.move(source, destination)
+
+        return element, queue.position(element) if isinstance(queue, FairQueue) else destination
+
+    def length(self, interaction: Interaction) -> int:
+        """Get the length of the queue.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+
+        Returns:
+            The length of the queue.
+        """
+
+        id = self._check_guild(interaction, create=False)
+        if id is None:
+            # A little ugly but gets the job done
+            return 0
+
+        return len(self.queue[id])
+
+    def drop(self, interaction: Interaction) -> None:
+        """Free the queue of a guild.
+
+        Args:
+            interaction: The interaction where the guild ID can be found.
+        """
+
+        if interaction.guild is None:
+            return
+
+        self.queue.pop(str(interaction.guild.id), None)
+
+
+class PlayerEvent(Enum):
+    """The events that make a guild player advance.
+
+    Attributes:
+        PLAY: New songs have been added or the playback has been requested.
+        FINISHED: The playback in the voice client has ended.
+        ADVANCED: The engine has started playing its next track.
+    """
+
+    PLAY = auto()
+    FINISHED = auto()
+    ADVANCED = auto()
+
+
+class GuildPlayer:
+    """Drive the music playback of a guild from a task in the event loop.
+
+    The audio thread of discord.py only notifies the player through the event loop, so the queue and the playback
+    state are only modified from the loop and the downloads never block the audio.
+    """
+
+    def __init__(
+        self,
+        interaction: Interaction,
+        queue: Queue,
+        subsonic: Subsonic,
+        fetcher: SongFetcher,
+        cover_arts: CoverArtCache | None,
+        scrobbler: Scrobbler | None,
+        config: Config,
+        loop: AbstractEventLoop,
+    ) -> None:
+        """Create a new player, it should be created from the event loop.
+
+        Args:
+            interaction: The interaction where the guild will be extracted.
+            queue: The queue of songs of the bot.
+            subsonic: The object to be used to access the OpenSubsonic REST API.
+            fetcher: The fetcher used to download the songs.
+            cover_arts: The cache of the cover art thumbnails, None if they are disabled.
+            scrobbler: The scrobbler where the played songs are reported, None if it's disabled.
+            config: The config of the program.
+            loop: The event loop where the player runs.
+        """
+
+        self.interaction = interaction
+        self.queue = queue
+        self.subsonic = subsonic
+        self.fetcher = fetcher
+        self.cover_arts = cover_arts
+        self.scrobbler = scrobbler
+        self.config = config
+        self.loop = loop
+
+        self.engine: PlaybackEngine[Song] | None = None
+        self.volume_transformer: PCMVolumeTransformer[PlaybackEngine[Song]] | None = None
+        self.buffer: BufferedSource | None = None
+        self.now_playing: Song | None = None
+
+        # The track being played and when it started, to be scrobbled once it ends
+        self.current_track: Track[Song] | None = None
+        self.current_started: datetime | None = None
+
+        # Increased every time the playback is started or stopped to discard the events of old playbacks
+        self.generation = 0
+
+        # Monotonic time since the player has no audio playing or no one listening, None if it's active
+        self.idle_since: float | None = None
+        self.closed = False
+
+        self.events: asyncio.Queue[tuple[PlayerEvent, Any]] = asyncio.Queue()
+        self.task = loop.create_task(self.run())
+
+        self.now_playing_message: NowPlayingMessage | None = None
+        if isinstance(interaction.channel, Messageable):
+            self.now_playing_message = NowPlayingMessage(interaction.channel, self.render_now_playing, loop)
+
+    def post(self, event: PlayerEvent, data: Any = None) -> None:
+        """Notify an event to the player from the event loop.
+
+        Args:
+            event: The event to notify.
+            data: The data attached to the event.
+        """
+
+        self.events.put_nowait((event, data))
+
+    def post_threadsafe(self, event: PlayerEvent, data: Any = None) -> None:
+        """Notify an event to the player from any thread, it never blocks.
+
+        Args:
+            event: The event to notify.
+            data: The data attached to the event.
+        """
+
+        self.loop.call_soon_threadsafe(self.post, event, data)
+
+    def get_voice_client(self) -> VoiceClient | None:
+        """Get the voice client of the guild.
+
+        Returns:
+            The voice client or None if the bot is not connected.
+        """
+
+        guild = self.interaction.guild
+        if guild is None or guild.voice_client is None:
+            return None
+
+        return cast(VoiceClient, guild.voice_client)
+
+    async def run(self) -> None:
+        """Handle the events of the player one by one."""
+
+        # The task inherits the context of the command that created the player
+        log_guild.set(self.interaction.guild_id)
+        log_command.set(None)
+
+        while True:
+            event, data = await self.events.get()
+
+            try:
+                await self.handle(event, data)
+            except Exception:
+                logger.exception(f"Failed to handle the player event '{event.name}'")
+
+            self.refresh()
+
+    async def handle(self, event: PlayerEvent, data: Any) -> None:
+        """Handle an event of the player.
+
+        Args:
+            event: The event to handle.
+            data: The data attached to the event.
+        """
+
+        match event:
+            case PlayerEvent.PLAY:
+                if self.engine is None:
+                    await self.play_queue()
+                else:
+                    await self.prefetch_next()
+
+            case PlayerEvent.FINISHED:
+                generation, exception = data
+                if generation != self.generation:
+                    return
+
+                if exception is not None:
+                    logger.error(f"The playback ended with an error: {exception}")
+
+                # The next song could have been prepared after the playback ended
+                prepared_track = self.engine.take_next() if self.engine is not None else None
+
+                self.finish_track()
+                self.engine = None
+                self.volume_transformer = None
+                self.buffer = None
+                self.now_playing = None
+                await self.play_queue(prepared_track)
+
+            case PlayerEvent.ADVANCED:
+                song: Song = data.item
+                logger.info(f"Playing song: '{song.title if song.title else "N/A"}' ({song.id})")
+
+                self.now_playing = song
+                self.start_track(data)
+                await self.prefetch_next()
+
+    def refresh(self) -> None:
+        """Ask for the now playing message to show the current state of the player, it never blocks."""
+
+        if self.now_playing_message is not None:
+            self.now_playing_message.request_update()
+
+    def render_now_playing(self) -> NowPlayingView:
+        """Get the current state of the player to be shown in the now playing message.
+
+        Returns:
+            The view of the now playing message.
+        """
+
+        user = self.interaction.client.user
+
+        song = self.now_playing
+        engine = self.engine
+        if song is None or engine is None:
+            return NowPlayingView(create_embed(user, "⏹️ Nothing playing"))
+
+        voice_client = self.get_voice_client()
+        paused = voice_client is not None and voice_client.is_paused()
+
+        content = [f"**{song.title}**"]
+        if song.requester != 0:
+            content.append(f"Added by <@{song.requester}>")
+
+        elapsed = engine.current.frames_read // FRAMES_PER_SECOND
+        progress = format_progress(elapsed, song.duration)
+        if self.volume_transformer is not None:
+            progress += f" 🔊 {round(self.volume_transformer.volume * 100)}%"
+
+        content.extend(["", progress])
+
+        # The next song may have already been taken from the queue to be prepared
+        next_song = engine.next.item if engine.next is not None else next(iter(self.queue.get(self.interaction)), None)
+        if next_song is not None:
+            content.extend(["", f"Next: **{next_song.title}**"])
+
+        thumbnail = None
+        if self.cover_arts is not None and song.cover_art is not None:
+            thumbnail = self.cover_arts.get_cached(song.cover_art)
+
+        return NowPlayingView(
+            create_embed(user, "⏸️ Paused" if paused else "🎶 Now playing", content),
+            thumbnail,
+            playing=True,
+            live=not paused,
+        )
+
+    def start_track(self, track: Track[Song]) -> None:
+        """Register that a track has started playing, finishing the previous one.
+
+        Args:
+            track: The track that started playing.
+        """
+
+        self.finish_track()
+
+        self.current_track = track
+        self.current_started = datetime.now(timezone.utc)
+
+        if self.scrobbler is not None:
+            self.scrobbler.now_playing(track.item.id)
+
+    def finish_track(self) -> None:
+        """Register that the current track has stopped playing, scrobbling it if it was played long enough."""
+
+        track = self.current_track
+        started = self.current_started
+
+        self.current_track = None
+        self.current_started = None
+
+        if self.scrobbler is None or track is None or started is None:
+            return
+
+        if should_scrobble(track.frames_read // FRAMES_PER_SECOND, track.item.duration):
+            self.scrobbler.submit(track.item.id, started)
+
+    def open_track(self, song: Song) -> Track[Song]:
+        """Download if needed, open and pre-buffer a song and its cover art thumbnail.
+
+        This call is blocking and should only be done in a worker thread.
+
+        Args:
+            song: The song to open.
+
+        Returns:
+            A track ready to be played without delay.
+        """
+
+        song_path = self.fetcher.fetch_playable(song.id)
+
+        # Have the thumbnail ready for when the song is shown as playing
+        if self.cover_arts is not None and song.cover_art is not None:
+            self.cover_arts.fetch(song.cover_art)
+
+        track = Track(song, discord.FFmpegPCMAudio(song_path), song.duration)
+
+        # The player may have been closed while downloading, the track will never be played
+        if self.closed:
+            track.cleanup()
+            return track
+
+        track.prepare()
+
+        return track
+
+    def fetch_song(self, song_id: str) -> SubsonicSong | None:
+        """Fetch a song of an album or playlist being expanded.
+
+        This call is blocking and should only be done in a worker thread.
+
+        Args:
+            song_id: The ID of the song.
+
+        Returns:
+            The song or None if it has been deleted from the server since the album or playlist was fetched.
+        """
+
+        try:
+            return self.subsonic.browsing.get_song(song_id)
+        except ErrorCode70:
+            logger.warning(f"The song with ID '{song_id}' has been deleted from the server, skipping it")
+            return None
+
+    def fetch_page(self, reference: SongsReference) -> tuple[list[QueueEntry], SongsReference | None]:
+        """Fetch the next page of songs of an album or playlist.
+
+        The album or playlist is only fetched for the first page, the IDs of the rest of its songs are kept in the
+        reference, so the pages are taken from the same list even if it's edited, and only the songs of every next
+        page are fetched.
+
+        This call is blocking and should only be done in a worker thread.
+
+        Args:
+            reference: The reference to the songs not expanded yet.
+
+        Returns:
+            The songs of the page and the reference to the rest of them, None if there are no more.
+        """
+
+        if reference.song_ids is None:
+            if reference.kind == "album":
+                subsonic_songs = self.subsonic.browsing.get_album(reference.id).songs
+            else:
+                subsonic_songs = self.subsonic.playlists.get_playlist(reference.id).songs
+
+            if subsonic_songs is None:
+                subsonic_songs = []
+
+            page_songs: list[SubsonicSong | None] = list(subsonic_songs[:EXPANSION_PAGE_SIZE])
+            rest_ids = tuple(subsonic_song.id for subsonic_song in subsonic_songs[EXPANSION_PAGE_SIZE:])
+        else:
+            with ThreadPoolExecutor(EXPANSION_WORKERS, thread_name_prefix="queue-expansion") as executor:
+                page_songs = list(executor.map(self.fetch_song, reference.song_ids[:EXPANSION_PAGE_SIZE]))
+
+            rest_ids = reference.song_ids[EXPANSION_PAGE_SIZE:]
+
+        page: list[QueueEntry] = []
+        for subsonic_song in page_songs:
+            if subsonic_song is None:
+                continue
+
+            song = Song.from_subsonic(subsonic_song, reference.requester)
+            if song is None:
+                logger.error(f"The song with ID '{subsonic_song.id}' is missing the name metadata entry")
+                continue
+
+            page.append(song)
+
+        if not rest_ids:
+            return page, None
+
+        return page, reference._replace(
+            offset=reference.offset + EXPANSION_PAGE_SIZE, remaining=len(rest_ids), song_ids=rest_ids
+        )
+
+    async def take_next(self) -> Song | None:
+        """Remove and get the next song of the queue, expanding first the album or playlist at its front.
+
+        Returns:
+            The next song or None if the queue is empty.
+        """
+
+        while not self.closed:
+            entry = self.queue.peek(self.interaction)
+            if not isinstance(entry, SongsReference):
+                if entry is not None:
+                    self.queue.pop(self.interaction)
+
+                return entry
+
+            logger.info(f"Expanding the songs of the {entry.kind} '{entry.name}' from position {entry.offset}")
+
+            try:
+                page, rest = await asyncio.to_thread(self.fetch_page, entry)
+            except Exception:
+                logger.exception(f"Unable to get the songs of the {entry.kind} '{entry.name}', skipping it")
+                page, rest = [], None
+
+            # The queue may have been edited while the page was being fetched, then it's checked again
+            if self.queue.peek(self.interaction) is entry:
+                self.queue.replace(self.interaction, 0, page if rest is None else [*page, rest])
+
+        return None
+
+    async def prefetch_next(self) -> None:
+        """Open the next song in the queue and set it as the next track of the engine."""
+
+        engine = self.engine
+        if engine is None or engine.next is not None or self.queue.length(self.interaction) == 0:
+            return
+
+        song = await self.take_next()
+        if song is None:
+            return
+
+        logger.info(f"Preparing the next song: '{song.title if song.title else "N/A"}' ({song.id})")
+        track = await asyncio.to_thread(self.open_track, song)
+
+        # The playback may have been stopped while the song was being downloaded
+        if self.engine is not engine:
+            track.cleanup()
+            self.queue.restore(self.interaction, song)
+            return
+
+        engine.set_next(track)
+
+    async def play_queue(self, track: Track[Song] | None = None) -> None:
+        """Start the playback of the next song in the queue.
+
+        Args:
+            track: An already prepared track to be played instead of taking the next song from the queue.
+        """
 
-class Queue:
-    """Manage the queue and split it per guild."""
+        if track is None:
+            generation = self.generation
 
-    def __init__(self) -> None:
-        """Create a new queue."""
+            song = await self.take_next()
+            if song is None:
+                logger.info("The queue is empty")
+                return
 
-        self.queue: dict[str, deque[Song]] = {}
+            track = await asyncio.to_thread(self.open_track, song)
 
-    def _check_guild(self, interaction: Interaction) -> str | None:
-        """Check if a guild has an associated queue and if not creates a new one.
+        else:
+            song = track.item
+            generation = self.generation
 
-        Args:
-            interaction: The interaction where the guild ID can be found.
+        logger.info(f"Playing song: '{song.title if song.title else "N/A"}' ({song.id})")
 
-        Returns:
-            Either the guild ID or None if the interaction did not have a guild attach to it.
-        """
+        voice_client = self.get_voice_client()
+        if voice_client is None:
+            logger.warning("There is not available voice client in this guild!")
+            track.cleanup()
+            self.queue.restore(self.interaction, song)
+            return
 
-        if interaction.guild is None:
-            logger.error("The guild of the interaction was None!")
-            return None
+        # The playback may have been stopped or started by someone else while the song was being downloaded
+        if generation != self.generation or voice_client.is_playing() or voice_client.is_paused():
+            track.cleanup()
+            self.queue.restore(self.interaction, song)
+            return
 
-        id = str(interaction.guild.id)
+        self.generation += 1
+        generation = self.generation
 
-        if id not in self.queue:
-            self.queue[id] = deque()
+        buffer: BufferedSource | None = None
 
-        return id
+        def notify_advance(track: Track[Song]) -> None:
+            notify = partial(self.post_threadsafe, PlayerEvent.ADVANCED, track)
 
-    def get(self, interaction: Interaction) -> Iterable[Song]:
-        """Get the queue of a guild.
+            # The engine is read ahead, the new song is heard when the buffer reaches its first frame
+            if buffer is not None:
+                buffer.call_when_played(notify)
+            else:
+                notify()
 
-        Args:
-            interaction: The interaction where the guild ID can be found.
+        engine = PlaybackEngine(track, self.config.playback_crossfade, on_advance=notify_advance)
 
-        Returns:
-            An iterable with the songs of the queue.
-        """
+        self.volume_transformer = PCMVolumeTransformer(engine, volume=self.config.volume / 100)
 
-        id = self._check_guild(interaction)
-        if id is None:
-            return []
+        source: discord.AudioSource = self.volume_transformer
+        if self.config.playback_buffer_frames > 0:
+            buffer = BufferedSource(self.volume_transformer, self.config.playback_buffer_frames)
+            self.buffer = buffer
+            source = buffer
 
-        return self.queue[id]
+        voice_client.play(
+            source,
+            after=lambda exception: self.post_threadsafe(PlayerEvent.FINISHED, (generation, exception)),
+        )
+
+        self.engine = engine
+        self.now_playing = song
+        self.start_track(track)
+
+        await self.prefetch_next()
+
+    def skip(self) -> None:
+        """Skip the current song, jumping directly to the prepared next one if available."""
+
+        voice_client = self.get_voice_client()
+        if voice_client is None:
+            return
+
+        if self.engine is None or not self.engine.skip():
+            voice_client.stop()
+            return
 
-    def pop(self, interaction: Interaction) -> Song | None:
-        """Remove and get one song from the queue.
+        # Don't wait for the already buffered audio of the skipped song to be played
+        if self.buffer is not None:
+            self.buffer.flush()
+
+        self.refresh()
+
+    def set_volume(self, volume: float) -> bool:
+        """Change the volume of the playback.
 
         Args:
-            interaction: The interaction where the guild ID can be found.
+            volume: The new volume where 1 is the original one.
 
         Returns:
-            The next song in the queue or None if the action failed.
+            If there was a playback to change its volume.
         """
 
-        id = self._check_guild(interaction)
-        if id is None:
-            return None
+        if self.volume_transformer is None:
+            return False
 
-        return self.queue[id].pop()
+        # Already buffered audio keeps the old volume
+        self.volume_transformer.volume = volume
+        self.refresh()
 
-    def append(self, interaction: Interaction, song: Song) -> None:
-        """Append new songs to the queue.
+        return True
 
-        Args:
-            interaction: The interaction where the guild ID can be found.
-            song: The song to append.
-        """
+    def stop(self) -> None:
+        """Stop the playback, giving back to the queue the already prepared next song."""
 
-        id = self._check_guild(interaction)
-        if id is None:
+        self.generation += 1
+
+        self.discard_next()
+        self.finish_track()
+
+        self.engine = None
+        self.volume_transformer = None
+        self.buffer = None
+        self.now_playing = None
+
+        voice_client = self.get_voice_client()
+        if voice_client is not None:
+            voice_client.stop()
+
+        self.refresh()
+
+    def discard_next(self) -> None:
+        """Give back to the front of the queue the already prepared next song, used before reordering the queue."""
+
+        if self.engine is None:
             return
 
-        return self.queue[id].append(song)
+        track = self.engine.take_next()
+        if track is not None:
+            track.cleanup()
+            self.queue.restore(self.interaction, track.item)
 
-    def length(self, interaction: Interaction) -> int:
-        """Get the length of the queue.
+    def is_idle(self) -> bool:
+        """Check if the player has no audio playing or paused, or no one listening to it.
 
-        Args:
-            interaction: The interaction where the guild ID can be found.
+        Returns:
+            If the player is idle.
+        """
+
+        voice_client = self.get_voice_client()
+        if voice_client is None or not voice_client.is_connected():
+            return True
+
+        # A paused song is kept while there are listeners, they may be back for it
+        if not voice_client.is_playing() and not voice_client.is_paused():
+            return True
+
+        return not any(not member.bot for member in voice_client.channel.members)
+
+    def idle_time(self) -> float:
+        """Update and get for how long the player has been idle.
 
         Returns:
-            The length of the queue.
+            The seconds since the player became idle, zero if it's active.
         """
 
-        id = self._check_guild(interaction)
-        if id is None:
-            # A little ugly but gets the job done
+        if not self.is_idle():
+            self.idle_since = None
             return 0
 
-        return len(self.queue[id])
+        now = time.monotonic()
+        if self.idle_since is None:
+            self.idle_since = now
+
+        return now - self.idle_since
+
+    def close(self) -> None:
+        """Stop the playback, cancel the pending downloads and the tasks of the player."""
+
+        self.stop()
+        self.closed = True
+        self.task.cancel()
+
+        if self.now_playing_message is not None:
+            self.now_playing_message.close()
 
 
 class QueueCog(Base):
@@ -146,10 +999,148 @@ class QueueCog(Base):
         self.subsonic = subsonic
         self.config = config
 
-        self.queue = Queue()
-        self.now_playing: Song | None = None
+        self.queue = Queue(config.queue_fair, config.queue_fair_weights)
+        self.fetcher = SongFetcher(subsonic, options, MediaPolicy.from_config(config))
+        self.fetcher.hot_cache.set_max_bytes(config.media_memory_cache_size * 1024**2)
+        self.players: dict[int, GuildPlayer] = {}
+
+        self.cover_arts: CoverArtCache | None = None
+        if config.media_cover_art_size > 0:
+            self.cover_arts = CoverArtCache(
+                subsonic, options.cache_path, config.media_cover_art_size, config.media_cover_art_cache_size * 1024**2
+            )
+
+        self.scrobbler = Scrobbler(subsonic, options.cache_path) if config.playback_scrobble else None
+
+    async def cog_load(self) -> None:
+        """Load the caches and start the background tasks of the cog."""
+
+        if self.cover_arts is not None:
+            await asyncio.to_thread(self.cover_arts.load)
+
+        if self.scrobbler is not None:
+            await self.scrobbler.start(asyncio.get_running_loop())
+
+        if self.config.playback_idle_timeout > 0:
+            self.idle_reaper.start()
+
+    def reload_config(self, config: Config) -> None:
+        """Apply a new config while the bot is running, the songs already playing keep the old one.
+
+        Args:
+            config: The new config.
+        """
+
+        self.config = config
+
+        self.fetcher.set_policy(MediaPolicy.from_config(config))
+        self.fetcher.hot_cache.set_max_bytes(config.media_memory_cache_size * 1024**2)
+        self.queue.set_fair_weights(config.queue_fair_weights)
+
+        for player in self.players.values():
+            player.config = config
+
+        if config.playback_idle_timeout > 0 and not self.idle_reaper.is_running():
+            self.idle_reaper.start()
+        elif config.playback_idle_timeout == 0:
+            self.idle_reaper.cancel()
+
+    async def cog_unload(self) -> None:
+        """Stop the players of all the guilds, submit the pending scrobbles and save the cache index."""
+
+        self.idle_reaper.cancel()
+
+        for player in self.players.values():
+            player.close()
+
+        self.players.clear()
+
+        if self.scrobbler is not None:
+            await self.scrobbler.close()
+
+        await asyncio.to_thread(self.fetcher.index.save)
+
+    def guild_memory(self) -> dict[int, int]:
+        """Estimate the memory used by the queue and the player of each guild.
+
+        Returns:
+            The estimated bytes by guild ID.
+        """
+
+        shared = [self.queue, self.fetcher, self.cover_arts, self.scrobbler, self.config]
+
+        sizes: dict[int, int] = {}
+        for queue_id, queue in self.queue.queue.items():
+            sizes[int(queue_id)] = get_deep_size(queue, shared)
+
+        for guild_id, player in self.players.items():
+            sizes[guild_id] = sizes.get(guild_id, 0) + get_deep_size(player, shared)
+
+        return sizes
+
+    @tasks.loop(seconds=IDLE_CHECK_INTERVAL)
+    async def idle_reaper(self) -> None:
+        """Leave the voice channels without audio or listeners and free the state of their guilds."""
+
+        for guild_id, player in list(self.players.items()):
+            if player.idle_time() < self.config.playback_idle_timeout:
+                continue
+
+            logger.info(f"Leaving the voice channel of the idle guild '{guild_id}'")
+
+            player.close()
+            self.queue.drop(player.interaction)
+            del self.players[guild_id]
+
+            voice_client = player.get_voice_client()
+            if voice_client is not None:
+                await voice_client.disconnect()
+
+    def get_player(self, interaction: Interaction) -> GuildPlayer | None:
+        """Get the player of the guild of the interaction, creating it if needed.
+
+        Args:
+            interaction: The interaction where the guild will be extracted.
+
+        Returns:
+            The player of the guild or None if the interaction did not have a guild attached to it.
+        """
+
+        if interaction.guild is None:
+            logger.error("The guild of the interaction was None!")
+            return None
+
+        player = self.players.get(interaction.guild.id)
+        if player is None:
+            player = GuildPlayer(
+                interaction,
+                self.queue,
+                self.subsonic,
+                self.fetcher,
+                self.cover_arts,
+                self.scrobbler,
+                self.config,
+                asyncio.get_running_loop(),
+            )
+            self.players[interaction.guild.id] = player
+
+        return player
+
+    def find_player(self, interaction: Interaction) -> GuildPlayer | None:
+        """Get the player of the guild of the interaction without creating it, for the commands that only read or
+        edit the queue.
+
+        Args:
+            interaction: The interaction where the guild will be extracted.
+
+        Returns:
+            The player of the guild or None if it has no player.
+        """
 
-        self.skip_next_autoplay = False
+        if interaction.guild is None:
+            return None
+
+        return self.players.get(interaction.guild.id)
 
     async def get_voice_client(self, interaction: Interaction, connect: bool = False) -> VoiceClient | None:
         user = interaction.user
@@ -178,81 +1169,68 @@ class QueueCog(Base):
 
         return cast(VoiceClient, guild.voice_client)
 
-    def play_next_callback(self, interaction: Interaction, exception: Exception | None) -> None:
-        """Callback called when starting the playback of the next song in the queue.
+    async def get_thumbnail(self, song: QueueEntry | None) -> Path | None:
+        """Get the cover art thumbnail of a song, album or playlist, downloading it only on a cache miss.
 
         Args:
-            interaction: The interaction where the guild will be extracted.
-            exception: An exception that discord.py may have raised.
-        """
-
-        if self.skip_next_autoplay:
-            self.skip_next_autoplay = False
-            return
-
-        self.play_queue(interaction, exception)
+            song: The song or the reference to the songs of an album or playlist.
 
-    def play_queue(self, interaction: Interaction, exception: Exception | None) -> None:
-        """Play the next song in the queue.
-
-        Args:
-            interaction: The interaction where the guild will be extracted.
-            exception: An exception that discord.py may have raised.
+        Returns:
+            The path of the thumbnail or None if it has no cover art or it's not available.
         """
 
-        if exception is not None:
-            raise exception
+        if self.cover_arts is None or song is None or song.cover_art is None:
+            return None
 
-        if self.queue.length(interaction) == 0:
-            logger.info("The queue is empty")
-            return
+        thumbnail = self.cover_arts.get_cached(song.cover_art)
+        if thumbnail is None:
+            thumbnail = await asyncio.to_thread(self.cover_arts.fetch, song.cover_art)
 
-        song = self.queue.pop(interaction)
-        if song is None:
-            logger.error("Unable to get the song for playback")
-            return
+        return thumbnail
 
-        logger.info(f"Playing song: '{song.title if song.title else "N/A"}' ({song.id})")
+    async def find_song(self, interaction: Interaction, query: str) -> Song | None:
+        """Search a song, answering the interaction with an error if it's not found.
 
-        song_path = self.options.cache_path / "subsonic/songs" / f"{song.id}.audio"
+        Args:
+            interaction: The interaction that started the command.
+            query: The name of the song.
 
-        if not song_path.is_file():
-            logger.info("Cache miss, downloading the song...")
+        Returns:
+            The found song or None if there was none.
+        """
 
-            song_path.parent.mkdir(parents=True, exist_ok=True)
-            try:
-                self.subsonic.media_retrieval.download(song.id, song_path)
+        search = await asyncio.to_thread(
+            self.subsonic.searching.search, query, song_count=SEARCH_CANDIDATES, album_count=0, artist_count=0
+        )
+        songs = search.songs
+        if not songs:
+            await self.send_error(interaction, [f"No songs found with the name: **{query}**"])
+            return None
 
-            # Fix to make Disopy work with Funkwhale servers
-            except requests.exceptions.HTTPError:
-                logger.warning(
-                    "Using the /download endpoint for downloading the media failed, using /stream as a fallback"
-                )
-                self.subsonic.media_retrieval.download(song.id, song_path, use_stream=True)
-        else:
-            logger.info("Cache hit")
+        song = Song.from_subsonic(rank(query, songs, get_song_fields)[0], interaction.user.id)
+        if song is None:
+            await self.send_error(interaction, [f"The song is missing the required metadata: {query}"])
+            return None
 
-        if interaction.guild is None:
-            logger.warning("There is no guild attached to the interaction!")
-            return
+        return song
 
-        if interaction.guild.voice_client is None:
-            logger.warning("There is not available voice client in this interaction!")
-            return
+    async def check_position(self, interaction: Interaction, position: int) -> bool:
+        """Check that a position is inside the queue, answering the interaction with an error if not.
 
-        voice_client = cast(VoiceClient, interaction.guild.voice_client)
+        Args:
+            interaction: The interaction that started the command.
+            position: The position starting from one.
 
-        voice_client.play(
-            discord.FFmpegPCMAudio(str(song_path.absolute())),
-            after=lambda exception: self.play_next_callback(interaction, exception),
-        )
+        Returns:
+            If the position is valid.
+        """
 
-        if voice_client.source is None:
-            logger.error("The source is not available to attach a volume transformer!")
-            return
+        length = self.queue.length(interaction)
+        if position < 1 or position > length:
+            await self.send_error(interaction, [f"The position must be between 1 and {length}"])
+            return False
 
-        self.now_playing = song
-        voice_client.source = PCMVolumeTransformer(voice_client.source, volume=self.config.volume / 100)
+        return True
 
     @app_commands.command(description="Add a song, album, or playlist to the queue")
     @app_commands.choices(
@@ -276,7 +1254,7 @@ class QueueCog(Base):
             song_name: The name of the song.
         """
 
-        await interaction.response.defer(thinking=True)
+        await self.defer(interaction)
 
         # Extract the type of element to be search, taking care of the default value
         choice = what if isinstance(what, str) else what.value
@@ -285,77 +1263,97 @@ class QueueCog(Base):
         if voice_client is None:
             return
 
+        if isinstance(voice_client.source, StationListener):
+            await self.send_error(interaction, ["Leave the radio station with `/radio leave` before playing songs"])
+            return
+
+        player = self.get_player(interaction)
+        if player is None:
+            return
+
         playing_element_name = query
-        first_play = self.queue.length(interaction) == 0 and self.now_playing is None
+        first_song: QueueEntry | None = None
+        first_play = self.queue.length(interaction) == 0 and player.now_playing is None
 
         match choice:
             case "song":
-                songs = self.subsonic.searching.search(query, song_count=10, album_count=0, artist_count=0).songs
-                if songs is None:
-                    await self.send_error(interaction, [f"No songs found with the name: **{query}**"])
-                    return
-
-                song = songs[0]
-                if song.title is None:
-                    await self.send_error(interaction, [f"The song is missing the required metadata: {query}"])
+                found_song = await self.find_song(interaction, query)
+                if found_song is None:
                     return
 
-                playing_element_name = song.title
-                self.queue.append(interaction, Song(song.id, song.title))
+                playing_element_name = found_song.title
+                first_song = found_song
+                self.queue.append(interaction, found_song)
 
             case "album":
-                albums = self.subsonic.searching.search(query, song_count=0, album_count=10, artist_count=0).albums
-                if albums is None:
+                search = await asyncio.to_thread(
+                    self.subsonic.searching.search, query, song_count=0, album_count=SEARCH_CANDIDATES, artist_count=0
+                )
+                albums = search.albums
+                if not albums:
                     await self.send_error(interaction, [f"No albums found with the name: **{query}**"])
                     return
 
-                album = albums[0].generate()
-                print(album)
-                if album.songs is None:
-                    await self.send_error(interaction, [f"The album is missing the required metadata: {query}"])
+                # The songs are fetched in pages when the album is about to be played
+                album = rank(query, albums, get_album_fields)[0]
+                if album.song_count == 0:
+                    await self.send_error(interaction, ["The album has no songs!"])
                     return
 
                 if album.name is not None:
                     playing_element_name = album.name
 
-                for song in album.songs:
-                    if song.title is None:
-                        logger.error(f"The song with ID '{song.id}' is missing the name metadata entry")
-                        continue
-
-                    self.queue.append(interaction, Song(song.id, song.title))
+                first_song = SongsReference(
+                    "album",
+                    album.id,
+                    playing_element_name,
+                    remaining=album.song_count,
+                    requester=interaction.user.id,
+                    cover_art=album.cover_art.id if album.cover_art else None,
+                )
+                self.queue.append(interaction, first_song)
 
             case "playlist":
-                for playlist in self.subsonic.playlists.get_playlists():
-                    if playlist.name is None:
-                        continue
-
-                    if query in playlist.name:
-                        playlist = playlist.generate()
-                        if playlist.songs is None:
-                            await self.send_error(interaction, ["The playlist has no songs!"])
-                            return
-
-                        if playlist.name is not None:
-                            playing_element_name = playlist.name
-
-                        for song in playlist.songs:
-                            if song.title is None:
-                                logger.error(f"The song with ID '{song.id}' is missing the name metadata entry")
-                                continue
-
-                            self.queue.append(interaction, Song(song.id, song.title))
-                        break
+                # The closest name to the query is used when several playlists contain it
+                matching_playlists = [
+                    playlist
+                    for playlist in await asyncio.to_thread(self.subsonic.playlists.get_playlists)
+                    if playlist.name is not None and query in playlist.name
+                ]
+
+                if matching_playlists:
+                    # The songs are fetched in pages when the playlist is about to be played
+                    playlist = rank(query, matching_playlists, get_playlist_fields)[0]
+                    if playlist.song_count == 0:
+                        await self.send_error(interaction, ["The playlist has no songs!"])
+                        return
+
+                    if playlist.name is not None:
+                        playing_element_name = playlist.name
+
+                    first_song = SongsReference(
+                        "playlist",
+                        playlist.id,
+                        playing_element_name,
+                        remaining=playlist.song_count,
+                        requester=interaction.user.id,
+                        cover_art=playlist.cover_art.id if playlist.cover_art else None,
+                    )
+                    self.queue.append(interaction, first_song)
 
         if first_play:
-            await self.send_answer(interaction, "🎵 Now playing!", [f"**{playing_element_name}**"])
+            await self.send_answer(
+                interaction,
+                "🎵 Now playing!",
+                [f"**{playing_element_name}**"],
+                thumbnail=await self.get_thumbnail(first_song),
+            )
         else:
             await self.send_answer(interaction, "🎧 Added to the queue", [f"**{playing_element_name}**"])
 
-        if not voice_client.is_playing():
-            self.play_queue(interaction, None)
+        player.post(PlayerEvent.PLAY)
 
-    @app_commands.command(description="Stop the current song")
+    @app_commands.command(description="Stop the current song", extras={EPHEMERAL_EXTRA: True})
     async def stop(self, interaction: Interaction) -> None:
         """Stop the song that is currently playing.
 
@@ -371,13 +1369,15 @@ class QueueCog(Base):
             await self.send_error(interaction, ["No song currently playing!"])
             return
 
-        self.skip_next_autoplay = True
-        voice_client.stop()
-        self.now_playing = None
+        player = self.get_player(interaction)
+        if player is None:
+            return
+
+        player.stop()
 
-        await self.send_answer(interaction, "🛑 Song stopped")
+        await self.send_answer(interaction, "🛑 Song stopped", ephemeral=True)
 
-    @app_commands.command(description="Pause the current song")
+    @app_commands.command(description="Pause the current song", extras={EPHEMERAL_EXTRA: True})
     async def pause(self, interaction: Interaction) -> None:
         """Pause the song that is currently playing.
 
@@ -394,9 +1394,14 @@ class QueueCog(Base):
             return
 
         voice_client.pause()
-        await self.send_answer(interaction, "⏸️ Song paused")
 
-    @app_commands.command(description="Skip the current song")
+        player = self.find_player(interaction)
+        if player is not None:
+            player.refresh()
+
+        await self.send_answer(interaction, "⏸️ Song paused", ephemeral=True)
+
+    @app_commands.command(description="Skip the current song", extras={EPHEMERAL_EXTRA: True})
     async def skip(self, interaction: Interaction) -> None:
         """Skip the currently playing song.
 
@@ -412,10 +1417,15 @@ class QueueCog(Base):
             await self.send_error(interaction, ["No song currently playing!"])
             return
 
-        voice_client.stop()
-        await self.send_answer(interaction, "⏭️ Song skipped")
+        player = self.get_player(interaction)
+        if player is None:
+            return
+
+        player.skip()
 
-    @app_commands.command(description="Resume the playback")
+        await self.send_answer(interaction, "⏭️ Song skipped", ephemeral=True)
+
+    @app_commands.command(description="Resume the playback", extras={EPHEMERAL_EXTRA: True})
     async def resume(self, interaction: Interaction) -> None:
         """Resume the playback of the song and if there is no one playing play the next one in the queue.
 
@@ -429,15 +1439,24 @@ class QueueCog(Base):
 
         if voice_client.is_paused():
             voice_client.resume()
-            await self.send_answer(interaction, "▶️ Resuming the song")
+
+            player = self.find_player(interaction)
+            if player is not None:
+                player.refresh()
+
+            await self.send_answer(interaction, "▶️ Resuming the song", ephemeral=True)
             return
 
         if self.queue.length(interaction) == 0:
             await self.send_error(interaction, ["The queue is empty"])
             return
 
-        self.play_queue(interaction, None)
-        await self.send_answer(interaction, "▶️ Resuming the playback")
+        player = self.get_player(interaction)
+        if player is None:
+            return
+
+        player.post(PlayerEvent.PLAY)
+        await self.send_answer(interaction, "▶️ Resuming the playback", ephemeral=True)
 
     @app_commands.command(name="queue", description="See the current queue")
     # Name changed to avoid collisions with the property `queue`
@@ -448,22 +1467,142 @@ class QueueCog(Base):
             interaction: The interaction that started the command.
         """
 
+        if interaction.guild is None:
+            await self.send_error(interaction, ["We are not chatting in a guild, something has gone very wrong..."])
+            return
+
+        # Listing the queue doesn't need a player, the guild may have none
+        player = self.find_player(interaction)
+        now_playing = player.now_playing if player is not None else None
+
         content = []
-        if self.now_playing is not None:
-            content.append(f"Now playing: **{self.now_playing.title}**")
+        thumbnail = None
+        if now_playing is not None:
+            thumbnail = await self.get_thumbnail(now_playing)
+
+            content.append(f"Now playing: **{now_playing.title}**")
             content.append("")
 
-        length = self.queue.length(interaction)
+        # The next song may have already been taken from the queue to be prepared
+        songs = self.queue.get(interaction)
+        next_track = player.engine.next if player is not None and player.engine is not None else None
+        if next_track is not None:
+            songs = chain([next_track.item], songs)
+
+        length = self.queue.length(interaction) + (1 if next_track is not None else 0)
 
         if length > 0:
             content.append("Next:")
-            for song in self.queue.get(interaction):
-                content.append(f"- **{song.title}**")
+            for position, song in enumerate(islice(songs, QUEUE_DISPLAY_LIMIT), 1):
+                content.append(f"{position}. **{song.title}**")
+
+            if length > QUEUE_DISPLAY_LIMIT:
+                content.append(f"_And {length - QUEUE_DISPLAY_LIMIT} more..._")
 
         if length == 0:
             content.append("_Queue empty_")
 
-        await self.send_answer(interaction, f"🎹 Queue ({length} songs remaining)", content)
+        # The albums and playlists not expanded yet count with all their songs
+        remaining = count_songs(self.queue.get(interaction)) + (1 if next_track is not None else 0)
+
+        await self.send_answer(interaction, f"🎹 Queue ({remaining} songs remaining)", content, thumbnail=thumbnail)
+
+    @app_commands.command(description="Add a song to be played right after the current one")
+    async def playnext(self, interaction: Interaction, query: str) -> None:
+        """Add a song at the front of the queue.
+
+        Args:
+            interaction: The interaction that started the command.
+            query: The name of the song.
+        """
+
+        await self.defer(interaction)
+
+        voice_client = await self.get_voice_client(interaction, True)
+        if voice_client is None:
+            return
+
+        player = self.get_player(interaction)
+        if player is None:
+            return
+
+        song = await self.find_song(interaction, query)
+        if song is None:
+            return
+
+        player.discard_next()
+        self.queue.insert(interaction, 0, song)
+
+        await self.send_answer(interaction, "⏩ Playing next", [f"**{song.title}**"])
+        player.post(PlayerEvent.PLAY)
+
+    @app_commands.command(description="Remove a song from the queue")
+    async def remove(self, interaction: Interaction, position: int) -> None:
+        """Remove the song at a position of the queue.
+
+        Args:
+            interaction: The interaction that started the command.
+            position: The position of the song as listed in the queue.
+        """
+
+        # Only the users listening can edit the queue
+        if await self.get_voice_client(interaction) is None:
+            return
+
+        player = self.find_player(interaction)
+        if player is not None:
+            player.discard_next()
+
+        if not await self.check_position(interaction, position):
+            if player is not None:
+                player.post(PlayerEvent.PLAY)
+            return
+
+        song = self.queue.remove(interaction, position - 1)
+        if player is not None:
+            player.post(PlayerEvent.PLAY)
+
+        if song is not None:
+            await self.send_answer(interaction, "🗑️ Removed from the queue", [f"**{song.title}**"])
+
+    @app_commands.command(description="Move a song to another position of the queue")
+    async def move(self, interaction: Interaction, position: int, to: int) -> None:
+        """Move the song at a position of the queue to another one.
+
+        Args:
+            interaction: The interaction that started the command.
+            position: The position of the song as listed in the queue.
+            to: The new position of the song.
+        """
+
+        # Only the users listening can edit the queue
+        if await self.get_voice_client(interaction) is None:
+            return
+
+        player = self.find_player(interaction)
+        if player is not None:
+            player.discard_next()
+
+        if not await self.check_position(interaction, position) or not await self.check_position(interaction, to):
+            if player is not None:
+                player.post(PlayerEvent.PLAY)
+            return
+
+        moved = self.queue.move(interaction, position - 1, to - 1)
+        if player is not None:
+            player.post(PlayerEvent.PLAY)
+
+        if moved is None:
+            return
+
+        song, index = moved
+        content = [f"**{song.title}** to position {index + 1}"]
+
+        # The fair queue only places the songs in the turns of the user that added them
+        if index + 1 != to:
+            content.append(f"Position {to} is the turn of another user, it will be played in the next turn of its user")
+
+        await self.send_answer(interaction, "🔀 Moved in the queue", content)
 
     @app_commands.command(description="Adjust the volume")
     async def volume(self, interaction: Interaction, volume: int) -> None:
@@ -474,8 +1613,7 @@ class QueueCog(Base):
             volume: The new volume level.
         """
 
-        # Defer immediately to avoid timeout
-        await interaction.response.defer(thinking=True)
+        await self.defer(interaction)
 
         voice_client = await self.get_voice_client(interaction)
         if voice_client is None:
@@ -485,10 +1623,12 @@ class QueueCog(Base):
             await self.send_error(interaction, ["The requested volume must be at least 0%"])
             return
 
-        if voice_client.source is None:
+        player = self.get_player(interaction)
+        if player is None:
+            return
+
+        if not player.set_volume(volume / 100):
             await self.send_error(interaction, ["The voice client source is not available"])
             return
 
-        # Every source has a volume handler attach to it so suppressing the mypy error is safe
-        voice_client.source.volume = volume / 100  # type: ignore[attr-defined]
         await self.send_answer(interaction, f"🔊 Volume level set to {volume}%")
@@ -0,0 +1,357 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Holds the cog for the radio stations shared by many guilds."""
+
+import asyncio
+import logging
+import time
+from typing import cast
+
+import discord
+from discord import VoiceClient, app_commands
+from discord.ext import tasks
+from discord.ext.commands import Bot
+from discord.interactions import Interaction
+from knuckles import Subsonic
+
+from ..audio import Track
+from ..config import Config
+from ..media import MediaPolicy, SongFetcher
+from ..options import Options
+from ..radio import Station, StationListener
+from .base import EPHEMERAL_EXTRA, Base
+from .queue import IDLE_CHECK_INTERVAL, Song
+
+logger = logging.getLogger(__name__)
+
+
+class RadioCog(Base):
+    """Cog that holds the radio station commands.
+
+    A station is started when the first guild tunes to it and stopped when the last one leaves it, all the guilds
+    tuned to the same station share its audio pipeline.
+    """
+
+    radio = app_commands.Group(
+        name="radio", description="Listen to the radio stations shared with other servers", guild_only=True
+    )
+
+    def __init__(self, bot: Bot, options: Options, subsonic: Subsonic, config: Config) -> None:
+        """The constructor of the cog.
+
+        Args:
+            bot: The bot attached to the cog.
+            options: The options of the program.
+            subsonic: The object to be used to access the OpenSubsonic REST API.
+            config: The config of the program.
+        """
+
+        super().__init__(bot, options)
+
+        self.subsonic = subsonic
+        self.config = config
+
+        self.fetcher = SongFetcher(subsonic, options, MediaPolicy.from_config(config))
+        self.fetcher.hot_cache.set_max_bytes(config.media_memory_cache_size * 1024**2)
+
+        self.stations: dict[str, Station[Song]] = {}
+        self.listeners: dict[int, StationListener] = {}
+
+        # When the voice channel of each tuned guild was left without listeners
+        self.idle_since: dict[int, float] = {}
+
+    async def cog_load(self) -> None:
+        """Start the background tasks of the cog."""
+
+        if self.config.playback_idle_timeout > 0:
+            self.idle_reaper.start()
+
+    def reload_config(self, config: Config) -> None:
+        """Apply a new config while the bot is running, the running stations keep the old one until they stop.
+
+        Args:
+            config: The new config.
+        """
+
+        self.config = config
+        self.fetcher.set_policy(MediaPolicy.from_config(config))
+        self.fetcher.hot_cache.set_max_bytes(config.media_memory_cache_size * 1024**2)
+
+        if config.playback_idle_timeout > 0 and not self.idle_reaper.is_running():
+            self.idle_reaper.start()
+        elif config.playback_idle_timeout == 0:
+            self.idle_reaper.cancel()
+
+    async def cog_unload(self) -> None:
+        """Stop all the stations."""
+
+        self.idle_reaper.cancel()
+
+        for station in self.stations.values():
+            station.stop()
+
+        self.stations.clear()
+        self.listeners.clear()
+        self.idle_since.clear()
+
+    @tasks.loop(seconds=IDLE_CHECK_INTERVAL)
+    async def idle_reaper(self) -> None:
+        """Leave the voice channels tuned to a station without listeners, stopping the stations no one hears."""
+
+        now = time.monotonic()
+
+        for guild_id, listener in list(self.listeners.items()):
+            guild = self.bot.get_guild(guild_id)
+            voice_client = cast(VoiceClient | None, guild.voice_client if guild is not None else None)
+
+            if voice_client is None or not voice_client.is_connected():
+                self.leave(guild_id, listener)
+                continue
+
+            if any(not member.bot for member in voice_client.channel.members):
+                self.idle_since.pop(guild_id, None)
+                continue
+
+            idle_since = self.idle_since.setdefault(guild_id, now)
+            if now - idle_since < self.config.playback_idle_timeout:
+                continue
+
+            logger.info(f"Leaving the radio station of the idle guild '{guild_id}'")
+
+            # The listener is forgotten when its playback ends
+            await voice_client.disconnect()
+
+    def open_track(self, song: Song) -> Track[Song]:
+        """Download if needed, open and pre-buffer a song of a station.
+
+        This call is blocking and should only be done in a worker thread.
+
+        Args:
+            song: The song to open.
+
+        Returns:
+            A track ready to be played without delay.
+        """
+
+        song_path = self.fetcher.fetch_playable(song.id)
+
+        track = Track(song, discord.FFmpegPCMAudio(song_path), song.duration)
+        track.prepare()
+
+        return track
+
+    def get_playlist_songs(self, playlist_name: str) -> list[Song] | None:
+        """Get the songs of the playlist of a station.
+
+        This call is blocking and should not be done on the event loop.
+
+        Args:
+            playlist_name: The name of the playlist.
+
+        Returns:
+            The songs or None if the playlist was not found.
+        """
+
+        for playlist in self.subsonic.playlists.get_playlists():
+            if playlist.name is None or playlist_name not in playlist.name:
+                continue
+
+            songs = []
+            for song in playlist.generate().songs or []:
+                station_song = Song.from_subsonic(song, 0)
+                if station_song is not None:
+                    songs.append(station_song)
+
+            return songs
+
+        return None
+
+    async def get_station(self, name: str) -> Station[Song] | None:
+        """Get a running station, starting it if needed.
+
+        Args:
+            name: The name of the station.
+
+        Returns:
+            The station or None if its playlist is not available.
+        """
+
+        station = self.stations.get(name)
+        if station is not None:
+            return station
+
+        songs = await asyncio.to_thread(self.get_playlist_songs, self.config.radio_stations[name])
+        if not songs:
+            return None
+
+        # The playlist could have been loaded twice at the same time
+        station = self.stations.get(name)
+        if station is not None:
+            return station
+
+        station = Station(
+            name,
+            songs,
+            self.open_track,
+            self.config.volume / 100,
+            self.config.radio_bitrate,
+            self.config.playback_crossfade,
+            self.config.playback_buffer_frames,
+        )
+        station.start(asyncio.get_running_loop())
+        self.stations[name] = station
+
+        return station
+
+    def leave(self, guild_id: int, listener: StationListener) -> None:
+        """Forget the listener of a guild, stopping its station if it was the last one.
+
+        Args:
+            guild_id: The ID of the guild.
+            listener: The listener whose playback has ended.
+        """
+
+        # The guild may have already tuned to another station
+        if self.listeners.get(guild_id) is listener:
+            del self.listeners[guild_id]
+            self.idle_since.pop(guild_id, None)
+
+        station = listener.station
+        if any(other.station is station for other in self.listeners.values()):
+            return
+
+        if self.stations.get(station.name) is station:
+            del self.stations[station.name]
+
+        station.stop()
+
+    async def station_autocomplete(self, interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
+        """Suggest the stations of the config.
+
+        Args:
+            interaction: The interaction being autocompleted.
+            current: What the user has typed.
+
+        Returns:
+            The matching stations.
+        """
+
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in self.config.radio_stations
+            if current.lower() in name.lower()
+        ][:25]
+
+    @radio.command(description="Tune in to a radio station")
+    @app_commands.autocomplete(station=station_autocomplete)
+    async def tune(self, interaction: Interaction, station: str) -> None:
+        """Play a radio station in the voice channel of the user.
+
+        Args:
+            interaction: The interaction that started the command.
+            station: The name of the station.
+        """
+
+        if station not in self.config.radio_stations:
+            await self.send_error(interaction, [f"There is no station with the name: **{station}**"], ephemeral=True)
+            return
+
+        user = interaction.user
+        guild = interaction.guild
+        if isinstance(user, discord.User) or guild is None:
+            await self.send_error(interaction, ["We are not chatting in a guild, something has gone very wrong..."])
+            return
+
+        if user.voice is None or user.voice.channel is None:
+            await self.send_error(interaction, ["You are not connected to any voice channel!"])
+            return
+
+        await self.defer(interaction)
+
+        voice_client: VoiceClient
+        if guild.voice_client is None:
+            voice_client = await user.voice.channel.connect(self_deaf=True)
+        else:
+            voice_client = cast(VoiceClient, guild.voice_client)
+
+        if voice_client.channel != user.voice.channel:
+            await self.send_error(interaction, ["Join the same voice channel where I am"])
+            return
+
+        if voice_client.is_playing() or voice_client.is_paused():
+            if not isinstance(voice_client.source, StationListener):
+                await self.send_error(interaction, ["Stop the current playback with `/stop` before tuning in"])
+                return
+
+            # Switching stations, the previous one is left when its playback ends
+            voice_client.stop()
+
+        running_station = await self.get_station(station)
+        if running_station is None:
+            await self.send_error(interaction, [f"The playlist of the station **{station}** is not available"])
+            return
+
+        listener = running_station.subscribe()
+        self.listeners[guild.id] = listener
+
+        loop = asyncio.get_running_loop()
+        voice_client.play(
+            listener,
+            after=lambda _: loop.call_soon_threadsafe(self.leave, guild.id, listener),
+        )
+
+        logger.info(f"Tuned in to the radio station '{station}'")
+
+        song = running_station.now_playing()
+        content = [f"**{station}**"]
+        if song is not None:
+            content.append(f"Now playing: **{song.title}**")
+
+        await self.send_answer(interaction, "📻 Tuned in", content)
+
+    @radio.command(name="leave", description="Stop listening to the radio station", extras={EPHEMERAL_EXTRA: True})
+    async def leave_command(self, interaction: Interaction) -> None:
+        """Stop the radio station of the guild.
+
+        Args:
+            interaction: The interaction that started the command.
+        """
+
+        guild = interaction.guild
+        if guild is None or guild.id not in self.listeners or guild.voice_client is None:
+            await self.send_error(interaction, ["Not tuned in to any station"], ephemeral=True)
+            return
+
+        # The listener is forgotten when its playback ends
+        cast(VoiceClient, guild.voice_client).stop()
+
+        await self.send_answer(interaction, "📻 Left the station", ephemeral=True)
+
+    @radio.command(name="list", description="List the radio stations", extras={EPHEMERAL_EXTRA: True})
+    async def list_command(self, interaction: Interaction) -> None:
+        """List the stations of the config with their listeners and current song.
+
+        Args:
+            interaction: The interaction that started the command.
+        """
+
+        content = []
+        for name in self.config.radio_stations:
+            station = self.stations.get(name)
+            if station is None:
+                content.append(f"**{name}**: _Off air_")
+                continue
+
+            song = station.now_playing()
+            listeners = station.listener_count()
+            content.append(
+                f"**{name}**: {song.title if song is not None else "Starting..."} "
+                + f"({listeners} {"server" if listeners == 1 else "servers"})"
+            )
+
+        if not content:
+            content.append("_No stations configured_")
+
+        await self.send_answer(interaction, "📻 Radio stations", content, ephemeral=True)
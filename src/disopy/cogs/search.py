@@ -4,6 +4,8 @@
 
 """Holds the cog for search commands."""
 
+import asyncio
+
 from discord import app_commands
 from discord.ext.commands import Bot
 from discord.interactions import Interaction
@@ -142,8 +144,8 @@ class Search(Base):
 
         if choice == "playlist":
             # Basic implementation just checking if the query is contained inside the playlist name
-            title, content = self.playlist_search(query)
+            title, content = await asyncio.to_thread(self.playlist_search, query)
         else:
-            title, content = self.api_search(query, choice)
+            title, content = await asyncio.to_thread(self.api_search, query, choice)
 
         await self.send_answer(interaction, title, content)
@@ -0,0 +1,140 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Keep track of the Command Trees synced with the Discord API."""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Final
+
+import discord
+from discord.app_commands import CommandTree
+
+from .options import Options
+
+logger = logging.getLogger(__name__)
+
+# The scope of the commands available in all the guilds in the status file
+GLOBAL_SCOPE: Final[str] = "global"
+
+
+def get_command_tree_status_path(options: Options) -> Path:
+    """Get the path of the file where the hashes of the last synced Command Trees are stored.
+
+    Args:
+        options: The options set on startup.
+
+    Returns:
+        The path of the status file.
+    """
+
+    return options.cache_path / "discord/command-tree-status.json"
+
+
+def get_command_tree_hash(tree: CommandTree[Any], guild: discord.Object | None = None) -> str:
+    """Get a stable hash of the commands of a Command Tree as they are sent to the Discord API.
+
+    Args:
+        tree: The Command Tree to hash.
+        guild: The guild of the commands to hash, or None for the global ones.
+
+    Returns:
+        The SHA-256 hex digest of the serialized commands.
+    """
+
+    commands = sorted((command.to_dict(tree) for command in tree.get_commands(guild=guild)), key=lambda c: c["name"])
+    serialized = json.dumps(commands, sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def get_command_tree_scope(guild: discord.Object | None = None) -> str:
+    """Get the key of a scope in the status file.
+
+    Args:
+        guild: The guild of the scope, or None for the global one.
+
+    Returns:
+        The key of the scope.
+    """
+
+    return GLOBAL_SCOPE if guild is None else f"guild:{guild.id}"
+
+
+def load_command_tree_status(options: Options) -> dict[str, str]:
+    """Load the hashes of the last synced Command Trees.
+
+    Args:
+        options: The options set on startup.
+
+    Returns:
+        The hashes keyed by scope, empty if the file is missing or corrupted.
+    """
+
+    command_tree_status_path = get_command_tree_status_path(options)
+    if not command_tree_status_path.is_file():
+        return {}
+
+    try:
+        with open(command_tree_status_path) as f:
+            status = json.load(f)
+
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Unable to read the Command Tree status file, a sync will be forced: {e}")
+        return {}
+
+    if not isinstance(status, dict):
+        return {}
+
+    return {str(scope): str(tree_hash) for scope, tree_hash in status.items()}
+
+
+def save_command_tree_hash(options: Options, scope: str, tree_hash: str) -> None:
+    """Save the hash of a Command Tree that has been synced.
+
+    Args:
+        options: The options set on startup.
+        scope: The scope that has been synced.
+        tree_hash: The hash of the synced Command Tree.
+    """
+
+    status = load_command_tree_status(options)
+    status[scope] = tree_hash
+
+    command_tree_status_path = get_command_tree_status_path(options)
+    command_tree_status_path.parent.mkdir(parents=True, exist_ok=True)
+
+    temporal_path = command_tree_status_path.with_suffix(".part")
+    with open(temporal_path, "w") as f:
+        json.dump(status, f, indent=2, sort_keys=True)
+
+    temporal_path.replace(command_tree_status_path)
+
+
+async def sync_command_tree(tree: CommandTree[Any], options: Options, guild: discord.Object | None = None) -> bool:
+    """Sync a Command Tree with the Discord API only if it has changed since the last sync.
+
+    Args:
+        tree: The Command Tree to sync.
+        options: The options set on startup.
+        guild: The guild to sync, or None to sync the global commands.
+
+    Returns:
+        If the Command Tree has been synced.
+    """
+
+    scope = get_command_tree_scope(guild)
+    tree_hash = get_command_tree_hash(tree, guild)
+
+    if load_command_tree_status(options).get(scope) == tree_hash:
+        logger.info(f"The Command Tree of the scope '{scope}' is up to date")
+        return False
+
+    logger.info(f"The Command Tree of the scope '{scope}' is outdated, syncing!")
+    await tree.sync(guild=guild)
+    save_command_tree_hash(options, scope, tree_hash)
+
+    return True
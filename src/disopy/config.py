@@ -5,7 +5,7 @@
 """Handle the configuration defined by the user in the config file."""
 
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
@@ -32,6 +32,29 @@ class Config:
 
         developer_discord_sync_guild: The guild where commands should always be synced.
         developer_discord_sync_users: The users allowed to trigger a global sync with.
+
+        media_transcode: Whether the server should be asked to transcode the songs before downloading them.
+        media_format: The format the server should transcode the songs to.
+        media_max_bitrate: The max bitrate in kbps the transcoded songs should have.
+        media_cover_art_size: The width in pixels of the cover art thumbnails, zero to not show them.
+        media_cover_art_cache_size: The max size in MiB of the cover art thumbnails cache.
+        media_memory_cache_size: The max size in MiB of the most played songs kept in memory, zero to always read
+            them from the disk cache.
+
+        playback_crossfade: The seconds two consecutive songs should overlap, zero for gapless playback.
+        playback_idle_timeout: The seconds without a song playing or paused, or without listeners, before leaving the
+            voice channel, zero to never leave.
+        playback_buffer_frames: How many 20ms frames of audio should be read ahead, zero to disable the buffer.
+        playback_scrobble: Whether the played songs should be reported to the Subsonic server.
+
+        queue_fair: If the songs of every user should be interleaved instead of played in the order they were added.
+        queue_fair_weights: How many songs in a row each user ID gets in its turn, one if missing.
+
+        radio_stations: The playlist played by each radio station, by the name of the station.
+        radio_bitrate: The bitrate in kbps the radio stations are encoded with.
+
+        runtime_uvloop: Whether uvloop should be used as the event loop when it's installed.
+        runtime_speedups: Whether discord.py should use orjson, aiodns and Zstandard when they are installed.
     """
 
     version: int
@@ -44,6 +67,27 @@ class Config:
     developer_discord_sync_guild: int | None
     developer_discord_sync_users: list[str]
 
+    media_transcode: bool = True
+    media_format: str = "opus"
+    media_max_bitrate: int = 128
+    media_cover_art_size: int = 128
+    media_cover_art_cache_size: int = 64
+    media_memory_cache_size: int = 0
+
+    playback_crossfade: float = 0.0
+    playback_idle_timeout: int = 300
+    playback_buffer_frames: int = 50
+    playback_scrobble: bool = True
+
+    queue_fair: bool = False
+    queue_fair_weights: dict[int, int] = field(default_factory=dict)
+
+    radio_stations: dict[str, str] = field(default_factory=dict)
+    radio_bitrate: int = 128
+
+    runtime_uvloop: bool = True
+    runtime_speedups: bool = True
+
 
 def get_config_file_path(config_path: Path) -> Path:
     """Get the config file path and generate the file.
@@ -111,6 +155,79 @@ def generate_new_config(config_path: Path) -> None:
 
     doc.add("subsonic", subsonic_table)
 
+    doc.add(nl())
+
+    media_table = table()
+    media_table.add(comment("Whether the server should transcode the songs before sending them"))
+    media_table.add("transcode", True)
+
+    media_table.add(comment("The format the songs should be transcoded to, it depends on the server support"))
+    media_table.add("format", "opus")
+
+    media_table.add(comment("The max bitrate in kbps of the transcoded songs, Discord never goes over 128kbps"))
+    media_table.add("max_bitrate", item(128))
+
+    media_table.add(comment("The width in pixels of the cover art shown with the playing song, 0 to not show it"))
+    media_table.add("cover_art_size", item(128))
+
+    media_table.add(comment("The max size in MiB of the cover arts stored in the cache"))
+    media_table.add("cover_art_cache_size", item(64))
+
+    media_table.add(comment("The max size in MiB of the most played songs kept in memory for slow disks, 0 to disable"))
+    media_table.add("memory_cache_size", item(0))
+
+    doc.add("media", media_table)
+
+    doc.add(nl())
+
+    playback_table = table()
+    playback_table.add(comment("The seconds two consecutive songs should overlap, zero for gapless playback"))
+    playback_table.add("crossfade", item(0.0))
+
+    playback_table.add(comment("The seconds with no song playing or paused or no listeners before leaving, 0 to never"))
+    playback_table.add("idle_timeout", item(300))
+
+    playback_table.add(comment("How many 20ms frames of audio should be read ahead to avoid stutter on slow disks"))
+    playback_table.add("buffer_frames", item(50))
+
+    playback_table.add(comment("Whether the played songs should be reported to the server, updating their play count"))
+    playback_table.add("scrobble", True)
+
+    doc.add("playback", playback_table)
+
+    doc.add(nl())
+
+    queue_table = table()
+    queue_table.add(comment("Interleave the songs added by every user instead of playing them in order"))
+    queue_table.add("fair", False)
+
+    queue_table.add(comment("How many songs in a row each user ID gets in its turn, one if missing"))
+    queue_table.add("weights", table())
+
+    doc.add("queue", queue_table)
+
+    doc.add(nl())
+
+    radio_table = table()
+    radio_table.add(comment("The bitrate in kbps of the radio stations, they are encoded once for all their listeners"))
+    radio_table.add("bitrate", item(128))
+
+    radio_table.add(comment("The playlist played in a loop by each station, by the name of the station"))
+    radio_table.add("stations", table())
+
+    doc.add("radio", radio_table)
+
+    doc.add(nl())
+
+    runtime_table = table()
+    runtime_table.add(comment("Use uvloop as the event loop when it's installed, with the speed extra of the package"))
+    runtime_table.add("uvloop", True)
+
+    runtime_table.add(comment("Use orjson, aiodns and Zstandard in discord.py when they are installed"))
+    runtime_table.add("speedups", True)
+
+    doc.add("runtime", runtime_table)
+
     with open(config_file, "w") as f:
         f.write(doc.as_string())
 
@@ -131,6 +248,7 @@ def get_config(config_path: Path) -> Config | None:
             logger.critical("The provided config file is not valid TOML")
             generate_new_config_tip_message()
             logger.critical(e)
+            return None
 
         if "version" not in config:
             missing_entry_error_message("version")
@@ -167,6 +285,94 @@ def get_config(config_path: Path) -> Config | None:
             developer_discord_sync_guild = config["developer"]["discord-sync-guild"]
             developer_discord_sync_users = config["developer"]["discord-sync-users"]
 
+        media_transcode = True
+        media_format = "opus"
+        media_max_bitrate = 128
+        media_cover_art_size = 128
+        media_cover_art_cache_size = 64
+        media_memory_cache_size = 0
+        if "media" in config:
+            media_transcode = bool(config["media"].get("transcode", media_transcode))
+            media_format = str(config["media"].get("format", media_format))
+            media_max_bitrate = int(config["media"].get("max_bitrate", media_max_bitrate))
+            media_cover_art_size = int(config["media"].get("cover_art_size", media_cover_art_size))
+            media_cover_art_cache_size = int(config["media"].get("cover_art_cache_size", media_cover_art_cache_size))
+            media_memory_cache_size = int(config["media"].get("memory_cache_size", media_memory_cache_size))
+
+            if media_max_bitrate <= 0:
+                logger.critical("The media.max_bitrate config entry must be greater than 0")
+                return None
+
+            # The format is part of the names of the cached songs
+            if not media_format.isalnum():
+                logger.critical("The media.format config entry must only have letters and numbers")
+                return None
+
+            if media_cover_art_size < 0:
+                logger.critical("The media.cover_art_size config entry is lower than 0 pixels")
+                return None
+
+            if media_cover_art_cache_size <= 0:
+                logger.critical("The media.cover_art_cache_size config entry must be greater than 0")
+                return None
+
+            if media_memory_cache_size < 0:
+                logger.critical("The media.memory_cache_size config entry is lower than 0 MiB")
+                return None
+
+        playback_crossfade = 0.0
+        playback_idle_timeout = 300
+        playback_buffer_frames = 50
+        playback_scrobble = True
+        if "playback" in config:
+            playback_crossfade = float(config["playback"].get("crossfade", playback_crossfade))
+            playback_idle_timeout = int(config["playback"].get("idle_timeout", playback_idle_timeout))
+            playback_buffer_frames = int(config["playback"].get("buffer_frames", playback_buffer_frames))
+            playback_scrobble = bool(config["playback"].get("scrobble", playback_scrobble))
+
+            if playback_crossfade < 0:
+                logger.critical("The playback.crossfade config entry is lower than 0 seconds")
+                return None
+
+            if playback_idle_timeout < 0:
+                logger.critical("The playback.idle_timeout config entry is lower than 0 seconds")
+                return None
+
+            if playback_buffer_frames < 0:
+                logger.critical("The playback.buffer_frames config entry is lower than 0 frames")
+                return None
+
+        queue_fair = False
+        queue_fair_weights: dict[int, int] = {}
+        if "queue" in config:
+            queue_fair = bool(config["queue"].get("fair", queue_fair))
+
+            try:
+                queue_fair_weights = {
+                    int(user_id): int(weight) for user_id, weight in config["queue"].get("weights", {}).items()
+                }
+            except ValueError:
+                logger.critical("The queue.weights config entry must map user IDs to whole numbers")
+                return None
+
+        radio_stations: dict[str, str] = {}
+        radio_bitrate = 128
+        if "radio" in config:
+            radio_stations = {
+                str(name): str(playlist) for name, playlist in config["radio"].get("stations", {}).items()
+            }
+            radio_bitrate = int(config["radio"].get("bitrate", radio_bitrate))
+
+            if not 16 <= radio_bitrate <= 512:
+                logger.critical("The radio.bitrate config entry must be between 16 and 512 kbps")
+                return None
+
+        runtime_uvloop = True
+        runtime_speedups = True
+        if "runtime" in config:
+            runtime_uvloop = bool(config["runtime"].get("uvloop", runtime_uvloop))
+            runtime_speedups = bool(config["runtime"].get("speedups", runtime_speedups))
+
         return Config(
             version=version,
             volume=volume,
@@ -175,4 +381,20 @@ def get_config(config_path: Path) -> Config | None:
             subsonic_user=subsonic_user,
             developer_discord_sync_guild=developer_discord_sync_guild,
             developer_discord_sync_users=developer_discord_sync_users,
+            media_transcode=media_transcode,
+            media_format=media_format,
+            media_max_bitrate=media_max_bitrate,
+            media_cover_art_size=media_cover_art_size,
+            media_cover_art_cache_size=media_cover_art_cache_size,
+            media_memory_cache_size=media_memory_cache_size,
+            playback_crossfade=playback_crossfade,
+            playback_idle_timeout=playback_idle_timeout,
+            playback_buffer_frames=playback_buffer_frames,
+            playback_scrobble=playback_scrobble,
+            queue_fair=queue_fair,
+            queue_fair_weights=queue_fair_weights,
+            radio_stations=radio_stations,
+            radio_bitrate=radio_bitrate,
+            runtime_uvloop=runtime_uvloop,
+            runtime_speedups=runtime_speedups,
         )
@@ -0,0 +1,223 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Watch the config file for changes to reload it while the bot is running."""
+
+import asyncio
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+from asyncio import AbstractEventLoop
+from dataclasses import fields, replace
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Final
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Seconds between the checks of the config file when inotify is not available
+POLL_INTERVAL: Final[float] = 2.0
+
+# Seconds to wait after a change for the editor to finish writing the file
+RELOAD_DEBOUNCE: Final[float] = 0.5
+
+# The config entries that are only applied on startup, by the name of their field
+RESTART_REQUIRED_ENTRIES: Final[dict[str, str]] = {
+    "version": "version",
+    "media_cover_art_size": "media.cover_art_size",
+    "media_cover_art_cache_size": "media.cover_art_cache_size",
+    "playback_scrobble": "playback.scrobble",
+    "queue_fair": "queue.fair",
+    "runtime_uvloop": "runtime.uvloop",
+    "runtime_speedups": "runtime.speedups",
+}
+
+# The inotify flags, from `sys/inotify.h`
+IN_NONBLOCK: Final[int] = 0o4000
+IN_CLOEXEC: Final[int] = 0o2000000
+IN_CLOSE_WRITE: Final[int] = 0x008
+IN_MOVED_TO: Final[int] = 0x080
+IN_CREATE: Final[int] = 0x100
+
+
+def split_live_changes(current: Config, new: Config) -> tuple[Config, list[str]]:
+    """Separate the changes of the config that can be applied while running from the ones that need a restart.
+
+    Args:
+        current: The config in use.
+        new: The config just loaded from the file.
+
+    Returns:
+        The new config with the entries that need a restart kept as in the current one, and the names of those
+        entries that have changed.
+    """
+
+    restart_required = {}
+    for field in fields(Config):
+        if field.name in RESTART_REQUIRED_ENTRIES and getattr(current, field.name) != getattr(new, field.name):
+            restart_required[field.name] = getattr(current, field.name)
+
+    return replace(new, **restart_required), [RESTART_REQUIRED_ENTRIES[name] for name in restart_required]
+
+
+def get_file_hash(path: Path) -> bytes | None:
+    """Get the hash of the content of a file.
+
+    Args:
+        path: The path of the file.
+
+    Returns:
+        The hash or None if the file can't be read.
+    """
+
+    try:
+        return hashlib.sha256(path.read_bytes()).digest()
+    except OSError:
+        return None
+
+
+class ConfigWatcher:
+    """Notify when the content of the config file changes.
+
+    The folder of the file is watched with inotify so editors that replace the file are also detected, if it's not
+    available the file is checked periodically. In both cases the content is compared to the last one seen, so
+    changes that don't modify the content are ignored.
+    """
+
+    def __init__(self, config_file: Path, on_change: Callable[[], Coroutine[Any, Any, None]]) -> None:
+        """Create a new watcher, `start` should be called from the event loop.
+
+        Args:
+            config_file: The path of the config file.
+            on_change: Called every time the content of the file changes.
+        """
+
+        self.config_file = config_file
+        self.on_change = on_change
+
+        self.last_hash = get_file_hash(config_file)
+
+        self.inotify_fd: int | None = None
+        self.pending_check: asyncio.TimerHandle | None = None
+        self.poll_task: asyncio.Task[None] | None = None
+        self.reload_task: asyncio.Task[None] | None = None
+
+    def _open_inotify(self) -> int | None:
+        """Start watching the folder of the config file with inotify.
+
+        Returns:
+            The inotify file descriptor or None if inotify is not available.
+        """
+
+        library = ctypes.util.find_library("c")
+        if library is None:
+            return None
+
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+
+        inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        fd: int = inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if inotify_add_watch(fd, os.fsencode(self.config_file.parent), mask) < 0:
+            os.close(fd)
+            return None
+
+        return fd
+
+    def start(self, loop: AbstractEventLoop) -> None:
+        """Start watching the file.
+
+        Args:
+            loop: The event loop where the changes are notified.
+        """
+
+        self.inotify_fd = self._open_inotify()
+
+        if self.inotify_fd is not None:
+            loop.add_reader(self.inotify_fd, self._read_inotify, loop)
+            logger.debug("Watching the config file with inotify")
+            return
+
+        logger.debug("Inotify is not available, polling the config file")
+        self.poll_task = loop.create_task(self._poll(loop))
+
+    def _read_inotify(self, loop: AbstractEventLoop) -> None:
+        """Consume the inotify events and schedule a check of the file.
+
+        Args:
+            loop: The event loop where the changes are notified.
+        """
+
+        assert self.inotify_fd is not None
+
+        try:
+            while os.read(self.inotify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        # Editors usually write the file in several steps
+        if self.pending_check is not None:
+            self.pending_check.cancel()
+
+        self.pending_check = loop.call_later(RELOAD_DEBOUNCE, self._check, loop)
+
+    async def _poll(self, loop: AbstractEventLoop) -> None:
+        """Check the file periodically.
+
+        Args:
+            loop: The event loop where the changes are notified.
+        """
+
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            self._check(loop)
+
+    def _check(self, loop: AbstractEventLoop) -> None:
+        """Notify the change if the content of the file is not the last one seen.
+
+        Args:
+            loop: The event loop where the changes are notified.
+        """
+
+        self.pending_check = None
+
+        file_hash = get_file_hash(self.config_file)
+        if file_hash is None or file_hash == self.last_hash:
+            return
+
+        self.last_hash = file_hash
+
+        # Keep a reference so the task is not garbage collected
+        self.reload_task = loop.create_task(self.on_change())
+
+    def stop(self, loop: AbstractEventLoop) -> None:
+        """Stop watching the file.
+
+        Args:
+            loop: The event loop where the watcher was started.
+        """
+
+        if self.pending_check is not None:
+            self.pending_check.cancel()
+
+        if self.inotify_fd is not None:
+            loop.remove_reader(self.inotify_fd)
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+        if self.poll_task is not None:
+            self.poll_task.cancel()
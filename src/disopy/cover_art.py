@@ -0,0 +1,153 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Fetch and cache on disk small thumbnails of the cover arts."""
+
+import logging
+import threading
+from collections import OrderedDict
+from mimetypes import guess_extension
+from pathlib import Path
+
+import requests
+from knuckles import Subsonic
+
+from .media import DOWNLOAD_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class CoverArtCache:
+    """Thumbnails of the cover arts on disk, evicting the least recently used ones when over the size budget.
+
+    All the methods are thread safe, `fetch` is blocking and should be called from a worker thread while
+    `get_cached` only looks up the index in memory and can be called from the event loop.
+    """
+
+    def __init__(self, subsonic: Subsonic, cache_path: Path, size: int, max_bytes: int) -> None:
+        """Create a new cache, `load` should be called before using it.
+
+        Args:
+            subsonic: The object to be used to access the OpenSubsonic REST API.
+            cache_path: The root cache path of the program.
+            size: The width in pixels of the thumbnails.
+            max_bytes: The max size in bytes of all the thumbnails together.
+        """
+
+        self.subsonic = subsonic
+        self.path = cache_path / "subsonic/cover-art"
+        self.size = size
+        self.max_bytes = max_bytes
+
+        # Least recently used first
+        self.entries: OrderedDict[str, Path] = OrderedDict()
+        self.total_bytes = 0
+
+        self.lock = threading.Lock()
+
+    def load(self) -> None:
+        """Build the index of the thumbnails already on disk, using their modification time as the last use."""
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        files = sorted(
+            (file for file in self.path.iterdir() if file.is_file() and file.suffix != ".part"),
+            key=lambda file: file.stat().st_mtime,
+        )
+
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+            for file in files:
+                cover_art_id, _, size = file.stem.rpartition("-")
+                if size != str(self.size):
+                    # Thumbnails of an old size setting
+                    file.unlink(missing_ok=True)
+                    continue
+
+                self.entries[cover_art_id] = file
+                self.total_bytes += file.stat().st_size
+
+        self._evict()
+        logger.info(f"Loaded {len(self.entries)} cover arts from the cache ({self.total_bytes // 1024} KiB)")
+
+    def get_cached(self, cover_art_id: str) -> Path | None:
+        """Get the thumbnail of a cover art only if it's already cached.
+
+        Args:
+            cover_art_id: The ID of the cover art.
+
+        Returns:
+            The path of the thumbnail or None if it's a cache miss.
+        """
+
+        with self.lock:
+            path = self.entries.get(cover_art_id)
+            if path is not None:
+                self.entries.move_to_end(cover_art_id)
+
+        return path
+
+    def fetch(self, cover_art_id: str) -> Path | None:
+        """Get the thumbnail of a cover art, downloading it if it's not cached.
+
+        Args:
+            cover_art_id: The ID of the cover art.
+
+        Returns:
+            The path of the thumbnail or None if it couldn't be downloaded.
+        """
+
+        path = self.get_cached(cover_art_id)
+        if path is not None:
+            # Persist the last use so the eviction order survives restarts
+            path.touch(exist_ok=True)
+            return path
+
+        url = self.subsonic.api.generate_url("getCoverArt", {"id": cover_art_id, "size": self.size})
+
+        try:
+            with requests.get(url, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+
+                content_type = response.headers.get("Content-Type", "").partition(";")[0].strip()
+                if not content_type.startswith("image/"):
+                    logger.warning(f"The server didn't return an image for the cover art '{cover_art_id}'")
+                    return None
+
+                path = self.path / f"{cover_art_id}-{self.size}{guess_extension(content_type) or '.img'}"
+                self.path.mkdir(parents=True, exist_ok=True)
+
+                temporal_path = path.with_suffix(".part")
+                temporal_path.write_bytes(response.content)
+                temporal_path.replace(path)
+
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Unable to download the cover art '{cover_art_id}': {e}")
+            return None
+
+        with self.lock:
+            # Another thread may have downloaded the same cover art meanwhile
+            if cover_art_id not in self.entries:
+                self.total_bytes += path.stat().st_size
+
+            self.entries[cover_art_id] = path
+
+        self._evict()
+
+        return path
+
+    def _evict(self) -> None:
+        """Remove the least recently used thumbnails until the cache is under its size budget."""
+
+        with self.lock:
+            while self.total_bytes > self.max_bytes and self.entries:
+                _, path = self.entries.popitem(last=False)
+
+                try:
+                    self.total_bytes -= path.stat().st_size
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
@@ -4,88 +4,247 @@
 
 """Implementation of the Discord bot"""
 
+import asyncio
 import logging
-from typing import Final
+from typing import Any
 
 import discord
-from discord.ext.commands import Bot
+from discord import app_commands
+from discord.ext.commands import Bot, when_mentioned
+from discord.interactions import Interaction
 from knuckles import Subsonic
 
-from . import APP_NAME_LOWER
+from .cogs.base import Base
+from .cogs.cache import CacheCog
 from .cogs.misc import Misc
 from .cogs.queue import QueueCog
+from .cogs.radio import RadioCog
 from .cogs.search import Search
-from .config import Config
+from .command_tree import sync_command_tree
+from .config import Config, get_config, get_config_file_path
+from .config_watcher import ConfigWatcher, split_live_changes
+from .memory import MemoryProfiler
 from .options import Options
+from .timing import PhaseTimer
+from .traces import TraceRecorder
 
 logger = logging.getLogger(__name__)
 
-COMMAND_TREE_STATUS_FILE_CONTENT: Final[str] = "Disopy Command Tree version: 1"
 
+class DisopyBot(Bot):
+    """The Discord bot, with its cogs registered once before connecting to the gateway."""
+
+    def __init__(self, subsonic: Subsonic, config: Config, options: Options, timer: PhaseTimer) -> None:
+        """Create a new bot.
+
+        Args:
+            subsonic: The object to be used to access the OpenSubsonic REST API.
+            config: The config of the program.
+            options: The options set on startup.
+            timer: The timer of the startup phases.
+        """
+
+        # Only what the slash commands use, the voice states are needed to know who is listening
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.voice_states = True
+
+        # There are no text commands, so the members outside voice channels and the messages are not cached
+        super().__init__(
+            when_mentioned,
+            intents=intents,
+            member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+            chunk_guilds_at_startup=False,
+            max_messages=None,
+        )
+
+        self.subsonic = subsonic
+        self.config = config
+        self.options = options
+        self.timer = timer
+
+        self.config_watcher = ConfigWatcher(get_config_file_path(options.config_path), self.reload_config)
+        self.reload_lock = asyncio.Lock()
+
+        self.memory_profiler: MemoryProfiler | None = None
+        if options.trace_memory > 0:
+            self.memory_profiler = MemoryProfiler(options.cache_path, options.trace_memory * 60)
+
+        self.trace_recorder: TraceRecorder | None = None
+        if options.record_traces is not None:
+            self.trace_recorder = TraceRecorder(options.record_traces)
+            self.tree.error(self.on_app_command_error)
+
+    async def setup_hook(self) -> None:
+        """Register the cogs, called once after the login and before connecting to the gateway."""
+
+        with self.timer.phase("Cogs setup"):
+            await asyncio.gather(
+                self.add_cog(Misc(self, self.options, self.subsonic, self.config, self.memory_profiler)),
+                self.add_cog(Search(self, self.options, self.subsonic)),
+                self.add_cog(QueueCog(self, self.options, self.subsonic, self.config)),
+                self.add_cog(CacheCog(self, self.options, self.subsonic, self.config)),
+                self.add_cog(RadioCog(self, self.options, self.subsonic, self.config)),
+            )
 
-def check_command_tree_status(options: Options) -> bool:
-    command_tree_status_path = options.cache_path / "discord/command-tree-status.txt"
+        # Syncing may be rate limited by Discord, don't make the bot wait for it
+        self.sync_task = self.loop.create_task(self.sync_command_tree())
 
-    status = True
+        self.config_watcher.start(self.loop)
 
-    if not command_tree_status_path.is_file():
-        command_tree_status_path.parent.mkdir(parents=True, exist_ok=True)
-        command_tree_status_path.touch()
+        if self.memory_profiler is not None:
+            self.memory_profiler.start(self.loop)
 
-        status = False
+        if self.trace_recorder is not None:
+            self.trace_recorder.start(self.loop)
 
-    with open(command_tree_status_path, "r+") as f:
-        content = f.readline()
+    async def close(self) -> None:
+        """Stop the background tasks, write the pending traces and close the connection to Discord."""
 
-        if content != COMMAND_TREE_STATUS_FILE_CONTENT:
-            f.seek(0)
-            f.write(COMMAND_TREE_STATUS_FILE_CONTENT)
-            f.truncate()
+        self.config_watcher.stop(self.loop)
 
-            status = False
+        if self.memory_profiler is not None:
+            self.memory_profiler.stop()
 
-    return status
+        if self.trace_recorder is not None:
+            await self.trace_recorder.close()
 
+        await super().close()
 
-def get_bot(subsonic: Subsonic, config: Config, options: Options) -> Bot:
-    """Get the Discord bot.
+    async def on_app_command_completion(
+        self, interaction: Interaction, command: app_commands.Command[Any, ..., Any] | app_commands.ContextMenu
+    ) -> None:
+        """Record the commands handled without errors.
 
-    Args:
-        subsonic: The object to be used to access the OpenSubsonic REST API.
-        config: The config of the program.
-        options: The options set on startup.
+        Args:
+            interaction: The interaction of the command.
+            command: The handled command.
+        """
 
-    Returns:
-        A configured ready to use bot.
-    """
+        if self.trace_recorder is not None:
+            self.trace_recorder.record(interaction)
+
+    async def on_app_command_error(self, interaction: Interaction, error: app_commands.AppCommandError) -> None:
+        """Record the commands that failed and report the error as discord.py does by default.
+
+        Args:
+            interaction: The interaction of the command.
+            error: The raised error.
+        """
+
+        if self.trace_recorder is not None:
+            original = error.original if isinstance(error, app_commands.CommandInvokeError) else error
+            self.trace_recorder.record(interaction, type(original).__name__)
+
+        await app_commands.CommandTree.on_error(self.tree, interaction, error)
+
+    async def reload_config(self) -> None:
+        """Load again the config file and apply it to the running cogs."""
+
+        async with self.reload_lock:
+            logger.info("The config file has changed, reloading it...")
+
+            # The entries with values of the wrong type are not checked by the parser
+            try:
+                config = await asyncio.to_thread(get_config, self.options.config_path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"The new config file is not valid, keeping the current config: {e}")
+                return
+
+            if config is None:
+                logger.error("The new config file is not valid, keeping the current config")
+                return
+
+            config, restart_required = split_live_changes(self.config, config)
+            if restart_required:
+                logger.warning(
+                    f"The config entries {", ".join(f"'{entry}'" for entry in restart_required)} can't be changed "
+                    + "while running, restart the bot to apply them"
+                )
+
+            if config == self.config:
+                logger.info("The config file has no changes that can be applied")
+                return
+
+            old_config = self.config
+            self.update_subsonic(config)
 
-    intents = discord.Intents.default()
-    intents.message_content = True
+            # Every cog sees the whole new config at once
+            self.config = config
+            for cog in self.cogs.values():
+                if isinstance(cog, Base):
+                    cog.reload_config(config)
 
-    bot = discord.ext.commands.Bot(f"!{APP_NAME_LOWER}", intents=intents)
+            if config.developer_discord_sync_guild != old_config.developer_discord_sync_guild:
+                self.sync_task = self.loop.create_task(self.sync_command_tree())
 
-    @bot.event
-    async def on_ready() -> None:
-        """Thing to be run the startup of the bot"""
+            logger.info("The new config has been applied")
 
-        logger.info(f"Logged in as '{bot.user}'")
+    def update_subsonic(self, config: Config) -> None:
+        """Point the shared Subsonic object to the server and user of a config.
 
-        await bot.add_cog(Misc(bot, options, subsonic, config))
-        await bot.add_cog(Search(bot, options, subsonic))
-        await bot.add_cog(QueueCog(bot, options, subsonic, config))
+        Args:
+            config: The config with the new server and user.
+        """
+
+        if (config.subsonic_url, config.use_https, config.subsonic_user) == (
+            self.config.subsonic_url,
+            self.config.use_https,
+            self.config.subsonic_user,
+        ):
+            return
+
+        # Let knuckles sanitize the URL the same way it does on startup
+        api = Subsonic(
+            url=config.subsonic_url,
+            user=config.subsonic_user,
+            password=self.subsonic.api.password,
+            client=self.subsonic.api.client,
+            use_https=config.use_https,
+        ).api
+
+        self.subsonic.api.url = api.url
+        self.subsonic.api.username = api.username
+
+        logger.info(f"Using the Subsonic server '{api.url}' as the user '{api.username}'")
+
+        if not config.use_https:
+            logger.warning("Secure conection (HTTPS) to the Subsonic server is disabled, using plain HTTP!")
+
+    async def sync_command_tree(self) -> None:
+        """Sync the Command Tree with the Discord API if it's outdated."""
 
         logger.info("Checking if the Command Tree is up to date in the Discord API...")
-        if not check_command_tree_status(options):
-            logger.info("The Command Tree is outdated, forcing sync!")
-            await bot.tree.sync()
+        await sync_command_tree(self.tree, self.options)
 
-        if config.developer_discord_sync_guild is not None:
+        if self.config.developer_discord_sync_guild is not None:
             logger.info(
-                f"Developer config detected, reloading command tree for guild: '{config.developer_discord_sync_guild}'"
+                "Developer config detected, checking the command tree for guild: "
+                + f"'{self.config.developer_discord_sync_guild}'"
             )
-            guild_object = discord.Object(id=config.developer_discord_sync_guild)
+            guild_object = discord.Object(id=self.config.developer_discord_sync_guild)
+
+            self.tree.copy_global_to(guild=guild_object)
+            await sync_command_tree(self.tree, self.options, guild_object)
+
+    async def on_ready(self) -> None:
+        """Called every time the bot connects or reconnects to the gateway."""
+
+        logger.info(f"Logged in as '{self.user}'")
+        self.timer.report()
+
 
-            bot.tree.copy_global_to(guild=guild_object)
-            await bot.tree.sync(guild=guild_object)
+def get_bot(subsonic: Subsonic, config: Config, options: Options, timer: PhaseTimer) -> DisopyBot:
+    """Get the Discord bot.
+
+    Args:
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+        config: The config of the program.
+        options: The options set on startup.
+        timer: The timer of the startup phases.
+
+    Returns:
+        A configured ready to use bot.
+    """
 
-    return bot
+    return DisopyBot(subsonic, config, options, timer)
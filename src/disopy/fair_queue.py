@@ -0,0 +1,316 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""A queue that shares the playback fairly between the users that add elements to it."""
+
+from collections import deque
+from typing import Callable, Generic, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class FairQueue(Generic[T]):
+    """A queue split in a sub-queue per requester, served with weighted round robin.
+
+    Every turn a requester gets as many elements as its weight before passing to the next one, so taking the next
+    element is O(1) no matter how many elements a single requester has added. Positional operations walk the
+    schedule and are O(n), they are only used by the queue editing commands.
+    """
+
+    def __init__(self, get_requester: Callable[[T], int], weights: dict[int, int] | None = None) -> None:
+        """Create a new queue.
+
+        Args:
+            get_requester: Get the requester of an element.
+            weights: The elements per turn of each requester, one if missing.
+        """
+
+        self.get_requester = get_requester
+        self.weights = weights if weights is not None else {}
+
+        self.queues: dict[int, deque[T]] = {}
+        self.order: deque[int] = deque()
+
+        # The elements the requester at the head of the order can still take in its current turn
+        self.credits = 0
+        self.length = 0
+
+    def weight(self, requester: int) -> int:
+        """Get the elements per turn of a requester.
+
+        Args:
+            requester: The requester.
+
+        Returns:
+            The weight of the requester, at least one.
+        """
+
+        return max(self.weights.get(requester, 1), 1)
+
+    def _remove_requester(self, requester: int) -> None:
+        """Remove a requester without elements from the schedule.
+
+        Args:
+            requester: The requester to remove.
+        """
+
+        was_head = self.order[0] == requester
+
+        self.order.remove(requester)
+        del self.queues[requester]
+
+        if was_head and self.order:
+            self.credits = self.weight(self.order[0])
+
+    def _schedule(self) -> Iterator[tuple[int, int, T]]:
+        """Walk the elements in the order they will be taken, without modifying the queue.
+
+        Returns:
+            An iterator of the requester, the offset in its sub-queue and the element.
+        """
+
+        ring = list(self.order)
+        iterators = {requester: iter(self.queues[requester]) for requester in ring}
+        offsets = dict.fromkeys(ring, 0)
+
+        position = 0
+        credits = self.credits
+
+        while ring:
+            requester = ring[position]
+
+            yield requester, offsets[requester], next(iterators[requester])
+
+            offsets[requester] += 1
+            credits -= 1
+
+            if offsets[requester] == len(self.queues[requester]):
+                ring.pop(position)
+                if not ring:
+                    return
+
+                position %= len(ring)
+                credits = self.weight(ring[position])
+
+            elif credits == 0:
+                position = (position + 1) % len(ring)
+                credits = self.weight(ring[position])
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """Find the sub-queue and the offset inside of it of a position.
+
+        Args:
+            index: A possibly negative position in the queue.
+
+        Raises:
+            IndexError: The position is out of the queue.
+
+        Returns:
+            The requester and the offset in its sub-queue.
+        """
+
+        if index < 0:
+            index += self.length
+
+        if index < 0 or index >= self.length:
+            raise IndexError("FairQueue index out of range")
+
+        for position, (requester, offset, _) in enumerate(self._schedule()):
+            if position == index:
+                return requester, offset
+
+        raise IndexError("FairQueue index out of range")
+
+    def __len__(self) -> int:
+        """Get the length of the queue.
+
+        Returns:
+            The number of elements.
+        """
+
+        return self.length
+
+    def __iter__(self) -> Iterator[T]:
+        """Iterate the elements in the order they will be taken.
+
+        Returns:
+            An iterator over the elements.
+        """
+
+        return (element for _, _, element in self._schedule())
+
+    def append(self, element: T) -> None:
+        """Add an element at the end of the sub-queue of its requester.
+
+        Args:
+            element: The element to add.
+        """
+
+        requester = self.get_requester(element)
+
+        if requester not in self.queues:
+            self.queues[requester] = deque()
+            self.order.append(requester)
+
+            if len(self.order) == 1:
+                self.credits = self.weight(requester)
+
+        self.queues[requester].append(element)
+        self.length += 1
+
+    def insert(self, index: int, element: T) -> None:
+        """Insert an element in the sub-queue of its requester, so it's taken in its first turn from a position.
+
+        At the front the requester takes the current turn, so the element is the next one to be taken and the turn is
+        billed to its own requester. Elsewhere it's taken at the position if its requester has the slot, or later in
+        the next turn of its requester. A requester without elements joins at the end of the round.
+
+        Args:
+            index: The position where the element should be.
+            element: The element to insert.
+        """
+
+        if index < 0:
+            index = max(index + self.length, 0)
+
+        requester = self.get_requester(element)
+
+        if index == 0 and self.length > 0:
+            if requester in self.queues:
+                self.order.rotate(-self.order.index(requester))
+            else:
+                self.queues[requester] = deque()
+                self.order.appendleft(requester)
+
+            self.queues[requester].appendleft(element)
+            self.credits = self.weight(requester)
+            self.length += 1
+            return
+
+        if index >= self.length or requester not in self.queues:
+            self.append(element)
+            return
+
+        # Placed after the elements of the requester taken before the position
+        offset = sum(1 for _, (other, _, _) in zip(range(index), self._schedule()) if other == requester)
+
+        self.queues[requester].insert(offset, element)
+        self.length += 1
+
+    def pop(self, index: int = 0) -> T:
+        """Remove and get the element at a position, the next one to be taken by default.
+
+        Args:
+            index: The position of the element.
+
+        Raises:
+            IndexError: The queue is empty or the position is out of it.
+
+        Returns:
+            The removed element.
+        """
+
+        if index == 0 and self.length > 0:
+            requester = self.order[0]
+            element = self.queues[requester].popleft()
+            self.credits -= 1
+
+            if not self.queues[requester]:
+                self._remove_requester(requester)
+
+            elif self.credits == 0:
+                self.order.rotate(-1)
+                self.credits = self.weight(self.order[0])
+
+            self.length -= 1
+            return element
+
+        requester, offset = self._locate(index)
+
+        queue = self.queues[requester]
+        element = queue[offset]
+        del queue[offset]
+
+        if not queue:
+            self._remove_requester(requester)
+
+        self.length -= 1
+        return element
+
+    def replace(self, index: int, elements: Iterable[T]) -> None:
+        """Replace the element at a position with several elements, or remove it if there are none.
+
+        The elements are placed in the sub-queue of the replaced one, so its requester keeps its turns.
+
+        Args:
+            index: The position of the element.
+            elements: The elements that take its place, in order.
+
+        Raises:
+            IndexError: The position is out of the queue.
+        """
+
+        requester, offset = self._locate(index)
+
+        queue = self.queues[requester]
+        del queue[offset]
+
+        added = 0
+        for element in elements:
+            queue.insert(offset + added, element)
+            added += 1
+
+        self.length += added - 1
+
+        if not queue:
+            self._remove_requester(requester)
+
+    def position(self, element: T) -> int:
+        """Find the position of an element, compared by identity.
+
+        Args:
+            element: The element to find.
+
+        Raises:
+            ValueError: The element is not in the queue.
+
+        Returns:
+            The position of the element.
+        """
+
+        for position, (_, _, other) in enumerate(self._schedule()):
+            if other is element:
+                return position
+
+        raise ValueError("Element not in FairQueue")
+
+    def move(self, source: int, destination: int) -> T:
+        """Move an element to another position, following the same rules as `insert`.
+
+        The element keeps its requester, so it may be taken after the destination, use `position` to know where it
+        has been placed.
+
+        Args:
+            source: The current position of the element.
+            destination: The position the element should have after being moved.
+
+        Returns:
+            The moved element.
+        """
+
+        if destination < 0:
+            destination += self.length
+
+        element = self.pop(source)
+        self.insert(destination, element)
+
+        return element
+
+    def clear(self) -> None:
+        """Remove all the elements of the queue."""
+
+        self.queues.clear()
+        self.order.clear()
+        self.credits = 0
+        self.length = 0
@@ -0,0 +1,283 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Keep the most played songs of the cache in memory, for the deployments where the cache is in a slow disk."""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from functools import cache
+from pathlib import Path
+from typing import Final, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Times a song has to be played before being copied to memory, the songs played only once are not worth it
+PROMOTION_HITS: Final[int] = 2
+
+# Plays after which all the counts are halved, so the songs that were popular long ago make room for the new ones
+AGING_PERIOD: Final[int] = 1000
+
+# Seconds a song removed from memory is kept open, FFmpeg may be about to open it
+RETIRE_DELAY: Final[float] = 30.0
+
+
+def is_memory_file_supported() -> bool:
+    """Check if the platform can create anonymous files in memory that FFmpeg can open by path.
+
+    Returns:
+        If the memory tier can be used.
+    """
+
+    return hasattr(os, "memfd_create") and Path("/proc/self/fd").is_dir()
+
+
+class HotEntry(NamedTuple):
+    """A song copied to memory.
+
+    Attributes:
+        fd: The file descriptor of the anonymous file in memory.
+        size: The size in bytes of the song.
+    """
+
+    fd: int
+    size: int
+
+
+class HotSongCache:
+    """In memory tier over the songs cache, with a byte budget shared by all the guilds and radio stations.
+
+    Every play is counted and a song played often enough is copied to an anonymous file in memory, replacing the
+    songs played fewer times when the budget is full. The counts are halved periodically so the tier follows what is
+    popular now. The disk copy is never removed, so a song evicted from memory is just read from the disk again.
+    """
+
+    def __init__(self) -> None:
+        """Create a new empty tier, disabled until a budget is set."""
+
+        self.requested_bytes = 0
+        self.max_bytes = 0
+        self.used_bytes = 0
+
+        self.hits: dict[str, int] = {}
+        self.plays = 0
+
+        self.entries: dict[str, HotEntry] = {}
+        self.loading: set[str] = set()
+
+        # The file descriptors of the evicted songs and when they were evicted
+        self.retired: list[tuple[float, int]] = []
+
+        self.lock = threading.Lock()
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        """Change the budget of the tier, evicting the least played songs if it's now over it.
+
+        Args:
+            max_bytes: The max size in bytes of the songs in memory, zero to disable the tier.
+        """
+
+        # Every cog that plays songs sets the same budget
+        if max_bytes == self.requested_bytes:
+            return
+
+        self.requested_bytes = max_bytes
+
+        if max_bytes > 0 and not is_memory_file_supported():
+            logger.warning("Keeping songs in memory is not supported in this platform, they are always read from disk")
+            max_bytes = 0
+
+        elif max_bytes > 0:
+            logger.info(f"Keeping up to {max_bytes / 1024**2:.0f} MiB of the most played songs in memory")
+
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.make_room(0)
+
+    def summary(self) -> tuple[int, int]:
+        """Get what is stored in memory.
+
+        Returns:
+            The number of songs and their size in bytes.
+        """
+
+        with self.lock:
+            return len(self.entries), sum(entry.size for entry in self.entries.values())
+
+    def count_play(self, key: str) -> int:
+        """Count a play of a song, aging all the counts every period.
+
+        It should be called with the lock held.
+
+        Args:
+            key: The name of the song file.
+
+        Returns:
+            The plays of the song.
+        """
+
+        self.hits[key] = self.hits.get(key, 0) + 1
+        self.plays += 1
+
+        if self.plays >= AGING_PERIOD:
+            self.plays = 0
+
+            # The songs halved down to zero are forgotten unless they are in memory
+            self.hits = {key: hits // 2 for key, hits in self.hits.items() if hits > 1 or key in self.entries}
+
+        return self.hits.get(key, 0)
+
+    def make_room(self, size: int, hits: int | None = None) -> bool:
+        """Evict the least played songs until there is room for a new one.
+
+        It should be called with the lock held.
+
+        Args:
+            size: The size in bytes of the new song.
+            hits: The plays of the new song, only the songs played fewer times are evicted for it. None to evict any
+                song, used when the budget shrinks.
+
+        Returns:
+            If there is room for the song.
+        """
+
+        if size > self.max_bytes:
+            return False
+
+        needed = self.used_bytes + size - self.max_bytes
+        victims = []
+
+        for key in sorted(self.entries, key=lambda key: self.hits.get(key, 0)):
+            if needed <= 0:
+                break
+
+            if hits is not None and self.hits.get(key, 0) >= hits:
+                return False
+
+            victims.append(key)
+            needed -= self.entries[key].size
+
+        if needed > 0:
+            return False
+
+        now = time.monotonic()
+        for key in victims:
+            entry = self.entries.pop(key)
+            self.used_bytes -= entry.size
+            self.retired.append((now, entry.fd))
+
+            logger.debug(f"Song '{key}' evicted from memory")
+
+        return True
+
+    def close_retired(self) -> None:
+        """Close the evicted songs once FFmpeg has had time to open them.
+
+        It should be called with the lock held.
+        """
+
+        now = time.monotonic()
+
+        pending = []
+        for retired_at, fd in self.retired:
+            if now - retired_at < RETIRE_DELAY:
+                pending.append((retired_at, fd))
+            else:
+                os.close(fd)
+
+        self.retired = pending
+
+    def access(self, song_path: Path) -> str | None:
+        """Count a play of a cached song and get the path of its copy in memory, copying it if it's played often
+        enough.
+
+        This call is blocking and should not be done on the event loop.
+
+        Args:
+            song_path: The path of the song in the disk cache.
+
+        Returns:
+            The path FFmpeg should open to read the copy in memory, or None if the song should be read from disk.
+        """
+
+        key = song_path.name
+
+        with self.lock:
+            self.close_retired()
+
+            hits = self.count_play(key)
+
+            entry = self.entries.get(key)
+            if entry is not None:
+                return get_memory_file_path(entry.fd)
+
+            if self.max_bytes == 0 or hits < PROMOTION_HITS or key in self.loading:
+                return None
+
+            try:
+                size = song_path.stat().st_size
+            except OSError:
+                return None
+
+            if not self.make_room(size, hits):
+                return None
+
+            # Reserve the room while the song is read without holding the lock, the disk may be slow
+            self.used_bytes += size
+            self.loading.add(key)
+
+        fd = None
+        try:
+            fd = os.memfd_create(f"song-{key}", os.MFD_CLOEXEC)
+            with open(song_path, "rb") as source, os.fdopen(fd, "wb", closefd=False) as destination:
+                shutil.copyfileobj(source, destination)
+
+        except OSError as e:
+            logger.warning(f"Unable to copy the song '{key}' to memory: {e}")
+
+            if fd is not None:
+                os.close(fd)
+
+            with self.lock:
+                self.used_bytes -= size
+                self.loading.discard(key)
+
+            return None
+
+        with self.lock:
+            self.loading.discard(key)
+            self.entries[key] = HotEntry(fd, size)
+
+        logger.debug(f"Song '{key}' promoted to memory ({size / 1024**2:.1f} MiB)")
+
+        return get_memory_file_path(fd)
+
+
+def get_memory_file_path(fd: int) -> str:
+    """Get the path other processes can use to open an anonymous file of this process.
+
+    Args:
+        fd: The file descriptor of the file.
+
+    Returns:
+        The path of the file.
+    """
+
+    return f"/proc/{os.getpid()}/fd/{fd}"
+
+
+@cache
+def get_hot_cache(songs_path: Path) -> HotSongCache:
+    """Get the memory tier of a songs cache folder, shared by the whole program.
+
+    Args:
+        songs_path: The folder where the songs are cached.
+
+    Returns:
+        The memory tier of the folder.
+    """
+
+    return HotSongCache()
@@ -4,8 +4,15 @@
 
 """Handle the unified logging of the program."""
 
+import atexit
+import copy
+import json
 import logging
-from typing import Final
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, Final
 
 from colorama import Fore, Style
 
@@ -18,6 +25,10 @@ LOG_PREFIX: Final[dict[int, tuple[str, str]]] = {
     logging.CRITICAL: ("CRITICAL", Fore.MAGENTA),
 }
 
+# The guild and command being handled in the current context, attached to every record logged from it
+log_guild: ContextVar[int | None] = ContextVar("log_guild", default=None)
+log_command: ContextVar[str | None] = ContextVar("log_command", default=None)
+
 
 class ColoredFormatter(logging.Formatter):
     """A custom formatter that takes care of coloring the output, following the [CLIG](https://clig.dev/)."""
@@ -31,6 +42,17 @@ class ColoredFormatter(logging.Formatter):
 
         self.color = color
 
+        # Build the formatter of every level only once
+        self.formatters = {
+            level: logging.Formatter(
+                (
+                    f"%(asctime)s - {Style.BRIGHT}{prefix_color if self.color else ""}"
+                    + f"{prefix_text}{Style.RESET_ALL} - %(name)s: %(message)s"
+                )
+            )
+            for level, (prefix_text, prefix_color) in LOG_PREFIX.items()
+        }
+
     def format(self, record: logging.LogRecord) -> str:
         """Format the record taking care of output coloring.
 
@@ -41,23 +63,85 @@ class ColoredFormatter(logging.Formatter):
             The formatted output.
         """
 
-        prefix_text, prefix_color = LOG_PREFIX[record.levelno]
-
-        formatter = logging.Formatter(
-            (
-                f"%(asctime)s - {Style.BRIGHT}{prefix_color if self.color else ""}"
-                + f"{prefix_text}{Style.RESET_ALL} - %(name)s: %(message)s"
-            )
-        )
+        formatter = self.formatters.get(record.levelno, self.formatters[logging.CRITICAL])
 
         return formatter.format(record)
 
 
-def setup_logging(debug: bool, color: bool) -> None:
+class JsonFormatter(logging.Formatter):
+    """A formatter that outputs every record as a single JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format the record as a JSON line.
+
+        Args:
+            record: The record to format.
+
+        Returns:
+            The formatted output.
+        """
+
+        entry: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "guild": getattr(record, "guild", None),
+            "command": getattr(record, "command", None),
+        }
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ContextQueueHandler(QueueHandler):
+    """Queue the records to be written from another thread, attaching to them the guild and command of the context."""
+
+    exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Make the record safe to be sent to another thread.
+
+        Args:
+            record: The record to prepare.
+
+        Returns:
+            A copy of the record with its message merged and its exception as text.
+        """
+
+        record = copy.copy(record)
+
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = self.exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+
+        if getattr(record, "guild", None) is None:
+            record.guild = log_guild.get()
+
+        if getattr(record, "command", None) is None:
+            record.command = log_command.get()
+
+        return record
+
+
+def setup_logging(debug: bool, color: bool, json_output: bool = False) -> None:
     """Setup the root logger.
 
+    The records are only queued by the thread that logs them, a background thread formats and writes them so
+    neither the event loop nor the audio thread wait for the output.
+
     Args:
         debug: If debug messages should be logged.
+        color: If the output should be colored.
+        json_output: If the records should be written as JSON lines.
     """
 
     logging_level = logging.DEBUG if debug else logging.INFO
@@ -67,6 +151,17 @@ def setup_logging(debug: bool, color: bool) -> None:
 
     stream_handler = logging.StreamHandler()
     stream_handler.setLevel(logging_level)
-    stream_handler.setFormatter(ColoredFormatter(color))
+    stream_handler.setFormatter(JsonFormatter() if json_output else ColoredFormatter(color))
+
+    log_queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.setLevel(logging_level)
+
+    root_logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
 
-    root_logger.addHandler(stream_handler)
+    # Write the records still in the queue before exiting
+    atexit.register(listener.stop)
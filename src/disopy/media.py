@@ -0,0 +1,374 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Handle the retrieval of the songs from the Subsonic server and its local cache."""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Final, NamedTuple
+
+import requests
+from knuckles import Subsonic
+
+from .cache_index import LEGACY_SONG_SUFFIX, SONG_SUFFIX, get_cache_index
+from .config import Config
+from .hot_cache import get_hot_cache
+from .options import Options
+
+logger = logging.getLogger(__name__)
+
+# The format and bitrate used in the cache key of the songs downloaded without transcoding
+ORIGINAL_FORMAT: Final[str] = "raw"
+ORIGINAL_BITRATE: Final[int] = 0
+
+# Max seconds to wait for the server to start sending a song
+DOWNLOAD_TIMEOUT: Final[int] = 30
+
+
+class BandwidthLimiter:
+    """Limit the total download speed of several threads."""
+
+    def __init__(self, bytes_per_second: int) -> None:
+        """Create a new limiter.
+
+        Args:
+            bytes_per_second: The max amount of bytes that should be downloaded per second.
+        """
+
+        self.bytes_per_second = bytes_per_second
+
+        # When the already downloaded bytes would have been downloaded at the max speed
+        self.next_free = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        """Register downloaded bytes, blocking the thread until they fit under the limit.
+
+        Args:
+            amount: The downloaded bytes.
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.next_free = max(self.next_free, now) + amount / self.bytes_per_second
+            delay = self.next_free - now
+
+        time.sleep(delay)
+
+
+def get_temporal_path(path: Path) -> Path:
+    """Get where a file should be written before being moved to its path, unique for each thread.
+
+    Args:
+        path: The final path of the file.
+
+    Returns:
+        The temporal path.
+    """
+
+    return path.with_name(f"{path.name}.{threading.get_ident()}.part")
+
+
+class MediaPolicy(NamedTuple):
+    """The way the songs should be requested to the Subsonic server.
+
+    Attributes:
+        transcode: If the server should be asked to transcode the songs.
+        format: The format the songs should be transcoded to.
+        max_bitrate: The max bitrate in kbps the transcoded songs should have.
+    """
+
+    transcode: bool
+    format: str
+    max_bitrate: int
+
+    @classmethod
+    def from_config(cls, config: Config) -> "MediaPolicy":
+        """Create the policy defined by the user in the config file.
+
+        Args:
+            config: The config of the program.
+
+        Returns:
+            The media policy to be used.
+        """
+
+        return cls(transcode=config.media_transcode, format=config.media_format, max_bitrate=config.media_max_bitrate)
+
+
+class TranscodingUnavailable(Exception):
+    """Raised when the Subsonic server is not able to send a transcoded version of a song."""
+
+
+def get_songs_cache_path(cache_path: Path) -> Path:
+    """Get the folder where the songs are cached.
+
+    Args:
+        cache_path: The root cache path of the program.
+
+    Returns:
+        The path of the songs cache folder.
+    """
+
+    return cache_path / "subsonic/songs"
+
+
+def get_song_path(cache_path: Path, song_id: str, format: str, max_bitrate: int) -> Path:
+    """Get the path where a song is cached, keyed by its ID, format and bitrate.
+
+    Args:
+        cache_path: The root cache path of the program.
+        song_id: The ID of the song in the Subsonic server.
+        format: The format of the cached song.
+        max_bitrate: The max bitrate of the cached song.
+
+    Returns:
+        The path of the cached song, it may not exist.
+    """
+
+    return get_songs_cache_path(cache_path) / f"{song_id}-{format}-{max_bitrate}{SONG_SUFFIX}"
+
+
+def get_legacy_song_path(cache_path: Path, song_id: str) -> Path:
+    """Get the path where the versions without transcoding cached a song, always its original file.
+
+    Args:
+        cache_path: The root cache path of the program.
+        song_id: The ID of the song in the Subsonic server.
+
+    Returns:
+        The path of the cached song, it may not exist.
+    """
+
+    return get_songs_cache_path(cache_path) / f"{song_id}{LEGACY_SONG_SUFFIX}"
+
+
+def migrate_legacy_song(cache_path: Path, song_id: str) -> Path | None:
+    """Move a song cached by the versions without transcoding to the name of its original file.
+
+    Args:
+        cache_path: The root cache path of the program.
+        song_id: The ID of the song in the Subsonic server.
+
+    Returns:
+        The new path of the song or None if it was not cached by an older version.
+    """
+
+    legacy_path = get_legacy_song_path(cache_path, song_id)
+    if not legacy_path.is_file():
+        return None
+
+    original_path = get_song_path(cache_path, song_id, ORIGINAL_FORMAT, ORIGINAL_BITRATE)
+
+    try:
+        legacy_path.replace(original_path)
+    except OSError as e:
+        logger.warning(f"Unable to migrate the song '{song_id}' cached by an older version: {e}")
+        return None
+
+    return original_path
+
+
+class SongFetcher:
+    """Download the songs following the media policy and keep them in the cache."""
+
+    def __init__(self, subsonic: Subsonic, options: Options, policy: MediaPolicy) -> None:
+        """Create a new fetcher.
+
+        Args:
+            subsonic: The object to be used to access the OpenSubsonic REST API.
+            options: The options of the program.
+            policy: The way the songs should be requested.
+        """
+
+        self.subsonic = subsonic
+        self.options = options
+        self.policy = policy
+        self.index = get_cache_index(get_songs_cache_path(options.cache_path))
+        self.hot_cache = get_hot_cache(get_songs_cache_path(options.cache_path))
+
+        # Learned on the first transcoding attempt, None if it hasn't been tried yet
+        self.transcoding_supported: bool | None = None
+
+    def set_policy(self, policy: MediaPolicy) -> None:
+        """Change the way the next songs should be requested.
+
+        Args:
+            policy: The new policy.
+        """
+
+        if policy == self.policy:
+            return
+
+        self.policy = policy
+
+        # The server may support the new format
+        self.transcoding_supported = None
+
+    def cached_path(self, song_id: str) -> Path | None:
+        """Get the path of the song if it's already in the cache.
+
+        Args:
+            song_id: The ID of the song.
+
+        Returns:
+            The path of the cached song or None if it's a cache miss.
+        """
+
+        candidates = [get_song_path(self.options.cache_path, song_id, ORIGINAL_FORMAT, ORIGINAL_BITRATE)]
+        if self.policy.transcode and self.transcoding_supported is not False:
+            candidates.insert(
+                0, get_song_path(self.options.cache_path, song_id, self.policy.format, self.policy.max_bitrate)
+            )
+
+        for path in candidates:
+            if path.is_file():
+                return path
+
+        # Move the songs cached by older versions to their new name instead of downloading them again
+        original_path = migrate_legacy_song(self.options.cache_path, song_id)
+        if original_path is not None:
+            self.index.add(original_path)
+
+        return original_path
+
+    def fetch(self, song_id: str, limiter: BandwidthLimiter | None = None) -> Path:
+        """Get the path of a song, downloading it if it's not already cached.
+
+        This call is blocking and should not be done on the event loop.
+
+        Args:
+            song_id: The ID of the song.
+            limiter: The limiter of the download speed, None to download at full speed.
+
+        Returns:
+            The path of the song in the cache.
+        """
+
+        song_path = self.cached_path(song_id)
+        if song_path is not None:
+            logger.info("Cache hit")
+            self.index.touch(song_path)
+            return song_path
+
+        logger.info("Cache miss, downloading the song...")
+        get_songs_cache_path(self.options.cache_path).mkdir(parents=True, exist_ok=True)
+
+        if self.policy.transcode and self.transcoding_supported is not False:
+            song_path = get_song_path(self.options.cache_path, song_id, self.policy.format, self.policy.max_bitrate)
+
+            try:
+                self.download_transcoded(song_id, song_path, limiter)
+                self.transcoding_supported = True
+                self.index.add(song_path)
+                return song_path
+
+            except TranscodingUnavailable as e:
+                logger.warning(f"The server is not able to transcode the songs, using the original files: {e}")
+                self.transcoding_supported = False
+
+            except requests.exceptions.RequestException as e:
+                # Only a rejection of the request means the server can't transcode, not a network error
+                response = e.response
+                if response is not None and 400 <= response.status_code < 500:
+                    logger.warning(f"The server is not able to transcode the songs, using the original files: {e}")
+                    self.transcoding_supported = False
+                else:
+                    logger.warning(f"Unable to download the transcoded song, using the original file this time: {e}")
+
+        song_path = get_song_path(self.options.cache_path, song_id, ORIGINAL_FORMAT, ORIGINAL_BITRATE)
+        self.download_original(song_id, song_path, limiter)
+        self.index.add(song_path)
+
+        return song_path
+
+    def fetch_playable(self, song_id: str) -> str:
+        """Get the path FFmpeg should open to play a song, its copy in memory if it's played often enough.
+
+        This call is blocking and should not be done on the event loop.
+
+        Args:
+            song_id: The ID of the song.
+
+        Returns:
+            The path of the song in memory or in the disk cache.
+        """
+
+        song_path = self.fetch(song_id)
+        return self.hot_cache.access(song_path) or str(song_path.absolute())
+
+    def download_transcoded(self, song_id: str, song_path: Path, limiter: BandwidthLimiter | None = None) -> None:
+        """Download a song transcoded by the server with the `/stream` endpoint.
+
+        Args:
+            song_id: The ID of the song.
+            song_path: Where the song should be saved.
+            limiter: The limiter of the download speed, None to download at full speed.
+
+        Raises:
+            TranscodingUnavailable: The server answered without audio.
+        """
+
+        url = self.subsonic.media_retrieval.stream(
+            song_id, max_bitrate_rate=self.policy.max_bitrate, stream_format=self.policy.format
+        )
+
+        with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+
+            # Subsonic servers report errors with a successful status code and a JSON or XML body
+            content_type = response.headers.get("Content-Type", "")
+            if not content_type.startswith("audio/"):
+                raise TranscodingUnavailable(f"Unexpected content type '{content_type}'")
+
+            # Several threads may be downloading the same song
+            temporal_path = get_temporal_path(song_path)
+
+            # The interrupted download is removed, after a successful one it's already gone
+            try:
+                with open(temporal_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+
+                        if limiter is not None:
+                            limiter.consume(len(chunk))
+
+                temporal_path.replace(song_path)
+
+            finally:
+                temporal_path.unlink(missing_ok=True)
+
+    def download_original(self, song_id: str, song_path: Path, limiter: BandwidthLimiter | None = None) -> None:
+        """Download the original file of a song.
+
+        Args:
+            song_id: The ID of the song.
+            song_path: Where the song should be saved.
+            limiter: The limiter of the download speed, None to download at full speed.
+        """
+
+        temporal_path = get_temporal_path(song_path)
+
+        # The interrupted download is removed, after a successful one it's already gone
+        try:
+            try:
+                self.subsonic.media_retrieval.download(song_id, temporal_path)
+
+            # Fix to make Disopy work with Funkwhale servers
+            except requests.exceptions.HTTPError:
+                logger.warning(
+                    "Using the /download endpoint for downloading the media failed, using /stream as a fallback"
+                )
+                self.subsonic.media_retrieval.download(song_id, temporal_path, use_stream=True)
+
+            # knuckles downloads the whole file at once, so the limit is only kept on average
+            if limiter is not None:
+                limiter.consume(temporal_path.stat().st_size)
+
+            temporal_path.replace(song_path)
+
+        finally:
+            temporal_path.unlink(missing_ok=True)
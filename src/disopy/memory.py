@@ -0,0 +1,271 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Diagnose the memory usage of long running deployments."""
+
+import asyncio
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+from asyncio import AbstractEventLoop
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from tracemalloc import Snapshot, Statistic, StatisticDiff
+from typing import Final, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Frames of the stack stored for every traced allocation, only the innermost one is used in the reports
+TRACE_FRAMES: Final[int] = 1
+
+# Max number of allocation sites listed in every report written to the cache
+REPORT_LIMIT: Final[int] = 25
+
+# Max number of reports kept in the cache, the oldest ones are deleted
+MAX_REPORTS: Final[int] = 48
+
+# The allocations of the tracing itself and of the import machinery are not interesting
+TRACE_FILTERS: Final[tuple[tracemalloc.Filter, ...]] = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+# The types whose size is counted without following their references
+SCALAR_TYPES: Final[tuple[type, ...]] = (str, bytes, bytearray, int, float, complex, bool, type(None))
+
+# The builtin containers followed when estimating the size of an object
+CONTAINER_TYPES: Final[tuple[type, ...]] = (list, tuple, dict, set, frozenset, deque)
+
+
+def get_memory_path(cache_path: Path) -> Path:
+    """Get the folder where the memory reports are written.
+
+    Args:
+        cache_path: The root cache path of the program.
+
+    Returns:
+        The path of the folder.
+    """
+
+    return cache_path / "memory"
+
+
+def get_rss() -> int | None:
+    """Get the resident memory of the process.
+
+    Returns:
+        The resident memory in bytes or None if it's not available in the platform.
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def is_own_object(obj: object) -> bool:
+    """Check if an object is an instance of a class of the program.
+
+    Args:
+        obj: The object to check.
+
+    Returns:
+        If the class of the object was defined in the program.
+    """
+
+    return type(obj).__module__.split(".")[0] == __name__.split(".")[0]
+
+
+def get_deep_size(obj: object, shared: Iterable[object] = ()) -> int:
+    """Estimate the bytes used by an object and the objects it owns.
+
+    Only the objects of the program and the builtin containers are followed, the objects of other libraries and the
+    ones in `shared` are considered owned by someone else and not counted.
+
+    Args:
+        obj: The object to measure.
+        shared: Objects referenced by the measured one but not owned by it.
+
+    Returns:
+        The estimated size in bytes.
+    """
+
+    seen = {id(shared_obj) for shared_obj in shared}
+    pending = [obj]
+    size = 0
+
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+
+        seen.add(id(current))
+
+        if isinstance(current, SCALAR_TYPES):
+            size += sys.getsizeof(current)
+
+        elif isinstance(current, CONTAINER_TYPES) or is_own_object(current):
+            size += sys.getsizeof(current)
+            pending.extend(gc.get_referents(current))
+
+    return size
+
+
+def format_statistic(statistic: Statistic | StatisticDiff) -> str:
+    """Get a line describing the memory allocated in a line of code.
+
+    Args:
+        statistic: The statistic of the line, with the difference to a previous snapshot if available.
+
+    Returns:
+        The description of the statistic.
+    """
+
+    frame = statistic.traceback[0]
+
+    # The full path of the installed packages makes the lines too long
+    file_name = "/".join(Path(frame.filename).parts[-2:])
+
+    description = f"{file_name}:{frame.lineno}: {statistic.size / 1024:.1f} KiB in {statistic.count} blocks"
+    if isinstance(statistic, StatisticDiff):
+        description += f" ({statistic.size_diff / 1024:+.1f} KiB, {statistic.count_diff:+} blocks)"
+
+    return description
+
+
+class MemoryProfiler:
+    """Trace the memory allocations and write periodically to the cache what has grown since the last snapshot.
+
+    Every report lists the lines that have allocated more memory since the previous snapshot and since the tracing
+    started, so a slow leak shows up as a line that keeps growing in consecutive reports.
+    """
+
+    def __init__(self, cache_path: Path, interval: float) -> None:
+        """Create a new profiler, `start` should be called from the event loop.
+
+        Args:
+            cache_path: The root cache path of the program.
+            interval: The seconds between the reports.
+        """
+
+        self.path = get_memory_path(cache_path)
+        self.interval = interval
+
+        self.baseline: Snapshot | None = None
+        self.previous: Snapshot | None = None
+
+        self.task: asyncio.Task[None] | None = None
+
+    def start(self, loop: AbstractEventLoop) -> None:
+        """Start tracing the allocations and writing the reports.
+
+        Args:
+            loop: The event loop where the reports are scheduled.
+        """
+
+        tracemalloc.start(TRACE_FRAMES)
+        self.task = loop.create_task(self.run())
+
+        logger.info(f"Tracing the memory allocations, writing a report every {self.interval / 60:.0f} minutes")
+
+    def take_snapshot(self) -> Snapshot:
+        """Take a snapshot of the traced allocations.
+
+        This call is blocking and should not be done on the event loop.
+
+        Returns:
+            The snapshot.
+        """
+
+        return tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+
+    async def run(self) -> None:
+        """Write a report every interval."""
+
+        self.baseline = await asyncio.to_thread(self.take_snapshot)
+        self.previous = self.baseline
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await asyncio.to_thread(self.write_report)
+            except OSError as e:
+                logger.error(f"Unable to write the memory report: {e}")
+
+    def write_report(self) -> None:
+        """Take a snapshot and write its differences with the previous one and the first one to the cache.
+
+        This call is blocking and should not be done on the event loop.
+        """
+
+        assert self.baseline is not None and self.previous is not None
+
+        traced, peak = tracemalloc.get_traced_memory()
+
+        snapshot = self.take_snapshot()
+        previous = self.previous
+        self.previous = snapshot
+
+        rss = get_rss()
+
+        since_previous = snapshot.compare_to(previous, "lineno")
+        since_start = snapshot.compare_to(self.baseline, "lineno")
+
+        lines = [
+            f"Report taken at {datetime.now().isoformat(" ", "seconds")}",
+            f"Traced memory: {traced / 1024**2:.1f} MiB (peak {peak / 1024**2:.1f} MiB)",
+        ]
+
+        if rss is not None:
+            lines.append(f"Resident memory: {rss / 1024**2:.1f} MiB")
+
+        lines.extend(["", "Growth since the previous report:"])
+        lines.extend(format_statistic(statistic) for statistic in since_previous[:REPORT_LIMIT])
+
+        lines.extend(["", "Growth since the tracing started:"])
+        lines.extend(format_statistic(statistic) for statistic in since_start[:REPORT_LIMIT])
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / f"{datetime.now():%Y%m%d-%H%M%S}.txt").write_text("\n".join(lines) + "\n")
+
+        # The names sort in chronological order
+        for old_report in sorted(self.path.glob("*.txt"))[:-MAX_REPORTS]:
+            old_report.unlink(missing_ok=True)
+
+        growth = sum(statistic.size_diff for statistic in since_previous)
+        logger.info(f"Memory report written, {traced / 1024**2:.1f} MiB traced ({growth / 1024:+.1f} KiB)")
+
+    def top_allocators(self, limit: int) -> list[str]:
+        """Get the lines of code that have grown the most since the tracing started.
+
+        This call is blocking and should not be done on the event loop.
+
+        Args:
+            limit: The max number of lines.
+
+        Returns:
+            The description of every line of code.
+        """
+
+        snapshot = self.take_snapshot()
+
+        if self.baseline is None:
+            return [format_statistic(statistic) for statistic in snapshot.statistics("lineno")[:limit]]
+
+        return [format_statistic(statistic) for statistic in snapshot.compare_to(self.baseline, "lineno")[:limit]]
+
+    def stop(self) -> None:
+        """Stop writing the reports and tracing the allocations."""
+
+        if self.task is not None:
+            self.task.cancel()
+
+        tracemalloc.stop()
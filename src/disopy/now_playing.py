@@ -0,0 +1,186 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Keep a single message per guild with the state of the playback, edited in place."""
+
+import asyncio
+import logging
+import time
+from asyncio import AbstractEventLoop
+from pathlib import Path
+from typing import Callable, Final, NamedTuple
+
+import discord
+from discord.abc import Messageable
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait after a change for more changes to be merged in the same edit
+EDIT_DEBOUNCE: Final[float] = 0.5
+
+# Min seconds between two edits of the same message, Discord allows around five edits every five seconds per channel
+MIN_EDIT_INTERVAL: Final[float] = 2.0
+
+# Seconds between the edits that only update the progress of the playing song
+PROGRESS_REFRESH_INTERVAL: Final[float] = 15.0
+
+# Number of characters of the progress bar
+PROGRESS_BAR_LENGTH: Final[int] = 16
+
+
+class NowPlayingView(NamedTuple):
+    """What the now playing message should show.
+
+    Attributes:
+        embed: The embed of the message.
+        thumbnail: An image in the disk to be attached as the thumbnail of the embed.
+        playing: If there is a song loaded, when false a new message is never sent only the old one is edited.
+        live: If the progress of the song is advancing and the message should be refreshed periodically.
+    """
+
+    embed: discord.Embed
+    thumbnail: Path | None = None
+    playing: bool = False
+    live: bool = False
+
+
+def format_duration(seconds: int) -> str:
+    """Format a duration as minutes and seconds.
+
+    Args:
+        seconds: The duration in seconds.
+
+    Returns:
+        The formatted duration.
+    """
+
+    minutes, seconds = divmod(max(seconds, 0), 60)
+    return f"{minutes}:{seconds:02}"
+
+
+def format_progress(elapsed: int, duration: int | None) -> str:
+    """Format the progress of a song as a bar with the elapsed and total time.
+
+    Args:
+        elapsed: The seconds already played.
+        duration: The duration of the song in seconds if known.
+
+    Returns:
+        The formatted progress.
+    """
+
+    if duration is None or duration <= 0:
+        return f"`{format_duration(elapsed)}`"
+
+    position = min(elapsed * PROGRESS_BAR_LENGTH // duration, PROGRESS_BAR_LENGTH - 1)
+    bar = "▬" * position + "🔘" + "▬" * (PROGRESS_BAR_LENGTH - position - 1)
+
+    return f"{bar} `{format_duration(elapsed)} / {format_duration(duration)}`"
+
+
+class NowPlayingMessage:
+    """A message edited in place every time the playback changes.
+
+    Changes only request an update, a task of the event loop merges all the requests that arrive in a short window
+    and never edits the message faster than the rate limit of the channel, so a burst of changes costs a single edit.
+    """
+
+    def __init__(self, channel: Messageable, render: Callable[[], NowPlayingView], loop: AbstractEventLoop) -> None:
+        """Create a new message, it's only sent once there is something playing.
+
+        Args:
+            channel: The channel where the message will be sent.
+            render: Get the current state of the playback to be shown.
+            loop: The event loop where the edits are done.
+        """
+
+        self.channel = channel
+        self.render = render
+        self.loop = loop
+
+        self.message: discord.Message | None = None
+        self.thumbnail: Path | None = None
+
+        self.last_edit = -MIN_EDIT_INTERVAL
+
+        self.requested = asyncio.Event()
+        self.task = loop.create_task(self.run())
+
+    def request_update(self) -> None:
+        """Ask for the message to be updated with the current state, it never blocks."""
+
+        self.requested.set()
+
+    async def run(self) -> None:
+        """Update the message when requested and periodically while the song advances."""
+
+        live = False
+
+        while True:
+            try:
+                await asyncio.wait_for(self.requested.wait(), PROGRESS_REFRESH_INTERVAL if live else None)
+            except TimeoutError:
+                pass
+
+            # Merge the changes of the window and respect the rate limit
+            await asyncio.sleep(max(EDIT_DEBOUNCE, self.last_edit + MIN_EDIT_INTERVAL - time.monotonic()))
+            self.requested.clear()
+
+            try:
+                view = self.render()
+                live = view.live
+
+                await self.publish(view)
+            except Exception:
+                logger.exception("Failed to update the now playing message")
+
+    async def publish(self, view: NowPlayingView) -> None:
+        """Edit the message with a view or send it again if it doesn't exist.
+
+        Args:
+            view: The view to show.
+        """
+
+        if self.message is None and not view.playing:
+            return
+
+        if view.thumbnail is not None:
+            view.embed.set_thumbnail(url=f"attachment://{view.thumbnail.name}")
+
+        def get_files() -> list[discord.File]:
+            return [discord.File(view.thumbnail)] if view.thumbnail is not None else []
+
+        try:
+            if self.message is not None:
+                try:
+                    # Only upload the thumbnail again when it changes
+                    if view.thumbnail != self.thumbnail:
+                        self.message = await self.message.edit(embed=view.embed, attachments=get_files())
+                    else:
+                        self.message = await self.message.edit(embed=view.embed)
+
+                    self.thumbnail = view.thumbnail
+                    return
+
+                except discord.NotFound:
+                    # Someone deleted the message
+                    self.message = None
+
+            if view.playing:
+                self.message = await self.channel.send(embed=view.embed, files=get_files())
+                self.thumbnail = view.thumbnail
+
+        except discord.HTTPException as e:
+            logger.warning(f"Unable to update the now playing message: {e}")
+
+        finally:
+            self.last_edit = time.monotonic()
+
+    def close(self) -> None:
+        """Stop updating the message, showing the current state one last time."""
+
+        self.task.cancel()
+
+        if self.message is not None:
+            self.task = self.loop.create_task(self.publish(self.render()))
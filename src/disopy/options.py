@@ -6,10 +6,72 @@
 
 import argparse
 from pathlib import Path
-from typing import NamedTuple
+from typing import Final, NamedTuple
 
 from . import APP_NAME, APP_NAME_LOWER, DEFAULT_CACHE_PATH, DEFAULT_CONFIG_PATH, __version__
 
+# The kinds of elements whose songs can be downloaded to the cache
+WARMUP_KINDS: Final[tuple[str, ...]] = ("song", "album", "artist", "playlist")
+
+# The actions of the `cache` subcommand
+CACHE_ACTIONS: Final[tuple[str, ...]] = ("stats", "verify", "prune", "gc")
+
+# The audio source stacks measured by the `bench` subcommand
+BENCH_ENGINES: Final[tuple[str, ...]] = ("player", "pcm", "opus")
+
+# The formats of the synthetic songs played by the `bench` subcommand
+BENCH_FORMATS: Final[tuple[str, ...]] = ("wav", "flac", "mp3", "opus")
+
+
+class CacheCommand(NamedTuple):
+    """The cache maintenance requested with the `cache` subcommand.
+
+    Attributes:
+        action: One of `CACHE_ACTIONS`.
+        max_age: Remove the songs not played in this amount of days when pruning.
+        max_size: Remove the least recently played songs until the cache is under this size in MiB when pruning.
+        workers: How many songs should be checked at the same time when verifying.
+        delete: If the broken songs found when verifying should be deleted.
+    """
+
+    action: str
+    max_age: int | None
+    max_size: int | None
+    workers: int
+    delete: bool
+
+
+class ReplayCommand(NamedTuple):
+    """The load test requested with the `replay` subcommand.
+
+    Attributes:
+        trace: The path of the trace recorded with `--record-traces`.
+        speed: How many times faster than recorded the interactions should be replayed.
+        songs: How many songs the library of the stand-in Subsonic server should have.
+        server_latency: The milliseconds the stand-in Subsonic server should wait before every answer.
+    """
+
+    trace: Path
+    speed: float
+    songs: int
+    server_latency: int
+
+
+class BenchCommand(NamedTuple):
+    """The audio benchmark requested with the `bench` subcommand.
+
+    Attributes:
+        streams: The max number of streams played at the same time, doubled from one up to it.
+        seconds: The seconds of audio played by every stream.
+        engines: The audio source stacks to measure, from `BENCH_ENGINES`.
+        formats: The formats of the synthetic songs, from `BENCH_FORMATS`.
+    """
+
+    streams: int
+    seconds: int
+    engines: tuple[str, ...]
+    formats: tuple[str, ...]
+
 
 class Options(NamedTuple):
     """Holds all the global options for the program.
@@ -17,7 +79,17 @@ class Options(NamedTuple):
     Attributes:
         debug: The level of verbosity of the output.
         color: If the output logs should be colored.
+        log_json: If the output logs should be written as JSON lines.
+        trace_memory: The minutes between the memory snapshots written to the cache, zero to not trace the memory.
+        record_traces: The file where the handled interactions should be recorded, None to not record them.
         generate_config: If the config should be generated.
+        warm_cache: The kind and name of the element whose songs should be downloaded to the cache instead of
+            starting the bot, None to start it.
+        warm_workers: How many songs should be downloaded at the same time when warming the cache.
+        warm_bandwidth: The max download speed in KiB/s when warming the cache, zero for no limit.
+        cache_command: The cache maintenance to be done instead of starting the bot, None to start it.
+        replay: The load test to be done instead of starting the bot, None to start it.
+        bench: The audio benchmark to be done instead of starting the bot, None to start it.
 
         config_path: The path for config to be saved.
         cache_path: The path to be used as cache.
@@ -25,7 +97,16 @@ class Options(NamedTuple):
 
     debug: int
     color: bool
+    log_json: bool
+    trace_memory: int
+    record_traces: Path | None
     generate_config: bool
+    warm_cache: tuple[str, str] | None
+    warm_workers: int
+    warm_bandwidth: int
+    cache_command: CacheCommand | None
+    replay: ReplayCommand | None
+    bench: BenchCommand | None
 
     config_path: Path
     cache_path: Path
@@ -57,13 +138,137 @@ def get_options(force_no_color: bool = False) -> Options:
         help="add extra debug info, can be used multiple times for more verbosity",
     )
     parser.add_argument("--no-color", action="store_true", help="disable color escape sequences from the logs")
+    parser.add_argument("--log-json", action="store_true", help="write the logs as JSON lines")
+    parser.add_argument(
+        "--trace-memory",
+        type=int,
+        default=0,
+        metavar="MINUTES",
+        help="trace the memory allocations, writing a snapshot diff to the cache every MINUTES",
+    )
+    parser.add_argument(
+        "--record-traces",
+        metavar="FILE",
+        help="append the handled interactions to FILE, anonymized, to be replayed later with the replay command",
+    )
     parser.add_argument("--generate-config", action="store_true", help="regenerate the config file to the default one")
+    parser.add_argument(
+        "--warm-cache",
+        nargs=2,
+        metavar=("{" + ",".join(WARMUP_KINDS) + "}", "NAME"),
+        help="download all the songs of a song, album, artist or playlist to the cache and exit",
+    )
+    parser.add_argument(
+        "--warm-workers", type=int, default=4, help="how many songs to download at the same time when warming the cache"
+    )
+    parser.add_argument(
+        "--warm-bandwidth", type=int, default=0, help="max download speed in KiB/s when warming the cache, 0 for none"
+    )
 
     parser.add_argument("-c", "--config-path", help="a custom config directory path")
     parser.add_argument("--cache-path", help="a custom cache directory path")
 
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    cache_parser = subparsers.add_parser("cache", help="inspect and maintain the song cache and exit")
+    cache_parser.add_argument(
+        "action",
+        choices=CACHE_ACTIONS,
+        help="show the cache stats, verify the songs against the server, prune old songs or collect the garbage",
+    )
+    cache_parser.add_argument("--max-age", type=int, help="prune the songs not played in this amount of days")
+    cache_parser.add_argument(
+        "--max-size", type=int, help="prune the least recently played songs until the cache is under this size in MiB"
+    )
+    cache_parser.add_argument("--workers", type=int, default=8, help="how many songs to verify at the same time")
+    cache_parser.add_argument("--delete", action="store_true", help="delete the broken songs found when verifying")
+
+    replay_parser = subparsers.add_parser(
+        "replay", help="replay a recorded trace against a local stand-in Subsonic server and report the latencies"
+    )
+    replay_parser.add_argument("trace", help="the trace file recorded with --record-traces")
+    replay_parser.add_argument(
+        "--speed", type=float, default=1.0, help="how many times faster than recorded to replay, from 1 to 100"
+    )
+    replay_parser.add_argument(
+        "--songs", type=int, default=10000, help="how many songs the library of the stand-in server has"
+    )
+    replay_parser.add_argument(
+        "--server-latency", type=int, default=0, help="milliseconds the stand-in server waits before every answer"
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="measure the CPU used by every audio stream playing synthetic songs and exit"
+    )
+    bench_parser.add_argument(
+        "--streams", type=int, default=8, help="max streams played at the same time, doubled from 1 up to it"
+    )
+    bench_parser.add_argument("--seconds", type=int, default=10, help="seconds of audio played by every stream")
+    bench_parser.add_argument(
+        "--engine",
+        action="append",
+        choices=BENCH_ENGINES,
+        help="audio source stack to measure, can be used multiple times, all of them by default",
+    )
+    bench_parser.add_argument(
+        "--format",
+        action="append",
+        choices=BENCH_FORMATS,
+        help="format of the synthetic songs, can be used multiple times, all of them by default",
+    )
+
     args = parser.parse_args()
 
+    cache_command = None
+    if args.command == "cache":
+        if args.action == "prune" and args.max_age is None and args.max_size is None:
+            cache_parser.error("pruning needs at least one of --max-age or --max-size")
+
+        if args.workers < 1:
+            cache_parser.error("the number of workers must be at least 1")
+
+        cache_command = CacheCommand(args.action, args.max_age, args.max_size, args.workers, args.delete)
+
+    replay = None
+    if args.command == "replay":
+        if not 1 <= args.speed <= 100:
+            replay_parser.error("the replay speed must be between 1 and 100")
+
+        if args.songs < 1:
+            replay_parser.error("the library must have at least 1 song")
+
+        if args.server_latency < 0:
+            replay_parser.error("the server latency can't be negative")
+
+        replay = ReplayCommand(Path(args.trace), args.speed, args.songs, args.server_latency)
+
+    bench = None
+    if args.command == "bench":
+        if args.streams < 1:
+            bench_parser.error("the number of streams must be at least 1")
+
+        if args.seconds < 1:
+            bench_parser.error("the streams must play at least 1 second")
+
+        bench = BenchCommand(
+            args.streams,
+            args.seconds,
+            tuple(dict.fromkeys(args.engine or BENCH_ENGINES)),
+            tuple(dict.fromkeys(args.format or BENCH_FORMATS)),
+        )
+
+    if args.warm_cache is not None and args.warm_cache[0] not in WARMUP_KINDS:
+        parser.error(f"the kind of element to warm must be one of: {", ".join(WARMUP_KINDS)}")
+
+    if args.trace_memory < 0:
+        parser.error("the minutes between memory snapshots can't be negative")
+
+    if args.warm_workers < 1:
+        parser.error("the number of warm-up workers must be at least 1")
+
+    if args.warm_bandwidth < 0:
+        parser.error("the warm-up bandwidth can't be negative")
+
     config_path = DEFAULT_CONFIG_PATH if args.config_path is None else Path(args.config_path)
     cache_path = DEFAULT_CACHE_PATH if args.cache_path is None else Path(args.cache_path)
 
@@ -72,7 +277,16 @@ def get_options(force_no_color: bool = False) -> Options:
     return Options(
         debug=args.debug,
         color=not no_color,
+        log_json=args.log_json,
+        trace_memory=args.trace_memory,
+        record_traces=Path(args.record_traces) if args.record_traces is not None else None,
         generate_config=args.generate_config,
+        warm_cache=tuple(args.warm_cache) if args.warm_cache is not None else None,
+        warm_workers=args.warm_workers,
+        warm_bandwidth=args.warm_bandwidth,
+        cache_command=cache_command,
+        replay=replay,
+        bench=bench,
         config_path=config_path,
         cache_path=cache_path,
     )
@@ -0,0 +1,346 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Radio stations that decode and encode a playlist once and broadcast it to the voice clients of many guilds."""
+
+import asyncio
+import logging
+import threading
+import time
+from asyncio import AbstractEventLoop
+from typing import Any, Callable, Final, Generic, TypeVar
+
+from discord import AudioSource, PCMVolumeTransformer
+from discord.opus import OPUS_SILENCE, Encoder
+
+from .audio import BufferedSource, PlaybackEngine, Track, pad_frame
+
+logger = logging.getLogger(__name__)
+
+# How many encoded packets are kept for the listeners, the ones further behind jump to the live audio
+BROADCAST_BACKLOG: Final[int] = 50
+
+# Seconds to wait before trying again when none of the songs of a station can be opened
+RETRY_DELAY: Final[float] = 10.0
+
+# Seconds of delay after which the broadcast stops trying to catch up and starts again from the current time
+MAX_DRIFT: Final[float] = 1.0
+
+T = TypeVar("T")
+
+
+class Broadcast:
+    """Ring of the last Opus packets of a station, shared by all its listeners without copying them."""
+
+    def __init__(self, capacity: int) -> None:
+        """Create a new empty broadcast.
+
+        Args:
+            capacity: How many packets are kept for the listeners.
+        """
+
+        self.capacity = capacity
+        self.packets = [b""] * capacity
+
+        # The sequence number of the next packet to be published
+        self.sequence = 0
+        self.ended = False
+
+        self.condition = threading.Condition()
+
+    def publish(self, packet: bytes) -> None:
+        """Add a packet to the broadcast, overwriting the oldest one.
+
+        Args:
+            packet: The Opus packet.
+        """
+
+        with self.condition:
+            self.packets[self.sequence % self.capacity] = packet
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def end(self) -> None:
+        """Mark the broadcast as ended, the listeners stop their playback."""
+
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+
+    def read(self, position: int) -> tuple[bytes, int]:
+        """Read the packet of a listener, waiting up to 20ms for it to be published.
+
+        Args:
+            position: The sequence number of the packet the listener wants to read.
+
+        Returns:
+            The packet, silence if it has not been published in time or empty if the broadcast has ended, and the
+            sequence number of the next packet the listener should read.
+        """
+
+        with self.condition:
+            if position >= self.sequence and not self.ended:
+                self.condition.wait(Encoder.FRAME_LENGTH / 1000)
+
+            if self.ended:
+                return b"", position
+
+            if position >= self.sequence:
+                return OPUS_SILENCE, position
+
+            # The packet has already been overwritten, the listener was paused or could not keep up
+            if self.sequence - position > self.capacity:
+                position = self.sequence - 1
+
+            return self.packets[position % self.capacity], position + 1
+
+
+class StationListener(AudioSource):
+    """Audio source of a voice client tuned to a station, it reads the already encoded packets of the broadcast."""
+
+    def __init__(self, station: "Station[Any]") -> None:
+        """Create a new listener, it starts at the live audio of the station.
+
+        Args:
+            station: The station to listen to.
+        """
+
+        self.station = station
+        self.position = station.broadcast.sequence
+
+    def is_opus(self) -> bool:
+        """The packets are sent as they are, so the voice client doesn't encode them again.
+
+        Returns:
+            Always true.
+        """
+
+        return True
+
+    def read(self) -> bytes:
+        """Read the next 20ms Opus packet of the station.
+
+        Returns:
+            The packet, empty if the station has stopped.
+        """
+
+        packet, self.position = self.station.broadcast.read(self.position)
+        return packet
+
+    def cleanup(self) -> None:
+        """Stop listening to the station."""
+
+        self.station.unsubscribe(self)
+
+
+class Station(Generic[T]):
+    """A playlist played in a loop by a single decode and encode pipeline, shared by all its listeners.
+
+    The songs are opened from the event loop one ahead of the playback like in a guild player, and a dedicated thread
+    reads the mixed PCM audio in real time, encodes it once and publishes it to the broadcast.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        items: list[T],
+        open_track: Callable[[T], Track[T]],
+        volume: float,
+        bitrate: int,
+        crossfade: float,
+        buffer_frames: int,
+    ) -> None:
+        """Create a new station, `start` should be called from the event loop.
+
+        Args:
+            name: The name of the station.
+            items: The songs to be played in a loop.
+            open_track: Download, open and pre-buffer a song, it's called from a worker thread.
+            volume: The volume of the station where 1 is the original one.
+            bitrate: The bitrate in kbps of the broadcast.
+            crossfade: The seconds the end and start of two songs should overlap, zero for a gapless transition.
+            buffer_frames: How many 20ms frames of audio should be read ahead, zero to disable the buffer.
+        """
+
+        self.name = name
+        self.items = items
+        self.open_track = open_track
+        self.volume = volume
+        self.bitrate = bitrate
+        self.crossfade = crossfade
+        self.buffer_frames = buffer_frames
+
+        self.broadcast = Broadcast(BROADCAST_BACKLOG)
+        self.engine: PlaybackEngine[T] | None = None
+
+        # The position in the items of the next song to be opened
+        self.position = 0
+
+        self.listeners: set[StationListener] = set()
+        self.listeners_lock = threading.Lock()
+
+        self.stopping = threading.Event()
+        self.advanced = asyncio.Event()
+
+        self.task: asyncio.Task[None] | None = None
+        self.thread: threading.Thread | None = None
+
+    def now_playing(self) -> T | None:
+        """Get the song being broadcast.
+
+        Returns:
+            The song or None if the station has not started yet.
+        """
+
+        engine = self.engine
+        return engine.current.item if engine is not None else None
+
+    def listener_count(self) -> int:
+        """Get how many voice clients are tuned to the station.
+
+        Returns:
+            The number of listeners.
+        """
+
+        with self.listeners_lock:
+            return len(self.listeners)
+
+    def subscribe(self) -> StationListener:
+        """Create a new listener of the station, to be played by a voice client.
+
+        Returns:
+            The audio source of the listener.
+        """
+
+        listener = StationListener(self)
+
+        with self.listeners_lock:
+            self.listeners.add(listener)
+
+        return listener
+
+    def unsubscribe(self, listener: StationListener) -> None:
+        """Remove a listener of the station, it can be called from any thread.
+
+        Args:
+            listener: The listener to remove.
+        """
+
+        with self.listeners_lock:
+            self.listeners.discard(listener)
+
+    def start(self, loop: AbstractEventLoop) -> None:
+        """Start opening the songs and broadcasting them.
+
+        Args:
+            loop: The event loop where the songs are opened.
+        """
+
+        self.task = loop.create_task(self.run(loop))
+
+    async def open_next(self) -> Track[T] | None:
+        """Open the next song of the playlist that is available, trying each one at most once.
+
+        Returns:
+            The opened track or None if none of the songs could be opened.
+        """
+
+        for _ in range(len(self.items)):
+            item = self.items[self.position]
+            self.position = (self.position + 1) % len(self.items)
+
+            # The errors of knuckles don't share a common base class
+            try:
+                return await asyncio.to_thread(self.open_track, item)
+            except Exception as e:
+                logger.warning(f"Unable to open a song of the station '{self.name}': {e}")
+
+        return None
+
+    async def run(self, loop: AbstractEventLoop) -> None:
+        """Keep the next song of the station opened, starting the broadcast with the first one.
+
+        Args:
+            loop: The event loop where the task runs.
+        """
+
+        def notify_advance(_: Track[T]) -> None:
+            loop.call_soon_threadsafe(self.advanced.set)
+
+        while not self.stopping.is_set():
+            track = await self.open_next()
+            if track is None:
+                logger.error(f"None of the songs of the station '{self.name}' could be opened")
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+
+            if self.stopping.is_set():
+                track.cleanup()
+                return
+
+            if self.engine is None:
+                self.engine = PlaybackEngine(track, self.crossfade, on_advance=notify_advance)
+
+                self.thread = threading.Thread(target=self.broadcast_audio, daemon=True, name=f"radio:{self.name}")
+                self.thread.start()
+
+                logger.info(f"Radio station '{self.name}' started")
+                continue
+
+            self.engine.set_next(track)
+
+            await self.advanced.wait()
+            self.advanced.clear()
+
+    def broadcast_audio(self) -> None:
+        """Read, encode and publish the audio of the station in real time until it's stopped."""
+
+        assert self.engine is not None
+
+        source: AudioSource = PCMVolumeTransformer(self.engine, volume=self.volume)
+        if self.buffer_frames > 0:
+            # The engine has nothing to play between songs, the buffer waits for the next one instead of ending
+            source = BufferedSource(source, self.buffer_frames, keep_alive=True)
+
+        frame_length = Encoder.FRAME_LENGTH / 1000
+        start = time.perf_counter()
+        frames = 0
+
+        try:
+            encoder = Encoder(bitrate=self.bitrate)
+
+            while not self.stopping.is_set():
+                # Between songs the engine has nothing to play, keep the listeners in sync with silence
+                frame = source.read()
+                packet = encoder.encode(pad_frame(frame), Encoder.SAMPLES_PER_FRAME) if frame else OPUS_SILENCE
+
+                self.broadcast.publish(packet)
+                frames += 1
+
+                delay = start + frames * frame_length - time.perf_counter()
+                if delay > 0:
+                    self.stopping.wait(delay)
+
+                elif delay < -MAX_DRIFT:
+                    logger.warning(f"The radio station '{self.name}' is {-delay:.1f}s behind, skipping ahead")
+                    start = time.perf_counter()
+                    frames = 0
+
+        except Exception:
+            logger.exception(f"The broadcast of the radio station '{self.name}' failed")
+
+        finally:
+            self.broadcast.end()
+            source.cleanup()
+
+    def stop(self) -> None:
+        """Stop the station and end the playback of all its listeners, it should be called from the event loop."""
+
+        self.stopping.set()
+        self.broadcast.end()
+
+        # Wake the task so it ends by itself, the track being opened is cleaned up when it's ready
+        self.advanced.set()
+
+        logger.info(f"Radio station '{self.name}' stopped")
@@ -0,0 +1,198 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Rank the search results of the server by how close they are to the query, tolerating typos."""
+
+import re
+import string
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Final, Iterable, Sequence, TypeVar
+
+from knuckles import Album, Playlist, Song
+
+# Every punctuation character is replaced by a space, so "AC/DC" and "ac dc" are the same
+PUNCTUATION_PATTERN: Final[re.Pattern[str]] = re.compile(f"[{re.escape(string.punctuation)}]")
+
+# How many normalized texts of the results are kept, the same songs are found again and again
+TEXT_CACHE_SIZE: Final[int] = 4096
+
+# The weight of every field when ranking, a match in the title counts more than one in the artist or the album
+TITLE_WEIGHT: Final[float] = 1.0
+ARTIST_WEIGHT: Final[float] = 0.6
+ALBUM_WEIGHT: Final[float] = 0.4
+
+# Score added to the candidates whose field is exactly the query once normalized
+EXACT_MATCH_BONUS: Final[float] = 0.5
+
+T = TypeVar("T")
+
+
+def normalize(text: str) -> str:
+    """Remove the differences between two texts that a user doesn't care about when searching.
+
+    The diacritics are removed, the case folded, the punctuation replaced by spaces and the spaces collapsed.
+
+    Args:
+        text: The text to normalize.
+
+    Returns:
+        The normalized text.
+    """
+
+    # Most of the titles are plain ASCII and have nothing to decompose
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in decomposed if not unicodedata.combining(char))
+
+    return " ".join(PUNCTUATION_PATTERN.sub(" ", text.casefold()).split())
+
+
+def get_trigrams(text: str) -> frozenset[str]:
+    """Split a normalized text in its overlapping groups of three characters.
+
+    The text is padded so the start and end of every word also count, and a text of one or two characters still has
+    trigrams.
+
+    Args:
+        text: The normalized text.
+
+    Returns:
+        The trigrams of the text.
+    """
+
+    padded = f"  {text} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def prepare_text(text: str) -> tuple[str, frozenset[str]]:
+    """Normalize a text of a result and split it in trigrams.
+
+    Args:
+        text: The text of the result.
+
+    Returns:
+        The normalized text and its trigrams.
+    """
+
+    normalized = normalize(text)
+    return normalized, get_trigrams(normalized)
+
+
+def get_similarity(query: frozenset[str], trigrams: frozenset[str]) -> float:
+    """Compare the trigrams of a query with a text.
+
+    The score is the mean of the Dice coefficient, that penalizes the texts much longer than the query, and the
+    proportion of the query found in the text, that keeps a long title with the whole query over a short wrong one.
+
+    Args:
+        query: The trigrams of the normalized query.
+        trigrams: The trigrams of the normalized text.
+
+    Returns:
+        The similarity from zero to one.
+    """
+
+    shared = len(query & trigrams)
+
+    dice = 2 * shared / (len(query) + len(trigrams))
+    coverage = shared / len(query)
+
+    return (dice + coverage) / 2
+
+
+def rank(query: str, candidates: Sequence[T], get_fields: Callable[[T], Iterable[tuple[str | None, float]]]) -> list[T]:
+    """Sort the candidates from the closest to the query to the furthest.
+
+    Every candidate is scored by its best field, with the similarity of the field multiplied by its weight. The
+    candidates with the same score keep the order of the server.
+
+    Args:
+        query: What the user searched.
+        candidates: The results of the server.
+        get_fields: Get the texts to compare with the query of a candidate and the weight of each one, the missing
+            ones are None.
+
+    Returns:
+        The sorted candidates.
+    """
+
+    normalized_query = normalize(query)
+    if not normalized_query or len(candidates) < 2:
+        return list(candidates)
+
+    query_trigrams = get_trigrams(normalized_query)
+
+    def score(candidate: T) -> float:
+        best = 0.0
+        for text, weight in get_fields(candidate):
+            if text is None:
+                continue
+
+            normalized_text, trigrams = prepare_text(text)
+            similarity = get_similarity(query_trigrams, trigrams)
+            if normalized_text == normalized_query:
+                similarity += EXACT_MATCH_BONUS
+
+            best = max(best, similarity * weight)
+
+        return best
+
+    return sorted(candidates, key=score, reverse=True)
+
+
+def get_song_fields(song: Song) -> list[tuple[str | None, float]]:
+    """Get the fields of a song compared with the query.
+
+    The title and the artist are also compared together for the queries like "yesterday beatles".
+
+    Args:
+        song: The song.
+
+    Returns:
+        The texts of the song and their weights.
+    """
+
+    artist = song.artist.name if song.artist is not None else None
+    album = song.album.name if song.album is not None else None
+
+    return [
+        (song.title, TITLE_WEIGHT),
+        (f"{song.title} {artist}" if song.title is not None and artist is not None else None, TITLE_WEIGHT),
+        (artist, ARTIST_WEIGHT),
+        (album, ALBUM_WEIGHT),
+    ]
+
+
+def get_album_fields(album: Album) -> list[tuple[str | None, float]]:
+    """Get the fields of an album compared with the query.
+
+    Args:
+        album: The album.
+
+    Returns:
+        The texts of the album and their weights.
+    """
+
+    artist = album.artist.name if album.artist is not None else None
+
+    return [
+        (album.name, TITLE_WEIGHT),
+        (f"{album.name} {artist}" if album.name is not None and artist is not None else None, TITLE_WEIGHT),
+        (artist, ARTIST_WEIGHT),
+    ]
+
+
+def get_playlist_fields(playlist: Playlist) -> list[tuple[str | None, float]]:
+    """Get the fields of a playlist compared with the query.
+
+    Args:
+        playlist: The playlist.
+
+    Returns:
+        The name of the playlist and its weight.
+    """
+
+    return [(playlist.name, TITLE_WEIGHT)]
@@ -0,0 +1,929 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Replay a recorded trace of interactions against the cogs as a load test, without Discord nor a real server.
+
+The commands are invoked directly on the cogs with stand-in interactions, guilds and voice clients, and the cogs talk
+to a local stand-in Subsonic server with a synthetic library that answers with silent songs.
+"""
+
+import asyncio
+import dataclasses
+import io
+import json
+import logging
+import math
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import wave
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Final, cast
+from urllib.parse import parse_qs, urlparse
+
+import discord
+from discord import AudioSource, ClientUser, app_commands
+from discord.ext.commands import Bot, when_mentioned
+from discord.interactions import Interaction
+from knuckles import Subsonic
+
+from . import APP_NAME, APP_NAME_LOWER
+from .cogs.base import ERROR_TITLE, Base
+from .cogs.misc import Misc
+from .cogs.queue import QueueCog
+from .cogs.search import Search
+from .config import Config
+from .options import Options
+from .runtime import get_loop_factory, log_runtime_backends, set_speedups
+from .timing import format_latencies
+from .traces import TraceEntry, read_trace
+
+logger = logging.getLogger(__name__)
+
+# Songs in every album and playlist of the stand-in library
+ALBUM_SIZE: Final[int] = 12
+
+# Albums of every artist of the stand-in library
+ARTIST_ALBUMS: Final[int] = 4
+
+# Seconds of the silent audio served for every song
+SONG_SECONDS: Final[int] = 10
+
+# The silent audio is mono at a low rate to keep it small, FFmpeg resamples it as any other song
+SILENCE_SAMPLE_RATE: Final[int] = 8000
+
+# Seconds of audio read by the voice clients in every packet
+FRAME_LENGTH: Final[float] = 0.02
+
+# Seconds to wait for the commands still running after the last one has been started
+DRAIN_TIMEOUT: Final[float] = 60.0
+
+# The user of the bot shown in the embeds, the bot is never logged in
+STAND_IN_USER: Final[SimpleNamespace] = SimpleNamespace(id=0, name=APP_NAME, avatar=None, bot=True)
+
+
+def create_silence(seconds: int) -> bytes:
+    """Create a WAV file with silence.
+
+    Args:
+        seconds: The duration of the audio.
+
+    Returns:
+        The content of the file.
+    """
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SILENCE_SAMPLE_RATE)
+        f.writeframes(bytes(2 * SILENCE_SAMPLE_RATE * seconds))
+
+    return buffer.getvalue()
+
+
+def create_cover_art() -> bytes:
+    """Create a PNG file with a single grey pixel.
+
+    Returns:
+        The content of the file.
+    """
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\x00\x80"))
+        + chunk(b"IEND", b"")
+    )
+
+
+class StandInLibrary:
+    """A synthetic library for the stand-in Subsonic server, every element is derived from its position.
+
+    The songs are grouped in albums and the albums in artists, and the searches return consecutive elements starting
+    at a position derived from the query, so the same query always finds the same elements.
+    """
+
+    def __init__(self, songs: int, playlist_names: list[str]) -> None:
+        """Create a new library.
+
+        Args:
+            songs: How many songs the library has.
+            playlist_names: The names of the playlists of the library.
+        """
+
+        self.songs = songs
+        self.albums = math.ceil(songs / ALBUM_SIZE)
+        self.artists = math.ceil(self.albums / ARTIST_ALBUMS)
+        self.playlist_names = playlist_names
+
+        self.silence = create_silence(SONG_SECONDS)
+        self.cover_art = create_cover_art()
+
+    def song(self, index: int) -> dict[str, Any]:
+        """Get a song.
+
+        Args:
+            index: The position of the song.
+
+        Returns:
+            The song as returned by the Subsonic API.
+        """
+
+        album = index // ALBUM_SIZE
+        artist = album // ARTIST_ALBUMS
+
+        return {
+            "id": f"so-{index}",
+            "title": f"Song {index}",
+            "album": f"Album {album}",
+            "albumId": f"al-{album}",
+            "artist": f"Artist {artist}",
+            "artistId": f"ar-{artist}",
+            "coverArt": f"al-{album}",
+            "duration": SONG_SECONDS,
+            "size": len(self.silence),
+            "suffix": "wav",
+            "contentType": "audio/wav",
+        }
+
+    def album(self, index: int, with_songs: bool = False) -> dict[str, Any]:
+        """Get an album.
+
+        Args:
+            index: The position of the album.
+            with_songs: If the songs of the album should be included.
+
+        Returns:
+            The album as returned by the Subsonic API.
+        """
+
+        first = index * ALBUM_SIZE
+        songs = range(first, min(first + ALBUM_SIZE, self.songs))
+        artist = index // ARTIST_ALBUMS
+
+        album: dict[str, Any] = {
+            "id": f"al-{index}",
+            "name": f"Album {index}",
+            "artist": f"Artist {artist}",
+            "artistId": f"ar-{artist}",
+            "coverArt": f"al-{index}",
+            "songCount": len(songs),
+            "duration": len(songs) * SONG_SECONDS,
+        }
+
+        if with_songs:
+            album["song"] = [self.song(song) for song in songs]
+
+        return album
+
+    def artist(self, index: int) -> dict[str, Any]:
+        """Get an artist.
+
+        Args:
+            index: The position of the artist.
+
+        Returns:
+            The artist as returned by the Subsonic API.
+        """
+
+        return {"id": f"ar-{index}", "name": f"Artist {index}", "albumCount": ARTIST_ALBUMS}
+
+    def playlist(self, index: int, with_songs: bool = False) -> dict[str, Any]:
+        """Get a playlist.
+
+        Args:
+            index: The position of the playlist.
+            with_songs: If the songs of the playlist should be included.
+
+        Returns:
+            The playlist as returned by the Subsonic API.
+        """
+
+        playlist: dict[str, Any] = {
+            "id": f"pl-{index}",
+            "name": self.playlist_names[index],
+            "songCount": ALBUM_SIZE,
+            "duration": ALBUM_SIZE * SONG_SECONDS,
+            "owner": "replay",
+            "public": True,
+        }
+
+        if with_songs:
+            first = zlib.crc32(self.playlist_names[index].encode())
+            playlist["entry"] = [self.song((first + offset) % self.songs) for offset in range(ALBUM_SIZE)]
+
+        return playlist
+
+    def search(self, query: str, song_count: int, album_count: int, artist_count: int) -> dict[str, Any]:
+        """Search the library.
+
+        Args:
+            query: The query of the search.
+            song_count: The max number of songs to return.
+            album_count: The max number of albums to return.
+            artist_count: The max number of artists to return.
+
+        Returns:
+            The result of the search as returned by the Subsonic API.
+        """
+
+        first = zlib.crc32(query.encode())
+
+        def consecutive(count: int, total: int, get: Callable[[int], dict[str, Any]]) -> list[dict[str, Any]]:
+            return [get((first + offset) % total) for offset in range(min(count, total))]
+
+        result: dict[str, Any] = {}
+        if song_count > 0:
+            result["song"] = consecutive(song_count, self.songs, self.song)
+        if album_count > 0:
+            result["album"] = consecutive(album_count, self.albums, self.album)
+        if artist_count > 0:
+            result["artist"] = consecutive(artist_count, self.artists, self.artist)
+
+        return result
+
+    def answer(self, endpoint: str, params: dict[str, str]) -> dict[str, Any]:
+        """Answer a request to a JSON endpoint of the Subsonic API.
+
+        Args:
+            endpoint: The name of the endpoint.
+            params: The parameters of the request.
+
+        Returns:
+            The content of the `subsonic-response` object.
+        """
+
+        def get_index(prefix: str, total: int) -> int | None:
+            element_id = params.get("id", "")
+            if not element_id.startswith(prefix) or not element_id[len(prefix) :].isdigit():
+                return None
+
+            index = int(element_id[len(prefix) :])
+            return index if index < total else None
+
+        data: dict[str, Any] | None = None
+        match endpoint:
+            case "ping" | "scrobble":
+                data = {}
+
+            case "search3":
+                data = {
+                    "searchResult3": self.search(
+                        params.get("query", ""),
+                        int(params.get("songCount", 20)),
+                        int(params.get("albumCount", 20)),
+                        int(params.get("artistCount", 20)),
+                    )
+                }
+
+            case "getPlaylists":
+                data = {"playlists": {"playlist": [self.playlist(i) for i in range(len(self.playlist_names))]}}
+
+            case "getPlaylist":
+                index = get_index("pl-", len(self.playlist_names))
+                data = {"playlist": self.playlist(index, True)} if index is not None else None
+
+            case "getAlbum":
+                index = get_index("al-", self.albums)
+                data = {"album": self.album(index, True)} if index is not None else None
+
+            case "getAlbumInfo2":
+                index = get_index("al-", self.albums)
+                data = {"albumInfo": {}} if index is not None else None
+
+            case "getSong":
+                index = get_index("so-", self.songs)
+                data = {"song": self.song(index)} if index is not None else None
+
+            case _:
+                return {"status": "failed", "error": {"code": 0, "message": f"Unknown endpoint '{endpoint}'"}}
+
+        if data is None:
+            return {"status": "failed", "error": {"code": 70, "message": "The requested data was not found"}}
+
+        return {"status": "ok", "version": "1.16.1", "type": APP_NAME_LOWER, "openSubsonic": True, **data}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answer the requests to the stand-in Subsonic server."""
+
+    server: "StandInServer"
+
+    def do_GET(self) -> None:
+        """Answer a request, waiting the latency of the server first."""
+
+        url = urlparse(self.path)
+        endpoint = url.path.removeprefix("/rest/").removesuffix(".view")
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        library = self.server.library
+
+        match endpoint:
+            case "stream" | "download":
+                self.send_body(
+                    library.silence,
+                    "audio/wav",
+                    {"Content-Disposition": f'attachment; filename="{params.get("id", "song")}.wav"'},
+                )
+
+            case "getCoverArt":
+                self.send_body(library.cover_art, "image/png")
+
+            case _:
+                response = {"subsonic-response": library.answer(endpoint, params)}
+                self.send_body(json.dumps(response).encode(), "application/json")
+
+    def send_body(self, body: bytes, content_type: str, headers: dict[str, str] | None = None) -> None:
+        """Send a successful answer.
+
+        Args:
+            body: The body of the answer.
+            content_type: The content type of the body.
+            headers: Extra headers of the answer.
+        """
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Don't log every request, there are thousands of them."""
+
+
+class StandInServer(ThreadingHTTPServer):
+    """A local Subsonic server that answers from a synthetic library in a random port."""
+
+    daemon_threads = True
+
+    def __init__(self, library: StandInLibrary, latency: float) -> None:
+        """Create a new server, `serve_forever` should be called from a thread.
+
+        Args:
+            library: The library of the server.
+            latency: The seconds to wait before every answer.
+        """
+
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+
+        self.library = library
+        self.latency = latency
+
+    @property
+    def url(self) -> str:
+        """The URL where the server is listening."""
+
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class ReplayVoiceClient:
+    """Stand-in voice client that reads the audio of its source from a thread as fast as Discord would, scaled by
+    the speed of the replay, and throws it away."""
+
+    def __init__(self, guild: "ReplayGuild", speed: float) -> None:
+        """Create a new connected voice client.
+
+        Args:
+            guild: The guild of the voice client.
+            speed: How many times faster than real time the audio should be read.
+        """
+
+        self.guild = guild
+        self.channel = guild.channel
+        self.speed = speed
+
+        self.source: AudioSource | None = None
+        self.connected = True
+
+        self.ended = threading.Event()
+        self.ended.set()
+        self.paused = threading.Event()
+
+    def play(self, source: AudioSource, *, after: Callable[[Exception | None], Any] | None = None) -> None:
+        """Start reading the audio of a source.
+
+        Args:
+            source: The source to read.
+            after: Called from the thread with the error, if any, when the source ends or is stopped.
+        """
+
+        if not self.ended.is_set():
+            raise discord.ClientException("Already playing audio.")
+
+        self.source = source
+        self.ended = threading.Event()
+        self.paused.clear()
+
+        threading.Thread(target=self.read_audio, args=(source, self.ended, after), daemon=True).start()
+
+    def read_audio(
+        self, source: AudioSource, ended: threading.Event, after: Callable[[Exception | None], Any] | None
+    ) -> None:
+        """Read a source in real time until it ends or the playback is stopped.
+
+        Args:
+            source: The source to read.
+            ended: Set when the playback is stopped.
+            after: Called with the error, if any, when the source ends or is stopped.
+        """
+
+        frame_length = FRAME_LENGTH / self.speed
+        deadline = time.perf_counter()
+        error: Exception | None = None
+
+        try:
+            while not ended.is_set():
+                if self.paused.is_set():
+                    ended.wait(frame_length)
+                    deadline = time.perf_counter()
+                    continue
+
+                if not source.read():
+                    break
+
+                deadline += frame_length
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    ended.wait(delay)
+
+        except Exception as e:
+            error = e
+
+        finally:
+            ended.set()
+            source.cleanup()
+
+            if after is not None:
+                after(error)
+
+    def is_playing(self) -> bool:
+        return not self.ended.is_set() and not self.paused.is_set()
+
+    def is_paused(self) -> bool:
+        return not self.ended.is_set() and self.paused.is_set()
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def pause(self) -> None:
+        self.paused.set()
+
+    def resume(self) -> None:
+        self.paused.clear()
+
+    def stop(self) -> None:
+        self.ended.set()
+
+    async def disconnect(self, *, force: bool = False) -> None:
+        """Stop the playback and leave the voice channel.
+
+        Args:
+            force: Ignored, kept for compatibility with discord.py.
+        """
+
+        self.stop()
+        self.connected = False
+        self.guild.voice_client = None
+
+
+class ReplayVoiceChannel:
+    """Stand-in voice channel where all the users of a guild are connected."""
+
+    def __init__(self, guild: "ReplayGuild", speed: float) -> None:
+        """Create a new voice channel.
+
+        Args:
+            guild: The guild of the channel.
+            speed: The speed of the replay.
+        """
+
+        self.guild = guild
+        self.speed = speed
+        self.members: list[SimpleNamespace] = []
+
+    async def connect(self, **kwargs: Any) -> ReplayVoiceClient:
+        """Connect to the channel.
+
+        Returns:
+            The voice client of the guild.
+        """
+
+        voice_client = ReplayVoiceClient(self.guild, self.speed)
+        self.guild.voice_client = voice_client
+
+        return voice_client
+
+
+class ReplayGuild:
+    """Stand-in guild with a single voice channel."""
+
+    def __init__(self, id: int, speed: float) -> None:
+        """Create a new guild.
+
+        Args:
+            id: The ID of the guild.
+            speed: The speed of the replay.
+        """
+
+        self.id = id
+        self.voice_client: ReplayVoiceClient | None = None
+        self.channel = ReplayVoiceChannel(self, speed)
+
+    def get_member(self, id: int) -> SimpleNamespace:
+        """Get a member of the guild connected to its voice channel, adding it if it's new.
+
+        Args:
+            id: The ID of the user.
+
+        Returns:
+            The member.
+        """
+
+        for member in self.channel.members:
+            if member.id == id:
+                return member
+
+        member = SimpleNamespace(id=id, bot=False, mention=f"<@{id}>", voice=SimpleNamespace(channel=self.channel))
+        self.channel.members.append(member)
+
+        return member
+
+
+class ReplayResponse:
+    """Stand-in for the response of an interaction, it notes when the interaction was acknowledged."""
+
+    def __init__(self, interaction: "ReplayInteraction") -> None:
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    def acknowledge(self) -> None:
+        """Register the answer of the interaction.
+
+        Raises:
+            discord.InteractionResponded: The interaction had already been answered.
+        """
+
+        if self.done:
+            raise discord.InteractionResponded(cast(Interaction, self.interaction))
+
+        self.done = True
+        self.interaction.acknowledged = time.perf_counter()
+
+    async def defer(self, **kwargs: Any) -> None:
+        self.acknowledge()
+
+    async def send_message(
+        self, content: str | None = None, *, embed: discord.Embed | None = None, **kwargs: Any
+    ) -> None:
+        self.acknowledge()
+        self.interaction.register_message(embed, kwargs.get("files"))
+
+
+class ReplayFollowup:
+    """Stand-in for the webhook used to send more messages after answering an interaction."""
+
+    def __init__(self, interaction: "ReplayInteraction") -> None:
+        self.interaction = interaction
+
+    async def send(self, content: str | None = None, *, embed: discord.Embed | None = None, **kwargs: Any) -> None:
+        self.interaction.register_message(embed, kwargs.get("files"))
+
+
+class ReplayInteraction:
+    """Stand-in interaction with the attributes the cogs use, it notes how long it takes to be answered."""
+
+    def __init__(
+        self,
+        command: app_commands.Command[Any, ..., Any],
+        args: dict[str, Any],
+        guild: ReplayGuild | None,
+        user: SimpleNamespace,
+    ) -> None:
+        """Create a new interaction, starting its timing.
+
+        Args:
+            command: The command being used.
+            args: The arguments of the command.
+            guild: The guild where the command is used, None if it's used in a DM.
+            user: The user that uses the command.
+        """
+
+        self.command = command
+        self.namespace = SimpleNamespace(**args)
+        self.guild = guild
+        self.guild_id = guild.id if guild is not None else None
+        self.user = user
+        self.channel = None
+        self.client = SimpleNamespace(user=STAND_IN_USER)
+        self.extras: dict[str, Any] = {}
+
+        self.response = ReplayResponse(self)
+        self.followup = ReplayFollowup(self)
+
+        self.started = time.perf_counter()
+        self.acknowledged: float | None = None
+        self.error_answers = 0
+
+    def register_message(self, embed: discord.Embed | None, files: list[discord.File] | None) -> None:
+        """Register a message sent as an answer to the interaction.
+
+        Args:
+            embed: The embed of the message.
+            files: The files attached to the message.
+        """
+
+        for file in files or []:
+            file.close()
+
+        if embed is not None and embed.author.name == ERROR_TITLE:
+            self.error_answers += 1
+
+
+class ReplayBot(Bot):
+    """Bot that is never connected to Discord, used to hold the cogs during a replay."""
+
+    @property
+    def user(self) -> ClientUser:
+        return cast(ClientUser, STAND_IN_USER)
+
+    @property
+    def latency(self) -> float:
+        return 0.0
+
+
+@dataclass
+class CommandStats:
+    """The results of a command in a replay.
+
+    Attributes:
+        count: How many times the command was used.
+        errors: How many times the command raised an error.
+        error_answers: How many times the command answered with an error embed.
+        skipped: How many times the command was not replayed because it's not available.
+        ack: The seconds the command took to be acknowledged, every time it was.
+        total: The seconds the command took to be handled, every time it didn't raise an error.
+    """
+
+    count: int = 0
+    errors: int = 0
+    error_answers: int = 0
+    skipped: int = 0
+    ack: list[float] = field(default_factory=list)
+    total: list[float] = field(default_factory=list)
+
+
+class Replayer:
+    """Start the interactions of a trace at the time they were recorded, scaled by the speed of the replay."""
+
+    def __init__(self, bot: Bot, speed: float) -> None:
+        """Create a new replayer, the cogs should already be added to the bot.
+
+        Args:
+            bot: The bot with the cogs.
+            speed: How many times faster than recorded the interactions should be started.
+        """
+
+        self.speed = speed
+        self.commands = {
+            command.qualified_name: command
+            for command in bot.tree.walk_commands()
+            if isinstance(command, app_commands.Command)
+        }
+
+        self.guilds: dict[str, ReplayGuild] = {}
+        self.users: dict[str, int] = {}
+
+        self.stats: dict[str, CommandStats] = {}
+
+        # The max seconds an interaction was started after its time, high values mean the event loop is saturated
+        self.max_lag = 0.0
+
+    def get_interaction(self, entry: TraceEntry, command: app_commands.Command[Any, ..., Any]) -> ReplayInteraction:
+        """Create the interaction of an entry, the same anonymized guilds and users are mapped to the same objects.
+
+        Args:
+            entry: The entry of the trace.
+            command: The command of the entry.
+
+        Returns:
+            The interaction.
+        """
+
+        user_id = self.users.setdefault(entry.user, len(self.users) + 1)
+
+        guild = None
+        if entry.guild is not None:
+            guild = self.guilds.get(entry.guild)
+            if guild is None:
+                guild = ReplayGuild(len(self.guilds) + 1, self.speed)
+                self.guilds[entry.guild] = guild
+
+        user = guild.get_member(user_id) if guild is not None else SimpleNamespace(id=user_id, bot=False, voice=None)
+
+        return ReplayInteraction(command, entry.args, guild, user)
+
+    async def replay_entry(self, entry: TraceEntry) -> None:
+        """Invoke the command of an entry as discord.py would.
+
+        Args:
+            entry: The entry of the trace.
+        """
+
+        stats = self.stats.setdefault(entry.command, CommandStats())
+
+        command = self.commands.get(entry.command)
+        if command is None:
+            stats.skipped += 1
+            return
+
+        interaction = self.get_interaction(entry, command)
+        stats.count += 1
+
+        # The stand-in interaction has all the attributes the cogs use
+        discord_interaction = cast(Interaction, interaction)
+
+        try:
+            if isinstance(command.binding, Base):
+                await command.binding.interaction_check(discord_interaction)
+
+            await command.callback(command.binding, discord_interaction, **entry.args)  # type: ignore[arg-type]
+
+        except Exception as e:
+            logger.debug(f"The command '{entry.command}' failed: {e!r}")
+            stats.errors += 1
+
+        else:
+            stats.total.append(time.perf_counter() - interaction.started)
+
+        if interaction.acknowledged is not None:
+            stats.ack.append(interaction.acknowledged - interaction.started)
+
+        stats.error_answers += interaction.error_answers
+
+    async def run(self, entries: list[TraceEntry]) -> None:
+        """Start every entry at its time and wait for all of them to be handled.
+
+        Args:
+            entries: The entries of the trace, sorted by time.
+        """
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        first = entries[0].time
+
+        tasks = []
+        for entry in entries:
+            scheduled = start + (entry.time - first) / self.speed
+
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self.max_lag = max(self.max_lag, loop.time() - scheduled)
+            tasks.append(asyncio.create_task(self.replay_entry(entry)))
+
+        _, pending = await asyncio.wait(tasks, timeout=DRAIN_TIMEOUT)
+        if pending:
+            logger.warning(f"{len(pending)} commands were still running {DRAIN_TIMEOUT:.0f}s after the last one")
+            for task in pending:
+                task.cancel()
+
+    def report(self) -> None:
+        """Log the latencies and errors of every command."""
+
+        for name, stats in sorted(self.stats.items()):
+            if stats.skipped > 0:
+                logger.warning(f"/{name}: {stats.skipped} interactions skipped, the command is not available")
+
+            if stats.count == 0:
+                continue
+
+            logger.info(
+                f"/{name}: {stats.count} interactions, {stats.errors} errors, {stats.error_answers} error answers"
+            )
+            logger.info(f"  Acknowledged: {format_latencies(stats.ack)}")
+            logger.info(f"  Handled: {format_latencies(stats.total)}")
+
+        logger.info(f"Max delay starting the interactions: {self.max_lag * 1000:.0f} ms")
+
+
+async def run_replay(entries: list[TraceEntry], options: Options, config: Config, speed: float) -> Replayer:
+    """Replay a trace against the cogs that don't need a connection to Discord.
+
+    Args:
+        entries: The entries of the trace, sorted by time.
+        options: The options of the program, with a temporal cache.
+        config: The config of the program, pointing to the stand-in server.
+        speed: How many times faster than recorded the interactions should be started.
+
+    Returns:
+        The replayer with the results.
+    """
+
+    log_runtime_backends(asyncio.get_running_loop(), config.runtime_speedups)
+
+    subsonic = Subsonic(
+        url=config.subsonic_url,
+        user=config.subsonic_user,
+        password=APP_NAME_LOWER,
+        client=APP_NAME,
+        use_https=config.use_https,
+    )
+
+    async with ReplayBot(when_mentioned, intents=discord.Intents.none()) as bot:
+        await bot.add_cog(Misc(bot, options, subsonic, config))
+        await bot.add_cog(Search(bot, options, subsonic))
+        await bot.add_cog(QueueCog(bot, options, subsonic, config))
+
+        replayer = Replayer(bot, speed)
+        await replayer.run(entries)
+
+        # Stop the players and write the scrobbles and the cache index as on shutdown
+        for name in list(bot.cogs):
+            await bot.remove_cog(name)
+
+    return replayer
+
+
+def replay_trace(options: Options, config: Config) -> None:
+    """Replay the trace of the `replay` subcommand and log the latencies of every command.
+
+    Args:
+        options: The options of the program.
+        config: The config of the program, its server is replaced by the stand-in one.
+    """
+
+    assert options.replay is not None
+    replay = options.replay
+
+    try:
+        entries = read_trace(replay.trace)
+    except OSError as e:
+        logger.critical(f"Unable to read the trace: {e}")
+        return
+
+    if not entries:
+        logger.critical("The trace has no interactions")
+        return
+
+    if shutil.which("ffmpeg") is None:
+        logger.warning("FFmpeg is not installed, the songs will not be played and only the commands will be measured")
+
+    # The anonymized queries of the playlists become the names of the playlists so they are found again
+    playlist_names = sorted(
+        {
+            entry.args["query"]
+            for entry in entries
+            if entry.args.get("what") == "playlist" and isinstance(entry.args.get("query"), str)
+        }
+    )
+
+    server = StandInServer(StandInLibrary(replay.songs, playlist_names), replay.server_latency / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True, name="stand-in-subsonic").start()
+
+    duration = (entries[-1].time - entries[0].time) / replay.speed
+    logger.info(
+        f"Replaying {len(entries)} interactions in {duration:.0f}s against a stand-in server at '{server.url}' "
+        + f"with {replay.songs} songs"
+    )
+
+    set_speedups(config.runtime_speedups)
+
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"{APP_NAME_LOWER}-replay-") as cache_path:
+            replayer = asyncio.run(
+                run_replay(
+                    entries,
+                    options._replace(cache_path=Path(cache_path)),
+                    dataclasses.replace(config, subsonic_url=server.url, use_https=False, subsonic_user="replay"),
+                    replay.speed,
+                ),
+                loop_factory=get_loop_factory(config.runtime_uvloop),
+            )
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    replayer.report()
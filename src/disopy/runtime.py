@@ -0,0 +1,124 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Select the faster implementations of the event loop and of the libraries used by discord.py when installed.
+
+They are the `speed` extra of the package, every one of them is optional and the standard library is used in its
+place when missing. Disabling them allows measuring what they are worth with the `replay` and `bench` subcommands.
+"""
+
+import asyncio
+import importlib
+import importlib.util
+import json
+import logging
+from typing import Any, Callable, cast
+
+import aiohttp
+import discord.utils
+from aiohttp.abc import AbstractResolver
+from aiohttp.compression_utils import HAS_BROTLI
+from aiohttp.resolver import AsyncResolver, ThreadedResolver
+
+logger = logging.getLogger(__name__)
+
+
+def get_loop_factory(use_uvloop: bool) -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Get the factory of the event loop to be passed to `asyncio.run`.
+
+    Args:
+        use_uvloop: If uvloop should be used when it's installed.
+
+    Returns:
+        The factory of the uvloop event loops, or None to use the one of asyncio.
+    """
+
+    if not use_uvloop or importlib.util.find_spec("uvloop") is None:
+        return None
+
+    uvloop: Any = importlib.import_module("uvloop")
+    return cast(Callable[[], asyncio.AbstractEventLoop], uvloop.new_event_loop)
+
+
+def is_aiodns_available() -> bool:
+    """Check if aiodns is installed, aiohttp only uses it by default in some versions.
+
+    Returns:
+        If the DNS queries can be done with aiodns.
+    """
+
+    return importlib.util.find_spec("aiodns") is not None
+
+
+def _to_json(obj: Any) -> str:
+    """Serialize to JSON with the standard library as discord.py does when orjson is missing.
+
+    Args:
+        obj: The object to serialize.
+
+    Returns:
+        The compact JSON.
+    """
+
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=True)
+
+
+def set_speedups(enabled: bool) -> None:
+    """Make discord.py use or stop using the faster libraries it picks on import.
+
+    Brotli is always used by aiohttp when it's installed, as it's chosen when aiohttp is imported.
+
+    Args:
+        enabled: If orjson and the Zstandard compression of the gateway should be used when installed.
+    """
+
+    if enabled:
+        return
+
+    discord.utils.HAS_ORJSON = False
+    discord.utils._to_json = _to_json
+    discord.utils._from_json = json.loads
+
+    # The gateway compression can only be chosen since discord.py 2.5
+    zlib_context = getattr(discord.utils, "_ZlibDecompressionContext", None)
+    if zlib_context is not None and hasattr(discord.utils, "_ActiveDecompressionContext"):
+        setattr(discord.utils, "_ActiveDecompressionContext", zlib_context)
+
+
+def get_connector(speedups: bool) -> aiohttp.TCPConnector:
+    """Get the connector of the HTTP session of discord.py, it should be called from the event loop.
+
+    Args:
+        speedups: If the DNS queries should be done with aiodns when it's installed instead of in a thread.
+
+    Returns:
+        The connector with the DNS resolver selected.
+    """
+
+    resolver: AbstractResolver = AsyncResolver() if speedups and is_aiodns_available() else ThreadedResolver()
+
+    # The same as the one discord.py creates when none is given
+    return aiohttp.TCPConnector(limit=0, resolver=resolver)
+
+
+def log_runtime_backends(loop: asyncio.AbstractEventLoop, speedups: bool) -> None:
+    """Log the implementations being used, so the results of the benchmarks can be told apart.
+
+    Args:
+        loop: The running event loop.
+        speedups: If the faster libraries of discord.py are enabled.
+    """
+
+    loop_type = type(loop)
+    dns = "aiodns" if speedups and is_aiodns_available() else "threads"
+
+    # Only known since discord.py 2.5, the older versions always use zlib
+    active_context = getattr(discord.utils, "_ActiveDecompressionContext", None)
+    compression = getattr(active_context, "COMPRESSION_TYPE", "zlib-stream")
+
+    logger.info(
+        f"Runtime backends: event loop '{loop_type.__module__}.{loop_type.__name__}', "
+        + f"JSON '{"orjson" if discord.utils.HAS_ORJSON else "json"}', DNS '{dns}', "
+        + f"gateway compression '{compression}', Brotli '{"enabled" if HAS_BROTLI else "not installed"}'"
+    )
@@ -0,0 +1,285 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Report the played songs to the Subsonic server in the background."""
+
+import asyncio
+import json
+import logging
+import threading
+from asyncio import AbstractEventLoop
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Final, NamedTuple
+
+from knuckles import Subsonic
+
+logger = logging.getLogger(__name__)
+
+# Songs shorter than this amount of seconds are never scrobbled
+MIN_SCROBBLE_DURATION: Final[int] = 30
+
+# Seconds played after which a song is always scrobbled, no matter its duration
+MAX_SCROBBLE_THRESHOLD: Final[int] = 240
+
+# Seconds between the flushes of the pending scrobbles
+FLUSH_INTERVAL: Final[float] = 30.0
+
+# Max number of scrobbles submitted in a single request
+BATCH_SIZE: Final[int] = 50
+
+# Max seconds to wait before retrying after the server failed
+MAX_RETRY_DELAY: Final[float] = 600.0
+
+
+class Scrobble(NamedTuple):
+    """A song that has been played.
+
+    Attributes:
+        song_id: The ID of the song in the Subsonic server.
+        time: When the song started playing.
+    """
+
+    song_id: str
+    time: datetime
+
+
+def should_scrobble(played: int, duration: int | None) -> bool:
+    """Check if a song has been played long enough to be scrobbled, following the rules of Last.fm.
+
+    Args:
+        played: The seconds of the song that have been played.
+        duration: The duration of the song in seconds if known.
+
+    Returns:
+        If the song should be scrobbled.
+    """
+
+    if duration is not None:
+        if duration < MIN_SCROBBLE_DURATION:
+            return False
+
+        return played >= min(duration // 2, MAX_SCROBBLE_THRESHOLD)
+
+    return played >= MAX_SCROBBLE_THRESHOLD
+
+
+def get_scrobbles_path(cache_path: Path) -> Path:
+    """Get the path of the file where the scrobbles pending to be submitted are stored.
+
+    Args:
+        cache_path: The root cache path of the program.
+
+    Returns:
+        The path of the file.
+    """
+
+    return cache_path / "subsonic/scrobbles.json"
+
+
+class Scrobbler:
+    """Submit the played songs to the server in batches from a worker thread.
+
+    The player only adds the scrobbles to memory, so it never waits for the server nor the disk. The worker stores
+    them in the cache directory as soon as they are added, without waiting for the next submission, so they survive
+    restarts and the server being unreachable. Only the ones added right before the program is killed can be lost.
+    """
+
+    def __init__(self, subsonic: Subsonic, cache_path: Path) -> None:
+        """Create a new scrobbler, `start` should be called from the event loop before using it.
+
+        Args:
+            subsonic: The object to be used to access the OpenSubsonic REST API.
+            cache_path: The root cache path of the program.
+        """
+
+        self.subsonic = subsonic
+        self.path = get_scrobbles_path(cache_path)
+
+        self.pending: list[Scrobble] = []
+        self.playing: str | None = None
+
+        # If scrobbles have been added since the pending ones were last stored
+        self.unsaved = False
+        self.lock = threading.Lock()
+
+        # Avoid submitting the same scrobbles twice when closing while a flush is running
+        self.flush_lock = threading.Lock()
+
+        self.requested: asyncio.Event | None = None
+        self.task: asyncio.Task[None] | None = None
+
+    def load(self) -> None:
+        """Load the scrobbles that were not submitted in the last run."""
+
+        try:
+            entries = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to load the pending scrobbles, they will be lost: {e}")
+            return
+
+        with self.lock:
+            self.pending[:0] = [Scrobble(song_id, datetime.fromisoformat(time)) for song_id, time in entries]
+
+        logger.info(f"Loaded {len(entries)} pending scrobbles")
+
+    def save(self) -> None:
+        """Store in the disk the scrobbles still pending to be submitted."""
+
+        with self.lock:
+            entries = [(scrobble.song_id, scrobble.time.isoformat()) for scrobble in self.pending]
+            self.unsaved = False
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            temporal_path = self.path.with_suffix(".part")
+            temporal_path.write_text(json.dumps(entries))
+            temporal_path.replace(self.path)
+
+        except OSError as e:
+            logger.error(f"Unable to store the pending scrobbles: {e}")
+
+    async def start(self, loop: AbstractEventLoop) -> None:
+        """Load the pending scrobbles and start submitting them in the background.
+
+        Args:
+            loop: The event loop where the background task runs.
+        """
+
+        await asyncio.to_thread(self.load)
+
+        self.requested = asyncio.Event()
+        self.task = loop.create_task(self.run())
+
+    def submit(self, song_id: str, time: datetime) -> None:
+        """Add a played song to be scrobbled, it never blocks.
+
+        Args:
+            song_id: The ID of the song.
+            time: When the song started playing.
+        """
+
+        with self.lock:
+            self.pending.append(Scrobble(song_id, time))
+            self.unsaved = True
+
+        # Stored by the worker right away, it's only submitted with the next flush
+        if self.requested is not None:
+            self.requested.set()
+
+    def now_playing(self, song_id: str) -> None:
+        """Report to the server that a song has started playing, it never blocks.
+
+        Args:
+            song_id: The ID of the song.
+        """
+
+        with self.lock:
+            self.playing = song_id
+
+        # Report it as soon as possible, a late now playing is useless
+        if self.requested is not None:
+            self.requested.set()
+
+    async def run(self) -> None:
+        """Flush the scrobbles periodically, waiting longer after every failure, and store the new ones meanwhile."""
+
+        assert self.requested is not None
+
+        loop = asyncio.get_running_loop()
+
+        delay = FLUSH_INTERVAL
+        deadline = loop.time() + delay
+        while True:
+            try:
+                await asyncio.wait_for(self.requested.wait(), max(deadline - loop.time(), 0))
+            except TimeoutError:
+                pass
+
+            self.requested.clear()
+
+            with self.lock:
+                due = self.playing is not None or loop.time() >= deadline
+                unsaved = self.unsaved
+
+            # New scrobbles don't bring the submission forward, the server may be failing
+            if not due:
+                if unsaved:
+                    await asyncio.to_thread(self.save)
+
+                continue
+
+            delay = FLUSH_INTERVAL if await asyncio.to_thread(self.flush) else min(delay * 2, MAX_RETRY_DELAY)
+            deadline = loop.time() + delay
+
+    def flush(self) -> bool:
+        """Submit the pending scrobbles and the song being played.
+
+        This call is blocking and should only be done in a worker thread.
+
+        Returns:
+            If everything was submitted, false if the server failed and it should be retried later.
+        """
+
+        with self.flush_lock:
+            return self._flush()
+
+    def _flush(self) -> bool:
+        """Submit the pending scrobbles and the song being played without taking the flush lock.
+
+        Returns:
+            If everything was submitted.
+        """
+
+        with self.lock:
+            playing = self.playing
+            self.playing = None
+
+            has_pending = len(self.pending) > 0
+
+        if has_pending:
+            # Store them before anything else so they are not lost if the program is killed
+            self.save()
+
+        try:
+            if playing is not None:
+                self.subsonic.media_annotation.scrobble([playing], [datetime.now(timezone.utc)], submission=False)
+
+            while True:
+                with self.lock:
+                    batch = self.pending[:BATCH_SIZE]
+
+                if not batch:
+                    break
+
+                self.subsonic.media_annotation.scrobble(
+                    [scrobble.song_id for scrobble in batch], [scrobble.time for scrobble in batch]
+                )
+
+                with self.lock:
+                    del self.pending[: len(batch)]
+
+                logger.debug(f"Submitted {len(batch)} scrobbles")
+
+        # The errors of knuckles don't share a common base class
+        except Exception as e:
+            logger.warning(f"Unable to submit the scrobbles, retrying later: {e}")
+            return False
+
+        finally:
+            if has_pending:
+                self.save()
+
+        return True
+
+    async def close(self) -> None:
+        """Stop the background task and try to submit the pending scrobbles one last time."""
+
+        if self.task is not None:
+            self.task.cancel()
+
+        await asyncio.to_thread(self.flush)
@@ -0,0 +1,192 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Measure how long the phases of the startup and the acknowledgement of the interactions take."""
+
+import logging
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import cache
+from typing import Awaitable, Final, Iterator, NamedTuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Seconds the imports of the heavy dependencies may take before warning about it
+IMPORT_TIME_BUDGET: Final[float] = 1.0
+
+# Latest acknowledgement latencies kept for every command, the percentiles follow the recent behaviour
+ACK_SAMPLES: Final[int] = 1000
+
+# The percentiles shown in the reports of the load test and the benchmarks
+REPORT_PERCENTILES: Final[tuple[float, ...]] = (0.5, 0.95, 0.99)
+
+T = TypeVar("T")
+
+
+class PhaseTimer:
+    """Keep the duration of the phases of the startup for a final report."""
+
+    def __init__(self) -> None:
+        """Create a new timer, the total time is counted from here."""
+
+        self.start = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measure the time of the code inside the context.
+
+        Args:
+            name: The name of the phase.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Measure the time an awaitable takes, useful for phases run concurrently.
+
+        Args:
+            name: The name of the phase.
+            awaitable: The awaitable to measure.
+
+        Returns:
+            The result of the awaitable.
+        """
+
+        with self.phase(name):
+            return await awaitable
+
+    def get(self, name: str) -> float | None:
+        """Get the duration of a phase.
+
+        Args:
+            name: The name of the phase.
+
+        Returns:
+            The duration in seconds of the phase or None if it hasn't been measured.
+        """
+
+        for phase_name, duration in self.phases:
+            if phase_name == name:
+                return duration
+
+        return None
+
+    def report(self) -> None:
+        """Log the duration of all the phases, only the first call has an effect."""
+
+        if self.reported:
+            return
+
+        self.reported = True
+
+        logger.info(f"Startup finished in {time.perf_counter() - self.start:.2f}s")
+        for name, duration in self.phases:
+            logger.info(f"- {name}: {duration * 1000:.0f}ms")
+
+
+def get_percentile(values: list[float], fraction: float) -> float:
+    """Get a percentile of some values with the nearest rank method.
+
+    Args:
+        values: The sorted values.
+        fraction: The percentile between zero and one.
+
+    Returns:
+        The percentile.
+    """
+
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def format_latencies(values: list[float], decimals: int = 0) -> str:
+    """Describe the percentiles of some latencies.
+
+    Args:
+        values: The latencies in seconds.
+        decimals: The decimals of the milliseconds shown.
+
+    Returns:
+        The percentiles and the max latency in milliseconds.
+    """
+
+    if not values:
+        return "-"
+
+    values = sorted(values)
+    percentiles = [
+        f"p{fraction * 100:g} {get_percentile(values, fraction) * 1000:.{decimals}f}" for fraction in REPORT_PERCENTILES
+    ]
+
+    return f"{" ".join(percentiles)} max {values[-1] * 1000:.{decimals}f} ms"
+
+
+class AckSummary(NamedTuple):
+    """The acknowledgement latencies of a command.
+
+    Attributes:
+        samples: The number of latencies kept.
+        p50: The median latency in seconds.
+        p95: The 95th percentile latency in seconds.
+    """
+
+    samples: int
+    p50: float
+    p95: float
+
+
+class AckLatencies:
+    """Keep the latest seconds every command took to acknowledge its interactions."""
+
+    def __init__(self) -> None:
+        """Create a new empty record."""
+
+        self.samples: dict[str, deque[float]] = {}
+
+    def record(self, command: str, seconds: float) -> None:
+        """Record the acknowledgement of an interaction.
+
+        Args:
+            command: The qualified name of the command.
+            seconds: The seconds since the interaction started to be handled.
+        """
+
+        samples = self.samples.get(command)
+        if samples is None:
+            samples = deque(maxlen=ACK_SAMPLES)
+            self.samples[command] = samples
+
+        samples.append(seconds)
+
+    def summary(self) -> dict[str, AckSummary]:
+        """Get the percentiles of the latencies of every command.
+
+        Returns:
+            The summary by command name.
+        """
+
+        summaries = {}
+        for command, samples in self.samples.items():
+            values = sorted(samples)
+            summaries[command] = AckSummary(len(values), get_percentile(values, 0.5), get_percentile(values, 0.95))
+
+        return summaries
+
+
+@cache
+def get_ack_latencies() -> AckLatencies:
+    """Get the acknowledgement latencies shared by all the cogs.
+
+    Returns:
+        The record of the latencies.
+    """
+
+    return AckLatencies()
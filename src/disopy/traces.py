@@ -0,0 +1,182 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Record anonymized traces of the handled interactions to replay them later as a load test."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import time
+from asyncio import AbstractEventLoop
+from pathlib import Path
+from typing import Any, Final, NamedTuple
+
+from discord import app_commands
+from discord.interactions import Interaction
+
+logger = logging.getLogger(__name__)
+
+# Seconds between the writes of the recorded interactions to the trace file
+FLUSH_INTERVAL: Final[float] = 10.0
+
+# The key of the extras of an interaction where the monotonic time when its handling started is stored
+STARTED_EXTRA: Final[str] = "trace_started"
+
+
+class TraceEntry(NamedTuple):
+    """An interaction handled by the bot.
+
+    Attributes:
+        time: The UNIX time when the interaction started to be handled.
+        command: The qualified name of the command.
+        args: The arguments of the command, the free text ones anonymized.
+        guild: The anonymized guild, None if it was not used in a guild.
+        user: The anonymized user.
+        duration: The seconds the command took to be handled.
+        error: The name of the error raised by the command, None if it succeeded.
+    """
+
+    time: float
+    command: str
+    args: dict[str, Any]
+    guild: str | None
+    user: str
+    duration: float
+    error: str | None = None
+
+
+def read_trace(path: Path) -> list[TraceEntry]:
+    """Read the entries of a trace file, skipping the invalid lines.
+
+    Args:
+        path: The path of the trace file.
+
+    Returns:
+        The entries sorted by time.
+    """
+
+    entries = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            try:
+                entries.append(TraceEntry(**json.loads(line)))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Skipping the line {number} of the trace: {e}")
+
+    return sorted(entries, key=lambda entry: entry.time)
+
+
+class TraceRecorder:
+    """Write the handled interactions as JSON lines, buffered and appended to the trace file from the background.
+
+    The IDs and free text arguments are replaced by salted hashes, the salt is different every time the bot is
+    started so they can't be linked back to the users, but the same guild or query keeps the same hash in a run.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Create a new recorder, `start` should be called from the event loop.
+
+        Args:
+            path: The path of the trace file.
+        """
+
+        self.path = path
+        self.salt = secrets.token_bytes(16)
+
+        self.pending: list[TraceEntry] = []
+        self.task: asyncio.Task[None] | None = None
+
+    def anonymize(self, value: object) -> str:
+        """Replace a value with a salted hash.
+
+        Args:
+            value: The value to anonymize.
+
+        Returns:
+            The hash of the value.
+        """
+
+        return hashlib.blake2b(str(value).encode(), key=self.salt, digest_size=6).hexdigest()
+
+    def start(self, loop: AbstractEventLoop) -> None:
+        """Start writing the recorded interactions periodically.
+
+        Args:
+            loop: The event loop where the writes are scheduled.
+        """
+
+        self.task = loop.create_task(self.run())
+        logger.info(f"Recording the interactions to '{self.path}'")
+
+    def record(self, interaction: Interaction, error: str | None = None) -> None:
+        """Register a handled interaction, it never blocks.
+
+        Args:
+            interaction: The handled interaction.
+            error: The name of the error raised by the command, None if it succeeded.
+        """
+
+        command = interaction.command
+        started = interaction.extras.get(STARTED_EXTRA)
+        if not isinstance(command, app_commands.Command) or started is None:
+            return
+
+        duration = time.monotonic() - started
+
+        # The choices are safe to keep and needed to replay the command as it was
+        choices = {parameter.name for parameter in command.parameters if parameter.choices}
+
+        args: dict[str, Any] = {}
+        for name, value in interaction.namespace:
+            if isinstance(value, (bool, int, float)) or (isinstance(value, str) and name in choices):
+                args[name] = value
+            elif isinstance(value, str):
+                args[name] = self.anonymize(value)
+
+        self.pending.append(
+            TraceEntry(
+                time=time.time() - duration,
+                command=command.qualified_name,
+                args=args,
+                guild=self.anonymize(interaction.guild_id) if interaction.guild_id is not None else None,
+                user=self.anonymize(interaction.user.id),
+                duration=duration,
+                error=error,
+            )
+        )
+
+    async def run(self) -> None:
+        """Write the recorded interactions every interval."""
+
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Append the recorded interactions to the trace file."""
+
+        entries = self.pending
+        self.pending = []
+
+        if not entries:
+            return
+
+        def write() -> None:
+            with open(self.path, "a") as f:
+                f.writelines(json.dumps(entry._asdict()) + "\n" for entry in entries)
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as e:
+            logger.error(f"Unable to write the interaction trace: {e}")
+
+    async def close(self) -> None:
+        """Stop writing periodically and write the interactions still pending."""
+
+        if self.task is not None:
+            self.task.cancel()
+
+        await self.flush()
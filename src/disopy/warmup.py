@@ -0,0 +1,278 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Pre-download whole playlists, albums and artists to the song cache."""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Final, NamedTuple
+
+from knuckles import Subsonic
+
+from .cache_index import lock_cache
+from .config import Config
+from .media import BandwidthLimiter, MediaPolicy, SongFetcher
+from .options import Options
+
+logger = logging.getLogger(__name__)
+
+# Seconds between the progress reports of a warm-up
+PROGRESS_INTERVAL: Final[float] = 5.0
+
+
+class WarmupProgress(NamedTuple):
+    """The progress of a cache warm-up.
+
+    Attributes:
+        total: The number of songs to be warmed.
+        done: The number of songs already processed.
+        cached: The songs that were already in the cache.
+        failed: The songs that couldn't be downloaded.
+        downloaded_bytes: The bytes downloaded from the server.
+    """
+
+    total: int
+    done: int = 0
+    cached: int = 0
+    failed: int = 0
+    downloaded_bytes: int = 0
+
+    def describe(self) -> str:
+        """Get a human readable description of the progress.
+
+        Returns:
+            The description.
+        """
+
+        return (
+            f"{self.done}/{self.total} songs ({self.cached} already cached, {self.failed} failed, "
+            + f"{self.downloaded_bytes / 1024**2:.1f} MiB downloaded)"
+        )
+
+
+def resolve_songs(subsonic: Subsonic, kind: str, query: str) -> tuple[str, list[str]] | None:
+    """Find the songs of a song, album, artist or playlist.
+
+    This call is blocking and should not be done on the event loop.
+
+    Args:
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+        kind: One of `WARMUP_KINDS`.
+        query: The name of the element to search.
+
+    Returns:
+        The name of the found element and the IDs of its songs, None if nothing was found.
+    """
+
+    match kind:
+        case "song":
+            songs = subsonic.searching.search(query, song_count=1, album_count=0, artist_count=0).songs
+            if not songs:
+                return None
+
+            return songs[0].title or query, [songs[0].id]
+
+        case "album":
+            albums = subsonic.searching.search(query, song_count=0, album_count=1, artist_count=0).albums
+            if not albums:
+                return None
+
+            album = albums[0].generate()
+            return album.name or query, [song.id for song in album.songs or []]
+
+        case "artist":
+            artists = subsonic.searching.search(query, song_count=0, album_count=0, artist_count=1).artists
+            if not artists:
+                return None
+
+            artist = artists[0].generate()
+
+            song_ids: list[str] = []
+            for album in artist.albums or []:
+                song_ids.extend(song.id for song in album.generate().songs or [])
+
+            return artist.name or query, song_ids
+
+        case "playlist":
+            for playlist in subsonic.playlists.get_playlists():
+                if playlist.name is None or query not in playlist.name:
+                    continue
+
+                playlist = playlist.generate()
+                return playlist.name or query, [song.id for song in playlist.songs or []]
+
+            return None
+
+    raise ValueError(f"Unknown kind of element '{kind}'")
+
+
+class CacheWarmer:
+    """Download a list of songs to the cache with several workers, skipping the already cached ones."""
+
+    def __init__(
+        self,
+        fetcher: SongFetcher,
+        workers: int,
+        bandwidth: int = 0,
+        on_progress: Callable[[WarmupProgress], None] | None = None,
+    ) -> None:
+        """Create a new warmer.
+
+        Args:
+            fetcher: The fetcher used to download the songs, the same one used for the playback.
+            workers: How many songs should be downloaded at the same time.
+            bandwidth: The max total download speed in KiB/s, zero for no limit.
+            on_progress: Called from the workers after every processed song.
+        """
+
+        self.fetcher = fetcher
+        self.workers = workers
+        self.limiter = BandwidthLimiter(bandwidth * 1024) if bandwidth > 0 else None
+        self.on_progress = on_progress
+
+        self.progress = WarmupProgress(0)
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """Stop the warm-up after the songs being downloaded."""
+
+        self.cancelled.set()
+
+    def _warm(self, song_id: str) -> None:
+        """Download a song if it's not cached and update the progress.
+
+        Args:
+            song_id: The ID of the song.
+        """
+
+        if self.cancelled.is_set():
+            return
+
+        cached = failed = False
+        downloaded_bytes = 0
+
+        try:
+            if self.fetcher.cached_path(song_id) is not None:
+                cached = True
+            else:
+                downloaded_bytes = self.fetcher.fetch(song_id, self.limiter).stat().st_size
+
+        # The errors of knuckles don't share a common base class
+        except Exception as e:
+            logger.warning(f"Unable to download the song '{song_id}': {e}")
+            failed = True
+
+        with self.lock:
+            self.progress = self.progress._replace(
+                done=self.progress.done + 1,
+                cached=self.progress.cached + cached,
+                failed=self.progress.failed + failed,
+                downloaded_bytes=self.progress.downloaded_bytes + downloaded_bytes,
+            )
+            progress = self.progress
+
+        if self.on_progress is not None:
+            self.on_progress(progress)
+
+    def run(self, song_ids: list[str]) -> WarmupProgress:
+        """Download the songs.
+
+        This call is blocking and should not be done on the event loop.
+
+        Args:
+            song_ids: The IDs of the songs, duplicates are only downloaded once.
+
+        Returns:
+            The final progress.
+        """
+
+        song_ids = list(dict.fromkeys(song_ids))
+        self.progress = WarmupProgress(len(song_ids))
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="cache-warmup") as executor:
+            try:
+                # Consume the results to not hide unexpected errors
+                for _ in executor.map(self._warm, song_ids):
+                    pass
+
+            except BaseException:
+                # Don't start the remaining songs while waiting for the running ones
+                self.cancel()
+                raise
+
+        return self.progress
+
+
+def warm_cache(subsonic: Subsonic, options: Options, config: Config) -> None:
+    """Download to the cache the songs of the element set in the options, reporting the progress in the logs.
+
+    Args:
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+        options: The options of the program.
+        config: The config of the program.
+    """
+
+    if options.warm_cache is None:
+        return
+
+    kind, query = options.warm_cache
+
+    # The bot downloads to the same cache and index, it warms it with `/warmup` while running
+    cache_lock = lock_cache(options.cache_path)
+    if cache_lock is None:
+        logger.error("The bot is running, use its /warmup command or stop it before warming the cache")
+        return
+
+    # The lock is held until the warm-up ends
+    with cache_lock:
+        _warm_cache(subsonic, options, config, kind, query)
+
+
+def _warm_cache(subsonic: Subsonic, options: Options, config: Config, kind: str, query: str) -> None:
+    """Download to the cache the songs of an element, the cache should be locked.
+
+    Args:
+        subsonic: The object to be used to access the OpenSubsonic REST API.
+        options: The options of the program.
+        config: The config of the program.
+        kind: One of `WARMUP_KINDS`.
+        query: The name of the element to search.
+    """
+
+    resolved = resolve_songs(subsonic, kind, query)
+    if resolved is None:
+        logger.error(f"No {kind} found with the name '{query}'")
+        return
+
+    name, song_ids = resolved
+    logger.info(f"Warming the cache with the {len(song_ids)} songs of '{name}' using {options.warm_workers} workers")
+
+    last_report = time.monotonic()
+    report_lock = threading.Lock()
+
+    def report(progress: WarmupProgress) -> None:
+        nonlocal last_report
+
+        with report_lock:
+            now = time.monotonic()
+            if now - last_report < PROGRESS_INTERVAL:
+                return
+
+            last_report = now
+
+        logger.info(f"Warming the cache: {progress.describe()}")
+
+    fetcher = SongFetcher(subsonic, options, MediaPolicy.from_config(config))
+    warmer = CacheWarmer(fetcher, options.warm_workers, options.warm_bandwidth, report)
+
+    start = time.monotonic()
+    try:
+        progress = warmer.run(song_ids)
+    finally:
+        fetcher.index.save()
+
+    logger.info(f"Cache warmed in {time.monotonic() - start:.1f}s: {progress.describe()}")